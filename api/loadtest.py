@@ -0,0 +1,94 @@
+"""Fire concurrent questions at the API server and report throughput/latency.
+
+    CHATBOT_FAKE_LLM=1 python -m api.server &
+    python -m api.loadtest --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import uuid
+from collections import Counter
+from time import perf_counter
+
+import httpx
+
+QUESTIONS = [
+    "Summarize the core economic priorities in the manifesto.",
+    "What are the key commitments on healthcare delivery?",
+    "How does the manifesto plan to fight corruption?",
+    "What does the manifesto say about education?",
+]
+
+
+def _pct(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+async def _one(client, url, endpoint, n, clients):
+    body = {
+        "question": QUESTIONS[n % len(QUESTIONS)],
+        "session_id": str(uuid.uuid4()),
+        "client_id": f"load-{n % clients}",
+    }
+    start = perf_counter()
+    ttft = None
+    if endpoint == "stream":
+        async with client.stream("POST", f"{url}/stream", json=body) as resp:
+            async for line in resp.aiter_lines():
+                if ttft is None and line:
+                    ttft = (perf_counter() - start) * 1000.0
+            status = resp.status_code
+    else:
+        resp = await client.post(f"{url}/ask", json=body)
+        status = resp.status_code
+    return status, (perf_counter() - start) * 1000.0, ttft
+
+
+async def run(args):
+    sem = asyncio.Semaphore(args.concurrency)
+    timeout = httpx.Timeout(args.timeout_s)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        async def bounded(n):
+            async with sem:
+                try:
+                    return await _one(client, args.url, args.endpoint, n, args.clients)
+                except httpx.HTTPError as e:
+                    return type(e).__name__, 0.0, None
+
+        start = perf_counter()
+        results = await asyncio.gather(*(bounded(n) for n in range(args.requests)))
+        wall_s = perf_counter() - start
+
+    ok = [lat for status, lat, _ in results if status == 200]
+    ttfts = [t for status, _, t in results if status == 200 and t is not None]
+    summary = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "statuses": dict(Counter(str(s) for s, _, _ in results)),
+        "throughput_rps": round(len(ok) / wall_s, 2) if wall_s else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.mean(ok), 2) if ok else 0.0,
+            "p50": round(_pct(ok, 50), 2),
+            "p95": round(_pct(ok, 95), 2),
+            "p99": round(_pct(ok, 99), 2),
+        },
+    }
+    if ttfts:
+        summary["ttft_ms_p50"] = round(_pct(ttfts, 50), 2)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Load test for api/server.py")
+    p.add_argument("--url", default="http://127.0.0.1:8000")
+    p.add_argument("--endpoint", choices=["ask", "stream"], default="ask")
+    p.add_argument("--requests", type=int, default=100)
+    p.add_argument("--concurrency", type=int, default=20)
+    p.add_argument("--clients", type=int, default=10, help="distinct client ids to spread load over")
+    p.add_argument("--timeout-s", type=float, default=120.0)
+    asyncio.run(run(p.parse_args()))
@@ -0,0 +1,329 @@
+"""Async JSON API for the manifesto chatbot, next to the Streamlit app.
+
+Reuses the same registry/session components as `app.py` but drives the chain
+through `ainvoke`, so one process can serve many questions concurrently.
+Tornado is used because it already ships with Streamlit (no extra dependency).
+
+Run:
+    python -m api.server --port 8000
+    CHATBOT_FAKE_LLM=1 python -m api.server   # offline stand-in for load tests
+
+Endpoints:
+    POST /ask      {"question": str, "session_id": str?, "client_id": str?}
+    POST /stream   same body; NDJSON lines {"token": ...} then {"done": true, ...}
+    GET  /health
+    GET  /ready    200 once warm-up (bot/warmup.py) has finished, else 503
+    GET  /metrics
+"""
+import argparse
+import asyncio
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from time import perf_counter
+from typing import Dict
+
+import tornado.web
+from dotenv import load_dotenv
+
+from bot.clients import connection_stats
+from bot.deadline import DeadlineExceeded, deadline_scope
+from bot.hedging import hedge_stats
+from bot.memory import count_tokens
+from bot.rate_limit import admission_context
+from bot.sessions import get_session_manager
+from bot.warmup import start_warmup
+from bot.streaming import AsyncAnswerStream
+from monitoring import metrics
+from monitoring.metrics_server import CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE
+from monitoring.session_log import log_turn
+from monitoring.startup import readiness
+from monitoring.tracing import request_span, set_attributes
+from retriever.retriever import get_retriever_config, retrieval_path_stats
+
+load_dotenv()
+
+REQUESTS = metrics.counter("api_requests_total", "API requests by endpoint and status")
+REJECTED = metrics.counter("api_rejected_total", "Requests rejected by admission control")
+IN_FLIGHT = metrics.gauge("api_in_flight", "Requests currently executing")
+QUEUED = metrics.gauge("api_queued", "Requests waiting for a slot")
+LATENCY_MS = metrics.histogram("api_latency_ms", "Latency of completed requests by endpoint")
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+
+class AdmissionGate:
+    """Global in-flight limit plus a bounded queue and concurrency cap per client.
+
+    A client can run at most `per_client_in_flight` requests and keep at most
+    `per_client_queue` more waiting; beyond that it gets a 429 instead of
+    crowding out other clients. Everything is bounded by the request deadline.
+    """
+
+    def __init__(self, max_in_flight: int, per_client_in_flight: int, per_client_queue: int):
+        self.max_in_flight = max_in_flight
+        self.per_client_in_flight = per_client_in_flight
+        self.per_client_queue = per_client_queue
+        self._global = asyncio.Semaphore(max_in_flight)
+        self._clients: Dict[str, asyncio.Semaphore] = {}
+        self._pending: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def slot(self, client_id: str):
+        pending = self._pending.get(client_id, 0)
+        if pending >= self.per_client_in_flight + self.per_client_queue:
+            REJECTED.inc(labels={"reason": "client_queue_full"})
+            raise Rejected(429, "too many pending requests for this client")
+        client_sem = self._clients.setdefault(client_id, asyncio.Semaphore(self.per_client_in_flight))
+        self._pending[client_id] = pending + 1
+        QUEUED.inc()
+        queued = True
+        try:
+            async with client_sem:
+                async with self._global:
+                    QUEUED.dec()
+                    queued = False
+                    IN_FLIGHT.inc()
+                    try:
+                        yield
+                    finally:
+                        IN_FLIGHT.dec()
+        finally:
+            if queued:
+                QUEUED.dec()
+            self._pending[client_id] -= 1
+            if self._pending[client_id] <= 0:
+                self._pending.pop(client_id, None)
+                self._clients.pop(client_id, None)
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, gate: AdmissionGate, deadline_s: float):
+        self.gate = gate
+        self.deadline_s = deadline_s
+
+    def _json_body(self) -> dict:
+        try:
+            body = json.loads(self.request.body or b"{}")
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="invalid JSON")
+        question = (body.get("question") or "").strip()
+        if not question:
+            raise tornado.web.HTTPError(400, reason="missing question")
+        session_id = body.get("session_id") or str(uuid.uuid4())
+        return {
+            "question": question,
+            "session_id": session_id,
+            "client_id": body.get("client_id") or self.request.headers.get("X-Client-Id") or session_id,
+        }
+
+    async def _get_session(self, session_id: str):
+        # First call may build the registry; keep that off the event loop
+        session = await asyncio.to_thread(get_session_manager().get, session_id)
+        # Turns within one session must not interleave in its memory; the lock
+        # lives on the session so it is dropped together with it on eviction
+        if getattr(session, "api_lock", None) is None:
+            session.api_lock = asyncio.Lock()
+        return session
+
+    def _request_span(self, req: dict, endpoint: str):
+        # Same root span as app.py, so the stage spans nest under it and rag_requests_total/rag_request_ms count API calls
+        retr_cfg = get_retriever_config()
+        return request_span(
+            "rag.request",
+            app__session_id=req["session_id"],
+            app__client_id=req["client_id"],
+            app__endpoint=endpoint,
+            rag__k=retr_cfg.get("k"),
+            rag__fetch_k=retr_cfg.get("fetch_k"),
+            rag__lambda_mult=retr_cfg.get("lambda_mult"),
+            rag__question_length=len(req["question"]),
+        )
+
+    def _remaining_s(self, start: float) -> float:
+        """What is left of the deadline after queueing; none left is a 504 before the chain runs."""
+        remaining = self.deadline_s - (perf_counter() - start)
+        if remaining <= 0:
+            raise DeadlineExceeded("queue")
+        return remaining
+
+    def _finish_error(self, status: int, reason: str, endpoint: str):
+        REQUESTS.inc(labels={"endpoint": endpoint, "status": str(status)})
+        if not self._headers_written:
+            self.set_status(status)
+            self.finish({"error": reason})
+        else:
+            self.write(json.dumps({"error": reason}) + "\n")
+            self.finish()
+
+
+class AskHandler(BaseHandler):
+    async def post(self):
+        req = self._json_body()
+        start = perf_counter()
+        try:
+            async with asyncio.timeout(self.deadline_s):
+                async with self.gate.slot(req["client_id"]):
+                    session = await self._get_session(req["session_id"])
+                    async with session.api_lock:
+                        # Same deadline, minus the queueing so far, for every stage and LLM call
+                        with self._request_span(req, "ask"), \
+                                admission_context(priority="interactive", session_id=req["session_id"]), \
+                                deadline_scope(self._remaining_s(start)):
+                            result = await session.chain.ainvoke({"question": req["question"]})
+                            set_attributes(
+                                rag__latency_ms=round((perf_counter() - start) * 1000.0, 2),
+                                rag__answer_length=len(result.get("answer", "")),
+                                rag__retrieval_path=result.get("retrieval_path"),
+                            )
+                        session.turns += 1
+        except Rejected as e:
+            return self._finish_error(e.status, e.reason, "ask")
+        except TimeoutError:
+            return self._finish_error(504, "deadline exceeded", "ask")
+        latency_ms = (perf_counter() - start) * 1000.0
+        REQUESTS.inc(labels={"endpoint": "ask", "status": "200"})
+        LATENCY_MS.observe(latency_ms, labels={"endpoint": "ask"})
+        _log_turn(session, req, result, latency_ms, None)
+        self.finish({
+            "session_id": req["session_id"],
+            "answer": result.get("answer", ""),
+            "sources": [_source(d) for d in result.get("source_documents", [])],
+            "retrieval_path": result.get("retrieval_path"),
+            "latency_ms": round(latency_ms, 2),
+        })
+
+
+class StreamHandler(BaseHandler):
+    async def post(self):
+        req = self._json_body()
+        start = perf_counter()
+        self.set_header("Content-Type", "application/x-ndjson")
+        try:
+            async with asyncio.timeout(self.deadline_s):
+                async with self.gate.slot(req["client_id"]):
+                    session = await self._get_session(req["session_id"])
+                    async with session.api_lock:
+                        stream = AsyncAnswerStream(session.chain, req["question"])
+                        with self._request_span(req, "stream"), \
+                                admission_context(priority="interactive", session_id=req["session_id"]), \
+                                deadline_scope(self._remaining_s(start)):
+                            async for token in stream:
+                                self.write(json.dumps({"token": token}) + "\n")
+                                await self.flush()
+                            latency_ms = (perf_counter() - start) * 1000.0
+                            set_attributes(
+                                rag__latency_ms=round(latency_ms, 2),
+                                rag__ttft_ms=round(stream.ttft_ms or latency_ms, 2),
+                                rag__answer_length=len(stream.answer),
+                                rag__retrieval_path=(stream.result or {}).get("retrieval_path"),
+                            )
+                        session.turns += 1
+        except Rejected as e:
+            return self._finish_error(e.status, e.reason, "stream")
+        except TimeoutError:
+            return self._finish_error(504, "deadline exceeded", "stream")
+        latency_ms = (perf_counter() - start) * 1000.0
+        REQUESTS.inc(labels={"endpoint": "stream", "status": "200"})
+        LATENCY_MS.observe(latency_ms, labels={"endpoint": "stream"})
+        _log_turn(session, req, stream.result, latency_ms, stream.ttft_ms)
+        self.write(json.dumps({
+            "done": True,
+            "session_id": req["session_id"],
+            "sources": [_source(d) for d in (stream.result or {}).get("source_documents", [])],
+            "retrieval_path": (stream.result or {}).get("retrieval_path"),
+            "ttft_ms": round(stream.ttft_ms or latency_ms, 2),
+            "latency_ms": round(latency_ms, 2),
+        }) + "\n")
+        self.finish()
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.finish({"status": "ok"})
+
+
+class ReadyHandler(tornado.web.RequestHandler):
+    def get(self):
+        state = readiness()
+        self.set_status(200 if state["ready"] else 503)
+        self.finish(state)
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        if self.get_query_argument("format", "") == "prometheus":
+            self.set_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            return self.finish(metrics.render_prometheus())
+        self.finish({
+            "metrics": metrics.snapshot(),
+            "sessions": get_session_manager().stats(),
+            "http": connection_stats(),
+            "hedging": hedge_stats(),
+            "retrieval": retrieval_path_stats(),
+        })
+
+
+def _log_turn(session, req, result, latency_ms, ttft_ms) -> None:
+    turn_tokens = getattr(session.memory, "turn_tokens", None)
+    answer = (result or {}).get("answer", "")
+    log_turn(
+        req["session_id"],
+        req["question"],
+        result,
+        turn=session.turns,
+        client_id=req["client_id"],
+        latency_ms=round(latency_ms, 2),
+        ttft_ms=round(ttft_ms, 2) if ttft_ms is not None else None,
+        question_tokens=count_tokens(req["question"]),
+        answer_tokens=count_tokens(answer),
+        history_tokens=turn_tokens[-1] if turn_tokens else None,
+    )
+
+
+def _source(doc) -> dict:
+    meta = getattr(doc, "metadata", {}) or {}
+    return {"id": getattr(doc, "id", None) or meta.get("id"), "page": meta.get("page"), "source": meta.get("source")}
+
+
+def make_app(max_in_flight: int, per_client_in_flight: int, per_client_queue: int, deadline_s: float):
+    gate = AdmissionGate(max_in_flight, per_client_in_flight, per_client_queue)
+    opts = {"gate": gate, "deadline_s": deadline_s}
+    return tornado.web.Application(
+        [
+            (r"/ask", AskHandler, opts),
+            (r"/stream", StreamHandler, opts),
+            (r"/health", HealthHandler),
+            (r"/ready", ReadyHandler),
+            (r"/metrics", MetricsHandler),
+        ]
+    )
+
+
+async def main(args) -> None:
+    app = make_app(args.max_in_flight, args.per_client_in_flight, args.per_client_queue, args.deadline_s)
+    app.listen(args.port, address=args.host)
+    start_warmup()
+    print(f"✅ API listening on http://{args.host}:{args.port} (max_in_flight={args.max_in_flight})")
+    await asyncio.Event().wait()
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Async JSON API for the manifesto chatbot")
+    p.add_argument("--host", default=os.getenv("API_HOST", "0.0.0.0"))
+    p.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "8000")))
+    p.add_argument("--max-in-flight", type=int, default=int(os.getenv("API_MAX_IN_FLIGHT", "32")))
+    p.add_argument("--per-client-in-flight", type=int, default=int(os.getenv("API_PER_CLIENT_IN_FLIGHT", "2")))
+    p.add_argument("--per-client-queue", type=int, default=int(os.getenv("API_PER_CLIENT_QUEUE", "8")))
+    p.add_argument("--deadline-s", type=float, default=float(os.getenv("API_DEADLINE_S", "60")))
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
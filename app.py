@@ -1,76 +1,136 @@
 import streamlit as st
-from bot.chain import get_chain
-from retriever.retriever import get_retriever_config
-from monitoring.arize_integration import init_arize_tracing
+from monitoring.metrics_server import start_metrics_server
+from monitoring.startup import lazy_imports_enabled, mark, ready_without_warmup
 from dotenv import load_dotenv
 import os
-import json
 import uuid
 from time import perf_counter
-try:
-    from opentelemetry import trace as otel_trace  # type: ignore
-except Exception:
-    otel_trace = None  # optional
 from datetime import datetime
 #from monitoring.arize_integration import init_arize
 # Load .env file
 load_dotenv()
 
+# Prometheus scrape endpoint on a sidecar port; works even if Phoenix is down
+start_metrics_server()
 
-# Initialize tracing (non-blocking),to not stop programme if it fails
-try:
-    init_arize_tracing()
-except Exception:
-    pass
+if not lazy_imports_enabled():
+    # Pay the import cost before the first render instead of on the first question
+    import bot.sessions  # noqa: F401
+    import monitoring.arize_integration  # noqa: F401
 
-chain = get_chain()
 #arize_session = init_arize()
 
 st.set_page_config(page_title="Manifesto Chatbot", page_icon="🤖")
 st.title("📜 Manifesto Chatbot")
 st.write("Ask me anything about the manifesto.")
+mark("first_render")
+
+# LangChain, Chroma, OpenTelemetry and Phoenix are only imported once the page
+# chrome is on screen (monitoring/startup.py); Streamlit keeps them in
+# sys.modules, so later reruns don't pay for this again.
+with st.spinner("Loading the chatbot..."):
+    from bot.deadline import deadline_scope
+    from bot.hedging import hedge_stats, hedging_enabled
+    from bot.history_store import get_history_store, history_backend, session_from_token, session_token
+    from bot.memory import count_tokens
+    from bot.rate_limit import admission_context
+    from bot.registry import get_registry
+    from bot.sessions import get_session_manager
+    from bot.streaming import AnswerStream
+    from retriever.retriever import get_retriever_config, retrieval_path_stats
+    from monitoring.arize_integration import init_arize_tracing
+    from monitoring.tracing import request_span, set_attributes, stage_summary
+    from monitoring.session_log import get_session_log, log_turn, session_log_enabled
+
+    # Initialize tracing (non-blocking),to not stop programme if it fails
+    try:
+        init_arize_tracing()
+    except Exception:
+        pass
 
 if "session_id" not in st.session_state:
-    st.session_state.session_id = str(uuid.uuid4())
+    # The id is generated here, never taken from the client. With the SQLite
+    # history a reload (or restarted container) can resume, but only through a
+    # token this server signed; anything else starts a new conversation.
+    session_id = None
+    if history_backend() == "sqlite":
+        session_id = session_from_token(st.query_params.get("resume"))
+    st.session_state.session_id = session_id or str(uuid.uuid4())
     st.session_state.session_start = datetime.utcnow().isoformat() + "Z"
+    if history_backend() == "sqlite":
+        st.query_params["resume"] = session_token(st.session_state.session_id)
+
+# LLM/embeddings/Chroma are built once per process and reused across reruns;
+# each session only owns its memory and a thin chain around the shared clients.
+_registry_start = perf_counter()
+session = get_session_manager().get(st.session_state.session_id)
+chain = session.chain
+registry_ms = (perf_counter() - _registry_start) * 1000.0
+_startup = {"first_render": mark("first_render"), "ready": mark("ready")}
+# serve.py and the API server report readiness from their warm-up; a plain
+# `streamlit run app.py` has none, so the first built session is the signal
+ready_without_warmup()
+_reg_stats = get_registry().stats()
+st.sidebar.caption(
+    f"Resources ready in {registry_ms:.1f} ms "
+    f"(built {_reg_stats['builds']}x, reused {_reg_stats['reuses']}x, "
+    f"last build {_reg_stats['last_build_ms']} ms) · "
+    f"{len(get_session_manager())} active sessions · "
+    f"cold start: first render {_startup['first_render']:.0f} ms, ready {_startup['ready']:.0f} ms"
+)
+_rw = chain.rewrite_stats
+st.sidebar.caption(
+    f"Question rewrites: {int(_rw['rewrites'])} run, {int(_rw['skipped'])} skipped "
+    f"(~{_rw['saved_ms_est'] / 1000:.1f} s saved, policy `{chain.rewrite_policy}`)"
+)
+_turn_tokens = getattr(session.memory, "turn_tokens", None)
+if _turn_tokens:
+    st.sidebar.caption(
+        f"History tokens per turn: {', '.join(str(t) for t in list(_turn_tokens)[-8:])} "
+        f"(budget {session.memory.max_tokens})"
+    )
+if session.resources.semantic_cache is not None:
+    _cache_stats = session.resources.semantic_cache.stats()
+    st.sidebar.caption(
+        f"Semantic cache: {_cache_stats['entries']} entries, "
+        f"hit rate {_cache_stats['hit_rate']:.0%}, saved {_cache_stats['saved_ms'] / 1000:.1f} s"
+    )
+
+_stages = {name: s for name, s in stage_summary().items() if s["count"]}
+if _stages:
+    st.sidebar.caption(
+        "Stage p50/p95 ms: " + " · ".join(f"{name} {s['p50']:.0f}/{s['p95']:.0f}" for name, s in _stages.items())
+    )
+
+_paths = retrieval_path_stats()
+if "lexical" in _paths:
+    st.sidebar.caption(
+        f"Lexical-only retrievals: {_paths['lexical']['count']} ({_paths['degraded']['rate']:.1%}; "
+        f"{_paths['degraded']['timeout']} timeouts, {_paths['degraded']['error']} errors), "
+        f"p50 {_paths['lexical']['p50_ms']:.0f} ms"
+    )
+
+if hedging_enabled():
+    for _name, _h in hedge_stats().items():
+        if _h["p99_improvement_ms"] is not None:
+            st.sidebar.caption(
+                f"Hedging {_name}: {_h['hedge_rate']:.1%} of calls hedged, "
+                f"TTFT p99 {_h['p99_primary_ms']:.0f} → {_h['p99_effective_ms']:.0f} ms"
+            )
 
 if "history" not in st.session_state:
     st.session_state.history = []
+    if history_backend() == "sqlite":
+        for ts, message in get_history_store().load(st.session_state.session_id):
+            if message.type in ("human", "ai"):
+                st.session_state.history.append({
+                    "speaker": "You" if message.type == "human" else "Bot",
+                    "text": message.content,
+                    "timestamp": datetime.utcfromtimestamp(ts).isoformat() + "Z",
+                })
 
 query = st.chat_input("Type your question here...")
 
-if query:
-    with st.spinner("Thinking..."):
-        start_ts = perf_counter()
-        result = chain.invoke({"question": query})
-        latency_ms = (perf_counter() - start_ts) * 1000.0
-        answer = result["answer"]
-        # Minimal tracing attributes
-        try:
-            if otel_trace is not None:
-                span = otel_trace.get_current_span()
-                retr_cfg = get_retriever_config()
-                span.set_attribute("app.session_id", st.session_state.get("session_id"))
-                span.set_attribute("rag.k", retr_cfg.get("k"))
-                span.set_attribute("rag.fetch_k", retr_cfg.get("fetch_k"))
-                span.set_attribute("rag.lambda_mult", retr_cfg.get("lambda_mult"))
-                span.set_attribute("rag.latency_ms", round(latency_ms, 2))
-                span.set_attribute("rag.question_length", len(query))
-                span.set_attribute("rag.answer_length", len(answer))
-        except Exception:
-            pass
-        st.session_state.history.append({
-            "speaker": "You",
-            "text": query,
-            "timestamp": datetime.utcnow().isoformat() + "Z"
-        })
-        st.session_state.history.append({
-            "speaker": "Bot",
-            "text": answer,
-            "timestamp": datetime.utcnow().isoformat() + "Z"
-        })
-        #arize_session.log_event({"inputs": query, "outputs": answer})
-
 for message in st.session_state.history:
     # Backwards compatibility if earlier tuples exist
     if isinstance(message, tuple) and len(message) == 2:
@@ -84,25 +144,75 @@ for message in st.session_state.history:
     else:
         st.chat_message("assistant").write(text)
 
-# End session and persist timestamped log
-if st.button("End session and save log"):
-    session_log = {
-        "session_id": st.session_state.get("session_id"),
-        "session_start": st.session_state.get("session_start"),
-        "session_end": datetime.utcnow().isoformat() + "Z",
-        "total_messages": len(st.session_state.get("history", [])),
-        "messages": st.session_state.get("history", []),
-    }
-
-    os.makedirs("logs", exist_ok=True)
-    log_path = os.path.join("logs", f"session_{st.session_state.get('session_id')}.json")
-    with open(log_path, "w", encoding="utf-8") as f:
-        json.dump(session_log, f, ensure_ascii=False, indent=2)
-
-    st.success(f"Session log saved: {log_path}")
-    st.download_button(
-        label="Download session log",
-        data=json.dumps(session_log, ensure_ascii=False, indent=2),
-        file_name=f"session_{st.session_state.get('session_id')}.json",
-        mime="application/json",
-    )
\ No newline at end of file
+if query:
+    st.chat_message("user").write(query)
+    question_ts = datetime.utcnow().isoformat() + "Z"
+    # Tokens are written into the assistant bubble as the answer LLM produces them;
+    # the full chain result (answer + source_documents) is available once it finishes.
+    retr_cfg = get_retriever_config()
+    # One root span per request; the chain's condense/embed/search/mmr/prompt/
+    # generate stage spans (monitoring/tracing.py) nest under it
+    with request_span(
+        "rag.request",
+        app__session_id=st.session_state.get("session_id"),
+        rag__k=retr_cfg.get("k"),
+        rag__fetch_k=retr_cfg.get("fetch_k"),
+        rag__lambda_mult=retr_cfg.get("lambda_mult"),
+        app__registry_ms=round(registry_ms, 3),
+        rag__question_length=len(query),
+    ), admission_context(priority="interactive", session_id=st.session_state.session_id), \
+            deadline_scope(float(os.getenv("CHAT_DEADLINE_S", "60")) or None):
+        stream = AnswerStream(chain, query)
+        with st.chat_message("assistant"):
+            st.write_stream(stream)
+            if (stream.result or {}).get("retrieval_path") == "lexical":
+                st.caption("⚠️ The embeddings service did not answer in time, so the sources were found by keyword search only.")
+        result = stream.result
+        latency_ms = stream.latency_ms
+        session.turns += 1
+        answer = stream.answer
+        set_attributes(
+            rag__latency_ms=round(latency_ms, 2),
+            rag__ttft_ms=round(stream.ttft_ms or latency_ms, 2),
+            rag__answer_length=len(answer),
+            rag__retrieval_path=(result or {}).get("retrieval_path"),
+        )
+    st.session_state.history.append({
+        "speaker": "You",
+        "text": query,
+        "timestamp": question_ts
+    })
+    st.session_state.history.append({
+        "speaker": "Bot",
+        "text": answer,
+        "timestamp": datetime.utcnow().isoformat() + "Z"
+    })
+    # One JSONL line per turn, written off the request thread
+    _turn_tokens = getattr(session.memory, "turn_tokens", None)
+    log_turn(
+        st.session_state.session_id,
+        query,
+        result,
+        turn=session.turns,
+        latency_ms=round(latency_ms, 2),
+        ttft_ms=round(stream.ttft_ms or latency_ms, 2),
+        question_tokens=count_tokens(query),
+        answer_tokens=count_tokens(answer),
+        history_tokens=_turn_tokens[-1] if _turn_tokens else None,
+    )
+    #arize_session.log_event({"inputs": query, "outputs": answer})
+
+# The session log is appended turn by turn (monitoring/session_log.py).
+# It is only flushed and read when the user asks for it, not on every rerun;
+# "ignore" keeps the download from triggering another rerun.
+if session_log_enabled():
+    _log = get_session_log()
+    if (st.session_state.history or os.path.exists(_log.path_for(st.session_state.session_id))) \
+            and st.button("Prepare session log"):
+        st.download_button(
+            label="Download session log",
+            data=_log.export(st.session_state.session_id),
+            file_name=f"session_{st.session_state.session_id}.jsonl",
+            mime="application/x-ndjson",
+            on_click="ignore",
+        )
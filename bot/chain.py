@@ -1,31 +1,421 @@
 from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.combine_documents.stuff import StuffDocumentsChain
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+from langchain.chains.question_answering.stuff_prompt import PROMPT_SELECTOR
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from langchain_core.documents import Document
+from langchain_core.runnables.config import run_in_executor
 from langchain_openai import AzureChatOpenAI
-from retriever.retriever import get_retriever
+from retriever.retriever import (
+    adopt_retrieval,
+    get_retriever_config,
+    note_embedding_failure,
+    record_retrieval,
+    retrieval_path,
+)
 from bot.memory import get_memory
+from bot.clients import get_http_clients
+from bot.hedging import hedged
+from bot.rewrite import get_rewrite_policy, should_rewrite
+from bot.semantic_cache import cache_key
+from bot.singleflight import SingleFlight, normalize_question
+from bot import speculative
+from monitoring import metrics
+from monitoring.tracing import set_attributes, stage
+from monitoring.usage import LLMUsageCallback
 from dotenv import load_dotenv
 
+import asyncio
 import os
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+from pydantic import Field
 
 # Load .env file
 load_dotenv()
 
-def get_chain():
-    llm = AzureChatOpenAI(
+# Shared across all chains in the process: identical standalone questions that
+# are in flight at the same time run retrieval + answer generation only once.
+_ANSWER_FLIGHTS = SingleFlight("answer")
+
+REWRITES = metrics.counter("rewrite_decisions_total", "Condense-question decisions by outcome and reason")
+REWRITE_SAVED_MS = metrics.counter("rewrite_saved_ms_total", "Estimated latency saved by skipped rewrites")
+# Running average of real rewrite calls, used to estimate what a skip saved
+_REWRITE_EMA = {"ms": None}
+
+
+class ManifestoRetrievalChain(ConversationalRetrievalChain):
+    """ConversationalRetrievalChain whose retrieve+answer step is coalesced.
+
+    Same flow as the base class: condense the question (per session, since it
+    depends on the chat history), then retrieve and answer. The second half only
+    depends on the standalone question, the corpus and the retriever settings,
+    so concurrent requests that agree on those share one computation, and a
+    semantic cache (bot/semantic_cache.py) can answer paraphrases without it.
+    Whether the condense step runs at all is decided by `REWRITE_POLICY`
+    (bot/rewrite.py); `rewrite_stats` tracks skips and estimated savings.
+    With `SPECULATIVE_RETRIEVAL=1` retrieval for the raw question runs during
+    the rewrite and is reused when the rewrite barely changed it
+    (bot/speculative.py).
+    """
+
+    index_version: str = ""
+    semantic_cache: Any = None
+    rewrite_policy: str = Field(default_factory=get_rewrite_policy)
+    rewrite_stats: Dict[str, float] = Field(
+        default_factory=lambda: {"rewrites": 0, "skipped": 0, "rewrite_ms": 0.0, "saved_ms_est": 0.0}
+    )
+
+    def _flight_key(self, question: str, new_question: str):
+        cfg = tuple(sorted(get_retriever_config().items()))
+        # Without rephrasing, the answer prompt sees the original wording too
+        asked = "" if self.rephrase_question else normalize_question(question)
+        return (normalize_question(new_question), asked, self.index_version, cfg)
+
+    def _call(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        with record_retrieval():
+            return self._answer(inputs, run_manager)
+
+    async def _acall(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        with record_retrieval():
+            return await self._aanswer(inputs, run_manager)
+
+    def _answer(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        _run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
+        question = inputs["question"]
+        get_chat_history = self.get_chat_history or _get_chat_history
+        chat_history_str = get_chat_history(inputs["chat_history"])
+
+        rewrite, reason = should_rewrite(self.rewrite_policy, question, inputs["chat_history"])
+        spec_docs = None
+        if chat_history_str and rewrite:
+            spec = None
+            if speculative.speculation_enabled():
+                spec = speculative.submit(self._timed_docs, question, inputs, _run_manager)
+            start = perf_counter()
+            try:
+                with stage("condense"):
+                    new_question = self.question_generator.run(
+                        question=question,
+                        chat_history=chat_history_str,
+                        callbacks=_run_manager.get_child(),
+                    )
+            except BaseException:
+                if spec is not None:
+                    # A running speculation cannot be stopped, but its side effects stay deferred
+                    spec.cancel()
+                raise
+            self._record_rewrite(reason, (perf_counter() - start) * 1000.0)
+            if spec is not None:
+                spec_docs = self._resolve_speculation(spec, question, new_question)
+        else:
+            new_question = question
+            self._record_rewrite(reason if chat_history_str else "no_history", None)
+
+        hit, cache_vec = self._cache_lookup(new_question)
+        if hit is not None:
+            return self._output(_cached_docs(hit), hit["answer"], new_question, "answer_cache")
+
+        def compute():
+            start = perf_counter()
+            docs, answer = self._retrieve_and_answer(new_question, inputs, chat_history_str, _run_manager, spec_docs)
+            self._cache_store(new_question, cache_vec, answer, docs, start)
+            return docs, answer, retrieval_path()
+
+        docs, answer, path = _ANSWER_FLIGHTS.do(self._flight_key(question, new_question), compute)
+        return self._output(docs, answer, new_question, path)
+
+    async def _aanswer(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        _run_manager = run_manager or AsyncCallbackManagerForChainRun.get_noop_manager()
+        question = inputs["question"]
+        get_chat_history = self.get_chat_history or _get_chat_history
+        chat_history_str = get_chat_history(inputs["chat_history"])
+
+        rewrite, reason = should_rewrite(self.rewrite_policy, question, inputs["chat_history"])
+        spec_docs = None
+        if chat_history_str and rewrite:
+            spec = None
+            if speculative.speculation_enabled():
+                spec = asyncio.ensure_future(self._atimed_docs(question, inputs, _run_manager))
+            start = perf_counter()
+            try:
+                with stage("condense"):
+                    new_question = await self.question_generator.arun(
+                        question=question,
+                        chat_history=chat_history_str,
+                        callbacks=_run_manager.get_child(),
+                    )
+            except BaseException:
+                if spec is not None:
+                    spec.cancel()
+                raise
+            self._record_rewrite(reason, (perf_counter() - start) * 1000.0)
+            if spec is not None:
+                spec_docs = await self._aresolve_speculation(spec, question, new_question)
+        else:
+            new_question = question
+            self._record_rewrite(reason if chat_history_str else "no_history", None)
+
+        hit, cache_vec = await self._acache_lookup(new_question)
+        if hit is not None:
+            return self._output(_cached_docs(hit), hit["answer"], new_question, "answer_cache")
+
+        async def compute():
+            start = perf_counter()
+            docs, answer = await self._aretrieve_and_answer(
+                new_question, inputs, chat_history_str, _run_manager, spec_docs
+            )
+            self._cache_store(new_question, cache_vec, answer, docs, start)
+            return docs, answer, retrieval_path()
+
+        docs, answer, path = await _ANSWER_FLIGHTS.ado(self._flight_key(question, new_question), compute)
+        return self._output(docs, answer, new_question, path)
+
+    def _record_rewrite(self, reason: str, rewrite_ms: Optional[float]) -> None:
+        stats = self.rewrite_stats
+        if rewrite_ms is not None:
+            stats["rewrites"] += 1
+            stats["rewrite_ms"] += rewrite_ms
+            prev = _REWRITE_EMA["ms"]
+            _REWRITE_EMA["ms"] = rewrite_ms if prev is None else 0.8 * prev + 0.2 * rewrite_ms
+            REWRITES.inc(labels={"decision": "rewrite", "reason": reason})
+            set_attributes(rag__rewrite_skipped=False, rag__rewrite_reason=reason, rag__rewrite_ms=round(rewrite_ms, 2))
+            return
+        saved = _REWRITE_EMA["ms"] or 0.0
+        stats["skipped"] += 1
+        stats["saved_ms_est"] += saved
+        REWRITES.inc(labels={"decision": "skip", "reason": reason})
+        REWRITE_SAVED_MS.inc(saved)
+        set_attributes(rag__rewrite_skipped=True, rag__rewrite_reason=reason, rag__rewrite_saved_ms_est=round(saved, 2))
+
+    def _timed_docs(self, question, inputs, run_manager):
+        # Own holder: a discarded speculation must not report its path or fill caches
+        with record_retrieval(speculative=True) as info:
+            start = perf_counter()
+            docs = self._get_docs(question, inputs, run_manager=run_manager)
+            return docs, (perf_counter() - start) * 1000.0, info
+
+    async def _atimed_docs(self, question, inputs, run_manager):
+        with record_retrieval(speculative=True) as info:
+            start = perf_counter()
+            docs = await self._aget_docs(question, inputs, run_manager=run_manager)
+            return docs, (perf_counter() - start) * 1000.0, info
+
+    def _resolve_speculation(self, spec, question, new_question) -> Optional[List[Document]]:
+        """Speculative docs if the rewrite kept the meaning, else None (retrieve again)."""
+        used, score = speculative.questions_match(
+            question, new_question, getattr(self.retriever, "embeddings", None), speculative.speculative_vector(spec)
+        )
+        if not used:
+            spec.cancel()
+            return self._record_speculation(False, score)
+        start = perf_counter()
+        try:
+            docs, spec_ms, info = spec.result()
+        except Exception as e:
+            print(f"⚠️ Speculative retrieval failed: {e}")
+            return self._record_speculation(False, score)
+        adopt_retrieval(info)
+        # Only the part of the retrieval that overlapped the rewrite was saved
+        return self._record_speculation(True, score, spec_ms - (perf_counter() - start) * 1000.0, docs)
+
+    async def _aresolve_speculation(self, spec, question, new_question) -> Optional[List[Document]]:
+        used, score = await run_in_executor(
+            None,
+            speculative.questions_match,
+            question,
+            new_question,
+            getattr(self.retriever, "embeddings", None),
+            speculative.speculative_vector(spec),
+        )
+        if not used:
+            spec.cancel()
+            return self._record_speculation(False, score)
+        start = perf_counter()
+        try:
+            docs, spec_ms, info = await spec
+        except Exception as e:
+            print(f"⚠️ Speculative retrieval failed: {e}")
+            return self._record_speculation(False, score)
+        adopt_retrieval(info)
+        return self._record_speculation(True, score, spec_ms - (perf_counter() - start) * 1000.0, docs)
+
+    def _record_speculation(self, used, score, saved_ms=0.0, docs=None):
+        speculative.record(used, saved_ms)
+        set_attributes(
+            rag__speculation_used=used,
+            rag__speculation_similarity=round(score, 4),
+            rag__speculation_saved_ms=round(max(0.0, saved_ms), 2) if used else None,
+        )
+        return docs if used else None
+
+    def _cache_lookup(self, question):
+        if self.semantic_cache is None:
+            return None, None
+        try:
+            return self.semantic_cache.lookup(question, timeout_s=self._embed_timeout_s())
+        except Exception as e:  # cache trouble must never fail the request
+            note_embedding_failure(e)
+            print(f"⚠️ Semantic cache lookup failed: {e!r}")
+            return None, None
+
+    async def _acache_lookup(self, question):
+        if self.semantic_cache is None:
+            return None, None
+        try:
+            return await self.semantic_cache.alookup(question, timeout_s=self._embed_timeout_s())
+        except Exception as e:
+            note_embedding_failure(e)
+            print(f"⚠️ Semantic cache lookup failed: {e!r}")
+            return None, None
+
+    def _embed_timeout_s(self) -> Optional[float]:
+        # Same budget as the retriever's own embedding (none without a lexical fallback)
+        timeout = getattr(self.retriever, "embed_timeout_s", None)
+        return timeout() if timeout is not None else None
+
+    def _cache_store(self, question, vec, answer, docs, start):
+        if self.semantic_cache is None or vec is None or not docs:
+            return
+        self.semantic_cache.store(question, vec, answer, docs, (perf_counter() - start) * 1000.0)
+
+    def _retrieve_and_answer(self, new_question, inputs, chat_history_str, run_manager, docs=None):
+        if docs is None:
+            docs = self._get_docs(new_question, inputs, run_manager=run_manager)
+        if self.response_if_no_docs_found is not None and len(docs) == 0:
+            return docs, self.response_if_no_docs_found
+        new_inputs = inputs.copy()
+        if self.rephrase_question:
+            new_inputs["question"] = new_question
+        new_inputs["chat_history"] = chat_history_str
+        if isinstance(self.combine_docs_chain, StuffDocumentsChain):
+            # Same as combine_docs_chain.run, split so prompt assembly and
+            # generation are timed separately
+            with stage("prompt", rag__documents=len(docs)):
+                llm_inputs = self.combine_docs_chain._get_inputs(docs, **new_inputs)
+            with stage("generate"):
+                answer = self.combine_docs_chain.llm_chain.predict(callbacks=run_manager.get_child(), **llm_inputs)
+            return docs, answer
+        with stage("generate"):
+            answer = self.combine_docs_chain.run(
+                input_documents=docs,
+                callbacks=run_manager.get_child(),
+                **new_inputs,
+            )
+        return docs, answer
+
+    async def _aretrieve_and_answer(self, new_question, inputs, chat_history_str, run_manager, docs=None):
+        if docs is None:
+            docs = await self._aget_docs(new_question, inputs, run_manager=run_manager)
+        if self.response_if_no_docs_found is not None and len(docs) == 0:
+            return docs, self.response_if_no_docs_found
+        new_inputs = inputs.copy()
+        if self.rephrase_question:
+            new_inputs["question"] = new_question
+        new_inputs["chat_history"] = chat_history_str
+        if isinstance(self.combine_docs_chain, StuffDocumentsChain):
+            with stage("prompt", rag__documents=len(docs)):
+                llm_inputs = self.combine_docs_chain._get_inputs(docs, **new_inputs)
+            with stage("generate"):
+                answer = await self.combine_docs_chain.llm_chain.apredict(
+                    callbacks=run_manager.get_child(), **llm_inputs
+                )
+            return docs, answer
+        with stage("generate"):
+            answer = await self.combine_docs_chain.arun(
+                input_documents=docs,
+                callbacks=run_manager.get_child(),
+                **new_inputs,
+            )
+        return docs, answer
+
+    def _output(self, docs, answer, new_question, path=None) -> Dict[str, Any]:
+        # Which retrieval path served this answer: dense, hybrid, lexical (degraded) or answer_cache
+        output: Dict[str, Any] = {self.output_key: answer, "retrieval_path": path}
+        if self.return_source_documents:
+            output["source_documents"] = docs
+        if self.return_generated_question:
+            output["generated_question"] = new_question
+        return output
+
+
+def _cached_docs(entry):
+    return [
+        Document(id=s.get("id"), page_content=s["page_content"], metadata=s["metadata"])
+        for s in entry.get("sources", [])
+    ]
+
+
+def answer_cache_key(llm, index_version: str) -> str:
+    """Semantic-cache key: the corpus, the answering model and every prompt text the chain uses."""
+    from bot.memory import SYSTEM_PROMPT
+    prompts = [SYSTEM_PROMPT, CONDENSE_QUESTION_PROMPT.pretty_repr(), PROMPT_SELECTOR.get_prompt(llm).pretty_repr()]
+    return cache_key(index_version, getattr(llm, "model_label", type(llm).__name__), prompts)
+
+
+def get_llm(streaming=False, tags=None):
+    http_client, http_async_client = get_http_clients("interactive")
+    azure = AzureChatOpenAI(
         azure_deployment="gpt-4.1",
         openai_api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2023-12-01-preview"),
         openai_api_key=os.getenv("AZURE_OPENAI_API_KEY"),
         azure_endpoint=os.getenv("AZURE_ENDPOINT"),
-        temperature=0
+        temperature=0,
+        streaming=streaming,
+        http_client=http_client,
+        http_async_client=http_async_client,
     )
-    retriever = get_retriever()
-    memory = get_memory()
+    # Deadline-aware, optionally hedged (bot/hedging.py); tags and callbacks
+    # sit on the wrapper so they fire once per answer, not per attempt
+    return hedged(azure, "gpt-4.1", streaming=streaming, tags=tags, callbacks=[LLMUsageCallback("gpt-4.1")])
+
+
+def get_chain(llm=None, retriever=None, memory=None, condense_llm=None, index_version=None, semantic_cache=None):
+    # Heavy clients come from the process-wide registry unless passed in,
+    # so building a chain is cheap and only the memory is per-chain.
+    if llm is None or retriever is None:
+        from bot.registry import get_resources
+        resources = get_resources()
+        if llm is None:
+            llm, condense_llm = resources.llm, condense_llm or resources.condense_llm
+        if retriever is None:
+            retriever = resources.retriever
+        if index_version is None:
+            index_version = resources.index_version
+        if semantic_cache is None:
+            semantic_cache = resources.semantic_cache
+    if memory is None:
+        memory = get_memory()
 
-    chain = ConversationalRetrievalChain.from_llm(
+    chain = ManifestoRetrievalChain.from_llm(
         llm=llm,
+        # Separate, non-streaming model for the rephrase step so only the
+        # answer LLM emits tokens (see bot/streaming.py)
+        condense_question_llm=condense_llm,
         retriever=retriever,
         memory=memory,
         return_source_documents=True,
         output_key="answer",
+        index_version=index_version or "",
+        semantic_cache=semantic_cache,
         #return_only_outputs=False  # Changed from "answer" to "response" to match expected output
     )
     return chain
@@ -0,0 +1,139 @@
+"""Shared, keep-alive HTTP clients for every Azure OpenAI client in the process.
+
+The chat LLM, the condense LLM, the embeddings (app and ingest) and the eval
+judge used to get one connection pool each from the SDK, so each paid its own
+TCP/TLS handshakes. Here one sync and one async transport (one pool each) are
+shared by all of them, wrapped per priority by the admission-control transport
+(bot/rate_limit.py). Pool size, keep-alive and timeouts come from `HTTP_*` env
+vars. `HTTP2=1` turns on HTTP/2 when the `h2` package is installed. The async
+pool belongs to the first event loop that uses it (the API server's loop).
+
+New vs. reused connections are counted through httpcore's `trace` request
+extension and exported as `http_connections_total`.
+"""
+import os
+import threading
+from typing import Dict, Tuple
+
+import httpx
+from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+
+from bot.rate_limit import AdmissionTransport, AsyncAdmissionTransport, admission_enabled, get_admission_controller
+from monitoring import metrics
+
+HTTP_CONNECTIONS = metrics.counter("http_connections_total", "Azure HTTP requests by connection (new/reused) and TLS handshakes")
+
+_LOCK = threading.Lock()
+_TRANSPORTS: Dict[str, object] = {}
+_CLIENTS: Dict[Tuple[str, str], object] = {}
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "32")),
+        max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "16")),
+        keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "60")),
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        float(os.getenv("HTTP_READ_TIMEOUT_S", "60")),
+        connect=float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "5")),
+    )
+
+
+def _http2() -> bool:
+    if os.getenv("HTTP2", "0").lower() not in ("1", "true", "yes"):
+        return False
+    try:
+        import h2  # noqa: F401  (httpx needs it for HTTP/2)
+        return True
+    except ImportError:
+        print("⚠️ HTTP2=1 but the 'h2' package is not installed; using HTTP/1.1")
+        return False
+
+
+def _on_trace(event: str, info: dict) -> None:
+    if not event.endswith(".started"):
+        return
+    if event == "connection.connect_tcp.started":
+        HTTP_CONNECTIONS.inc(labels={"connection": "new"})
+    elif event == "connection.start_tls.started":
+        HTTP_CONNECTIONS.inc(labels={"connection": "tls_handshake"})
+    elif event.endswith("send_request_headers.started"):
+        HTTP_CONNECTIONS.inc(labels={"connection": "request"})
+
+
+async def _aon_trace(event: str, info: dict) -> None:
+    _on_trace(event, info)
+
+
+def _trace_request(request: httpx.Request) -> None:
+    request.extensions["trace"] = _on_trace
+
+
+async def _atrace_request(request: httpx.Request) -> None:
+    request.extensions["trace"] = _aon_trace
+
+
+def _shared_transport(kind: str):
+    transport = _TRANSPORTS.get(kind)
+    if transport is None:
+        cls = httpx.HTTPTransport if kind == "sync" else httpx.AsyncHTTPTransport
+        transport = _TRANSPORTS[kind] = cls(limits=_limits(), http2=_http2())
+    return transport
+
+
+def get_http_clients(priority: str = "interactive") -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """(sync, async) httpx clients for the Azure SDK, shared per priority and pooled per process."""
+    with _LOCK:
+        sync_client = _CLIENTS.get(("sync", priority))
+        if sync_client is None:
+            transport = _shared_transport("sync")
+            if admission_enabled():
+                transport = AdmissionTransport(transport, get_admission_controller(), priority)
+            sync_client = _CLIENTS[("sync", priority)] = DefaultHttpxClient(
+                transport=transport, timeout=_timeout(), event_hooks={"request": [_trace_request]}
+            )
+        async_client = _CLIENTS.get(("async", priority))
+        if async_client is None:
+            transport = _shared_transport("async")
+            if admission_enabled():
+                transport = AsyncAdmissionTransport(transport, get_admission_controller(), priority)
+            async_client = _CLIENTS[("async", priority)] = DefaultAsyncHttpxClient(
+                transport=transport, timeout=_timeout(), event_hooks={"request": [_atrace_request]}
+            )
+    return sync_client, async_client
+
+
+def with_request_timeout(embeddings, timeout_s: float):
+    """`embeddings` whose HTTP requests give up after `timeout_s`, without retries.
+
+    The timeout is httpx's, so a request that runs out of budget is aborted and
+    its admission slot released right away, instead of running on until
+    `HTTP_READ_TIMEOUT_S`. The copy shares the pooled clients. Stand-ins (the
+    fakes) provide their own `with_request_timeout`.
+    """
+    own = getattr(embeddings, "with_request_timeout", None)
+    if own is not None:
+        return own(timeout_s)
+    update = {}
+    for field in ("client", "async_client"):
+        resource = getattr(embeddings, field, None)
+        sdk_client = getattr(resource, "_client", None)  # langchain keeps `OpenAI(...).embeddings`
+        if sdk_client is not None:
+            update[field] = sdk_client.with_options(timeout=timeout_s, max_retries=0).embeddings
+    return embeddings.model_copy(update=update) if update else embeddings
+
+
+def connection_stats() -> Dict[str, float]:
+    requests = HTTP_CONNECTIONS.value({"connection": "request"})
+    new = HTTP_CONNECTIONS.value({"connection": "new"})
+    return {
+        "requests": requests,
+        "new_connections": new,
+        "tls_handshakes": HTTP_CONNECTIONS.value({"connection": "tls_handshake"}),
+        "reused": max(0.0, requests - new),
+        "reuse_rate": round(max(0.0, requests - new) / requests, 3) if requests else 0.0,
+    }
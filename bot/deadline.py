@@ -0,0 +1,63 @@
+"""Per-request end-to-end deadline, carried in a contextvar.
+
+`deadline_scope(seconds)` opens a deadline for everything inside the block,
+including threads and tasks started from it (they copy the context). Every
+pipeline stage checks it on entry (`monitoring.tracing.stage`), and the LLM
+wrapper (bot/hedging.py) bounds its waits and the Azure request timeout by
+what is left. Nested scopes can only shorten the deadline.
+"""
+import contextvars
+from contextlib import contextmanager
+from time import monotonic
+from typing import Iterator, Optional
+
+_DEADLINE: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request ran out of time; `stage` names the stage that noticed."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"deadline exceeded before/during {stage}")
+        self.stage = stage
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """Run the block under a deadline `seconds` from now.
+
+    None means no deadline; zero or less means the time is already up, so the
+    first `check_deadline` raises.
+    """
+    if seconds is None:
+        yield
+        return
+    deadline = monotonic() + seconds
+    current = _DEADLINE.get()
+    token = _DEADLINE.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+@contextmanager
+def no_deadline() -> Iterator[None]:
+    """Run the block without the caller's deadline (work shared by requests with different deadlines)."""
+    token = _DEADLINE.set(None)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def remaining_s() -> Optional[float]:
+    """Seconds left (may be negative), or None outside any deadline scope."""
+    deadline = _DEADLINE.get()
+    return None if deadline is None else deadline - monotonic()
+
+
+def check_deadline(stage: str) -> None:
+    remaining = remaining_s()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(stage)
@@ -0,0 +1,173 @@
+"""Offline stand-ins for the Azure clients.
+
+Set `CHATBOT_FAKE_LLM=1` and the registry builds these instead of the Azure
+LLM/embeddings clients, so the API server can be load-tested locally without
+a key or network. Latency is configurable to mimic real generation, including
+an occasional slow first token (`FAKE_LLM_SLOW_P` / `FAKE_LLM_SLOW_TTFT_S`) to
+exercise hedging. The fake embeddings can be slow (`FAKE_EMBED_LATENCY_S`,
+`FAKE_EMBED_SLOW_P` / `FAKE_EMBED_SLOW_S`) or fail (`FAKE_EMBED_FAIL_P`) to
+exercise the lexical fallback.
+"""
+import asyncio
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from bot.hedging import hedged
+from monitoring.usage import LLMUsageCallback
+
+FAKE_ANSWER = (
+    "This is a **fake answer** from the local stand-in model. "
+    "It streams word by word so latency and throughput can be measured offline."
+)
+
+
+def use_fakes() -> bool:
+    return os.getenv("CHATBOT_FAKE_LLM", "").lower() in ("1", "true", "yes")
+
+
+class FakeStreamingChatModel(FakeListChatModel):
+    """FakeListChatModel that emits per-word token callbacks like `streaming=True` Azure."""
+
+    streaming: bool = False
+    first_token_latency_s: float = 0.0
+    token_latency_s: float = 0.0
+    slow_probability: float = 0.0
+    slow_first_token_latency_s: float = 0.0
+
+    def _ttft_s(self) -> float:
+        if self.slow_probability and random.random() < self.slow_probability:
+            return self.slow_first_token_latency_s
+        return self.first_token_latency_s
+
+    def _words(self) -> List[str]:
+        text = self.responses[self.i % len(self.responses)]
+        self.i = (self.i + 1) % len(self.responses)
+        words = text.split(" ")
+        return [w if n == len(words) - 1 else w + " " for n, w in enumerate(words)]
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self._ttft_s())
+        words = self._words()
+        for w in words:
+            if self.streaming and run_manager:
+                run_manager.on_llm_new_token(w)
+            time.sleep(self.token_latency_s)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(words)))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self._ttft_s())
+        words = self._words()
+        for w in words:
+            if self.streaming and run_manager:
+                await run_manager.on_llm_new_token(w)
+            await asyncio.sleep(self.token_latency_s)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(words)))])
+
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self._ttft_s())
+        for w in self._words():
+            yield ChatGenerationChunk(message=AIMessageChunk(content=w))
+            time.sleep(self.token_latency_s)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self._ttft_s())
+        for w in self._words():
+            yield ChatGenerationChunk(message=AIMessageChunk(content=w))
+            await asyncio.sleep(self.token_latency_s)
+
+
+def get_fake_llm(streaming=False, tags=None):
+    fake = FakeStreamingChatModel(
+        responses=[os.getenv("FAKE_LLM_ANSWER", FAKE_ANSWER)],
+        streaming=streaming,
+        first_token_latency_s=float(os.getenv("FAKE_LLM_TTFT_S", "0.3")),
+        token_latency_s=float(os.getenv("FAKE_LLM_TOKEN_S", "0.02")),
+        slow_probability=float(os.getenv("FAKE_LLM_SLOW_P", "0")),
+        slow_first_token_latency_s=float(os.getenv("FAKE_LLM_SLOW_TTFT_S", "5")),
+    )
+    # Same wrapper as the Azure model, so deadlines and hedging work offline too
+    return hedged(fake, "fake", streaming=streaming, tags=tags, callbacks=[LLMUsageCallback("fake")])
+
+
+class FakeEmbeddings(DeterministicFakeEmbedding):
+    """DeterministicFakeEmbedding with query latency and failures like a struggling endpoint."""
+
+    latency_s: float = 0.0
+    slow_probability: float = 0.0
+    slow_latency_s: float = 0.0
+    failure_probability: float = 0.0
+    request_timeout_s: Optional[float] = None
+
+    def with_request_timeout(self, timeout_s: float) -> "FakeEmbeddings":
+        """Like `bot.clients.with_request_timeout`: a slower call gives up after `timeout_s`."""
+        return self.model_copy(update={"request_timeout_s": timeout_s})
+
+    def _delay_s(self) -> float:
+        if self.failure_probability and random.random() < self.failure_probability:
+            raise ConnectionError("fake embeddings endpoint unavailable")
+        if self.slow_probability and random.random() < self.slow_probability:
+            return self.slow_latency_s
+        return self.latency_s
+
+    def _timed_out(self, delay: float) -> bool:
+        return self.request_timeout_s is not None and delay > self.request_timeout_s
+
+    def embed_query(self, text: str) -> List[float]:
+        delay = self._delay_s()
+        if self._timed_out(delay):
+            time.sleep(self.request_timeout_s)
+            raise TimeoutError("fake embeddings request timed out")
+        time.sleep(delay)
+        return super().embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        delay = self._delay_s()
+        if self._timed_out(delay):
+            await asyncio.sleep(self.request_timeout_s)
+            raise TimeoutError("fake embeddings request timed out")
+        await asyncio.sleep(delay)
+        return super().embed_query(text)
+
+
+def get_fake_embeddings():
+    # Same dimensionality as text-embedding-3-large so the real Chroma store can be queried
+    return FakeEmbeddings(
+        size=int(os.getenv("FAKE_EMBEDDING_DIM", "3072")),
+        latency_s=float(os.getenv("FAKE_EMBED_LATENCY_S", "0")),
+        slow_probability=float(os.getenv("FAKE_EMBED_SLOW_P", "0")),
+        slow_latency_s=float(os.getenv("FAKE_EMBED_SLOW_S", "5")),
+        failure_probability=float(os.getenv("FAKE_EMBED_FAIL_P", "0")),
+    )
@@ -0,0 +1,349 @@
+"""Deadline-aware, optionally hedged wrapper around the chat models.
+
+`get_llm` (bot/chain.py) and the fakes return a `HedgedChatModel` around the
+real client. Each call is bounded by the request deadline (bot/deadline.py):
+waits stop when it passes and the Azure request timeout is set to what is
+left. With `LLM_HEDGE=1`, if the first attempt has not produced its first
+token (its whole answer, for the non-streaming condense model) within
+`LLM_HEDGE_AFTER_MS`, or by default the recent p95 of that, a duplicate
+request is fired and whichever answers first is used. The loser is dropped
+at its first token, which is still recorded, so `llm_ttft_ms{attempt="primary"}`
+keeps measuring the unhedged latency and `hedge_stats()` can report the p99
+improvement against `attempt="effective"`.
+"""
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+from time import perf_counter
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream, generate_from_stream
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+from bot.deadline import DeadlineExceeded, remaining_s
+from monitoring import metrics
+
+TTFT_MS = metrics.histogram("llm_ttft_ms", "Time to first token (or full answer) by model, mode and attempt")
+HEDGES = metrics.counter("llm_hedges_total", "Hedged LLM requests by outcome (fired/won/lost)")
+HEDGE_CALLS = metrics.counter("llm_hedge_calls_total", "LLM calls through the hedging wrapper by mode")
+DEADLINE_ERRORS = metrics.counter("llm_deadline_exceeded_total", "LLM calls cut off by the request deadline")
+
+
+def hedging_enabled() -> bool:
+    return os.getenv("LLM_HEDGE", "0").lower() in ("1", "true", "yes")
+
+
+class HedgedChatModel(BaseChatModel):
+    """Chat model that races a duplicate request against a slow first attempt."""
+
+    inner: BaseChatModel
+    model_label: str = "gpt-4.1"
+    streaming: bool = False
+    hedge: bool = False
+    hedge_after_ms: Optional[float] = None
+    min_samples: int = 20
+    fallback_after_ms: float = 3000.0
+    max_hedges: int = 1
+
+    @property
+    def _llm_type(self) -> str:
+        return f"hedged-{self.inner._llm_type}"
+
+    @property
+    def _labels(self) -> Dict[str, str]:
+        return {"model": self.model_label, "mode": "stream" if self.streaming else "full"}
+
+    def hedge_threshold_ms(self) -> float:
+        """Fixed `hedge_after_ms`, else the primary attempts' recent p95 once there are enough samples."""
+        if self.hedge_after_ms:
+            return self.hedge_after_ms
+        summary = TTFT_MS.summary({**self._labels, "attempt": "primary"})
+        if summary["count"] >= self.min_samples and "p95" in summary:
+            return summary["p95"]
+        return self.fallback_after_ms
+
+    def _inner_kwargs(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        remaining = remaining_s()
+        if remaining is not None and "request_timeout" in type(self.inner).model_fields:
+            # Forwarded by the openai SDK as the per-request timeout
+            kwargs = {**kwargs, "timeout": max(remaining, 0.001)}
+        return kwargs
+
+    # -- attempts -----------------------------------------------------------
+
+    def _attempt_factory(self, messages, stop, kwargs) -> Callable[[], Iterator[Any]]:
+        if self.streaming:
+            return lambda: self.inner._stream(messages, stop=stop, **self._inner_kwargs(kwargs))
+        return lambda: iter([self.inner._generate(messages, stop=stop, **self._inner_kwargs(kwargs))])
+
+    def _aattempt_factory(self, messages, stop, kwargs) -> Callable[[], AsyncIterator[Any]]:
+        if self.streaming:
+            return lambda: self.inner._astream(messages, stop=stop, **self._inner_kwargs(kwargs))
+
+        async def once():
+            yield await self.inner._agenerate(messages, stop=stop, **self._inner_kwargs(kwargs))
+        return once
+
+    def _observe_first(self, attempt: int, started: float) -> None:
+        TTFT_MS.observe((perf_counter() - started) * 1000.0, {**self._labels, "attempt": "primary" if attempt == 0 else "hedge"})
+
+    def _on_winner(self, winner: int, started: float, launched: int) -> None:
+        TTFT_MS.observe((perf_counter() - started) * 1000.0, {**self._labels, "attempt": "effective"})
+        if launched > 1:
+            HEDGES.inc(labels={**self._labels, "outcome": "won" if winner > 0 else "lost"})
+
+    def _wait_s(self, hedge_at: Optional[float]) -> Optional[float]:
+        waits = [w for w in (remaining_s(), None if hedge_at is None else hedge_at - perf_counter()) if w is not None]
+        return max(0.0, min(waits)) if waits else None
+
+    def _race(self, attempt: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+        """Items of the first attempt to produce one; duplicates fired after the hedge threshold."""
+        HEDGE_CALLS.inc(labels=self._labels)
+        events: "queue.Queue" = queue.Queue()
+        stops: List[threading.Event] = []
+        started = perf_counter()
+
+        def launch() -> None:
+            n, stop_event = len(stops), threading.Event()
+            stops.append(stop_event)
+
+            def run() -> None:
+                begun = perf_counter()
+                it = None
+                try:
+                    it = attempt()
+                    for i, item in enumerate(it):
+                        if i == 0:
+                            self._observe_first(n, begun)
+                        if stop_event.is_set():
+                            break
+                        events.put((n, "item", item))
+                    else:
+                        events.put((n, "done", None))
+                except BaseException as e:
+                    events.put((n, "error", e))
+                finally:
+                    getattr(it, "close", lambda: None)()  # drops a losing HTTP stream
+
+            # Same context as the caller (admission priority, deadline, trace)
+            threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True).start()
+
+        threshold_s = self.hedge_threshold_ms() / 1000.0
+        hedge_at = started + threshold_s if self.hedge and self.max_hedges > 0 else None
+        winner, failed = None, set()
+        launch()
+        try:
+            while True:
+                try:
+                    n, kind, payload = events.get(timeout=self._wait_s(hedge_at if winner is None else None))
+                except queue.Empty:
+                    if winner is not None or hedge_at is None or perf_counter() < hedge_at:
+                        DEADLINE_ERRORS.inc(labels=self._labels)
+                        raise DeadlineExceeded("generate")
+                    launch()
+                    HEDGES.inc(labels={**self._labels, "outcome": "fired"})
+                    hedge_at = perf_counter() + threshold_s if len(stops) <= self.max_hedges else None
+                    continue
+                if winner is None:
+                    if kind == "error":
+                        failed.add(n)
+                        if len(failed) == len(stops):
+                            raise payload
+                        continue
+                    winner = n
+                    self._on_winner(n, started, len(stops))
+                    for i, stop_event in enumerate(stops):
+                        if i != n:
+                            stop_event.set()
+                if n != winner:
+                    continue
+                if kind == "item":
+                    yield payload
+                elif kind == "done":
+                    return
+                else:
+                    raise payload
+        finally:
+            for stop_event in stops:
+                stop_event.set()
+
+    async def _arace(self, attempt: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        HEDGE_CALLS.inc(labels=self._labels)
+        events: "asyncio.Queue" = asyncio.Queue()
+        stops: List[asyncio.Event] = []
+        tasks: List[asyncio.Task] = []
+        started = perf_counter()
+
+        def launch() -> None:
+            n, stop_event = len(stops), asyncio.Event()
+            stops.append(stop_event)
+
+            async def run() -> None:
+                begun = perf_counter()
+                it = attempt()  # async generator: nothing runs until iterated
+                try:
+                    first = True
+                    async for item in it:
+                        if first:
+                            self._observe_first(n, begun)
+                            first = False
+                        if stop_event.is_set():
+                            break
+                        events.put_nowait((n, "item", item))
+                    else:
+                        events.put_nowait((n, "done", None))
+                except asyncio.CancelledError:
+                    raise
+                except BaseException as e:
+                    events.put_nowait((n, "error", e))
+                finally:
+                    await it.aclose()
+
+            tasks.append(asyncio.ensure_future(run()))
+
+        threshold_s = self.hedge_threshold_ms() / 1000.0
+        hedge_at = started + threshold_s if self.hedge and self.max_hedges > 0 else None
+        winner, failed = None, set()
+        launch()
+        try:
+            while True:
+                try:
+                    n, kind, payload = await asyncio.wait_for(
+                        events.get(), self._wait_s(hedge_at if winner is None else None)
+                    )
+                except asyncio.TimeoutError:
+                    if winner is not None or hedge_at is None or perf_counter() < hedge_at:
+                        DEADLINE_ERRORS.inc(labels=self._labels)
+                        raise DeadlineExceeded("generate")
+                    launch()
+                    HEDGES.inc(labels={**self._labels, "outcome": "fired"})
+                    hedge_at = perf_counter() + threshold_s if len(stops) <= self.max_hedges else None
+                    continue
+                if winner is None:
+                    if kind == "error":
+                        failed.add(n)
+                        if len(failed) == len(stops):
+                            raise payload
+                        continue
+                    winner = n
+                    self._on_winner(n, started, len(stops))
+                    for i, stop_event in enumerate(stops):
+                        if i != n:
+                            stop_event.set()
+                if n != winner:
+                    continue
+                if kind == "item":
+                    yield payload
+                elif kind == "done":
+                    return
+                else:
+                    raise payload
+        finally:
+            for i, task in enumerate(tasks):
+                stops[i].set()
+                # Losers run on to their first token (so the unhedged TTFT is
+                # still recorded); anything left when we give up is cancelled
+                if winner is None or i == winner:
+                    task.cancel()
+
+    # -- BaseChatModel ------------------------------------------------------
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.streaming:
+            return generate_from_stream(self._stream(messages, stop=stop, run_manager=run_manager, **kwargs))
+        for result in self._race(self._attempt_factory(messages, stop, kwargs)):
+            return result
+        raise RuntimeError("LLM attempt finished without a result")
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.streaming:
+            return await agenerate_from_stream(self._astream(messages, stop=stop, run_manager=run_manager, **kwargs))
+        race = self._arace(self._aattempt_factory(messages, stop, kwargs))
+        try:
+            async for result in race:
+                return result
+        finally:
+            await race.aclose()
+        raise RuntimeError("LLM attempt finished without a result")
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        for chunk in self._race(self._attempt_factory(messages, stop, kwargs)):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        race = self._arace(self._aattempt_factory(messages, stop, kwargs))
+        try:
+            async for chunk in race:
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+        finally:
+            await race.aclose()
+
+
+def hedged(inner: BaseChatModel, model_label: str, streaming: bool = False, tags=None, callbacks=None) -> HedgedChatModel:
+    """Wrap `inner`; tags and callbacks live on the wrapper so they fire once per logical call."""
+    after_ms = os.getenv("LLM_HEDGE_AFTER_MS", "")
+    return HedgedChatModel(
+        inner=inner,
+        model_label=model_label,
+        streaming=streaming,
+        tags=tags,
+        callbacks=callbacks,
+        hedge=hedging_enabled(),
+        hedge_after_ms=float(after_ms) if after_ms else None,
+        min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+        fallback_after_ms=float(os.getenv("LLM_HEDGE_FALLBACK_MS", "3000")),
+        max_hedges=int(os.getenv("LLM_MAX_HEDGES", "1")),
+    )
+
+
+def hedge_stats() -> Dict[str, Any]:
+    """Hedge rate and TTFT p99 with vs. without hedging, per model/mode."""
+    out: Dict[str, Any] = {}
+    for key, calls in HEDGE_CALLS.items():
+        labels = dict(key)
+        name = f"{labels['model']}:{labels['mode']}"
+        primary = TTFT_MS.summary({**labels, "attempt": "primary"})
+        effective = TTFT_MS.summary({**labels, "attempt": "effective"})
+        out[name] = {
+            "calls": int(calls),
+            "hedges": int(HEDGES.value({**labels, "outcome": "fired"})),
+            "hedge_wins": int(HEDGES.value({**labels, "outcome": "won"})),
+            "hedge_rate": round(HEDGES.value({**labels, "outcome": "fired"}) / calls, 4) if calls else 0.0,
+            "p99_primary_ms": primary.get("p99"),
+            "p99_effective_ms": effective.get("p99"),
+            "p99_improvement_ms": round(primary["p99"] - effective["p99"], 3)
+            if "p99" in primary and "p99" in effective else None,
+        }
+    return out
@@ -0,0 +1,342 @@
+"""SQLite-backed chat history, so conversations cost disk instead of heap.
+
+With `CHAT_HISTORY_BACKEND=sqlite` every session's turns are written to
+`cache/chat_history.sqlite3` (WAL mode) keyed by session_id. A session's
+messages are only read when its chain is first used in this process, so
+evicted or idle sessions (bot/sessions.py) hold nothing in RAM and a restart
+picks the conversation up again. Writes go through one background thread that
+commits in batches; sessions untouched for `CHAT_HISTORY_TTL_S` are purged.
+Until a write is committed it is kept per session, so a read sees it without
+waiting for the batch window. `TokenBudgetMemory` (bot/memory.py) keeps its
+running summary in the `summaries` table.
+
+A browser can resume its conversation after a reload only through a resume
+token signed by the server (`session_token`). The session id itself is never
+taken from the client.
+"""
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import queue
+import sqlite3
+import threading
+from time import monotonic, time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, SystemMessage, message_to_dict, messages_from_dict
+
+from monitoring import metrics
+
+HISTORY_WRITES = metrics.counter("chat_history_writes_total", "Chat-history rows and batches written")
+HISTORY_PURGED = metrics.counter("chat_history_purged_sessions_total", "Sessions removed by the TTL purge")
+
+DEFAULT_PATH = os.path.join("cache", "chat_history.sqlite3")
+
+
+def history_backend() -> str:
+    backend = os.getenv("CHAT_HISTORY_BACKEND", "memory").strip().lower()
+    return backend if backend in ("memory", "sqlite") else "memory"
+
+
+class HistoryStore:
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        ttl_s: Optional[float] = None,
+        flush_ms: Optional[float] = None,
+        batch_size: int = 256,
+    ):
+        self.path = path
+        self.ttl_s = ttl_s if ttl_s is not None else float(os.getenv("CHAT_HISTORY_TTL_S", str(30 * 24 * 3600)))
+        self.flush_s = (flush_ms if flush_ms is not None else float(os.getenv("CHAT_HISTORY_FLUSH_MS", "200"))) / 1000.0
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Tuple]" = queue.Queue()
+        self._lock = threading.Lock()
+        # Queued, not yet committed writes per session, in queue order
+        self._pending: Dict[str, List[Tuple]] = {}
+        self._pending_lock = threading.Lock()
+        self._conn = self._connect()
+        self._last_purge = 0.0
+        self._writer = threading.Thread(target=self._write_loop, name="chat-history-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " session_id TEXT NOT NULL, seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created_at REAL NOT NULL, message TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, seq)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            " session_id TEXT PRIMARY KEY, updated_at REAL NOT NULL, summary TEXT NOT NULL)"
+        )
+        return conn
+
+    # -- writes (background, batched) -----------------------------------------
+
+    def _put(self, op: Tuple) -> None:
+        with self._pending_lock:
+            self._pending.setdefault(op[1], []).append(op)
+            self._queue.put(op)
+
+    def append(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        now = time()
+        for message in messages:
+            self._put(("add", session_id, now, json.dumps(message_to_dict(message), ensure_ascii=False)))
+
+    def delete(self, session_id: str) -> None:
+        self._put(("delete", session_id, None, None))
+
+    def save_summary(self, session_id: str, summary: str) -> None:
+        self._put(("summary", session_id, time(), summary))
+
+    def drop_oldest(self, session_id: str, count: int) -> None:
+        """Delete a session's `count` oldest messages (turns folded into the summary)."""
+        self._put(("drop", session_id, None, count))
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Wait until everything queued so far is committed."""
+        done = threading.Event()
+        self._queue.put(("flush", None, None, done))
+        done.wait(timeout)
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = monotonic() + self.flush_s
+            # Collect for up to flush_s so a burst of turns commits once
+            while len(batch) < self.batch_size:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._commit(batch)
+            except sqlite3.Error as e:
+                print(f"⚠️ Chat history write failed: {e}")
+                with self._lock:
+                    self._settle(batch)
+            for op, _, _, done in batch:
+                if op == "flush":
+                    done.set()
+            if self.ttl_s > 0 and monotonic() - self._last_purge > min(3600.0, self.ttl_s):
+                self.purge()
+
+    def _commit(self, batch: List[Tuple]) -> None:
+        writes = [item for item in batch if item[0] != "flush"]
+        if not writes:
+            return
+        rows = 0
+        with self._lock:
+            with self._conn:
+                # In queue order, so a clear followed by new turns keeps the new turns
+                for op, sid, ts, payload in writes:
+                    if op == "add":
+                        rows += 1
+                        self._conn.execute(
+                            "INSERT INTO messages (session_id, created_at, message) VALUES (?, ?, ?)", (sid, ts, payload)
+                        )
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO sessions (session_id, updated_at) VALUES (?, ?)", (sid, ts)
+                        )
+                    elif op == "summary":
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO summaries (session_id, updated_at, summary) VALUES (?, ?, ?)",
+                            (sid, ts, payload),
+                        )
+                    elif op == "drop":
+                        self._conn.execute(
+                            "DELETE FROM messages WHERE seq IN"
+                            " (SELECT seq FROM messages WHERE session_id = ? ORDER BY seq LIMIT ?)",
+                            (sid, payload),
+                        )
+                    elif op == "delete":
+                        self._delete_sessions([(sid,)])
+            # Committed rows are readable from the database now; drop them from pending
+            self._settle(writes)
+        HISTORY_WRITES.inc(rows, labels={"kind": "rows"})
+        HISTORY_WRITES.inc(labels={"kind": "batches"})
+
+    def _settle(self, batch: List[Tuple]) -> None:
+        """Forget the pending copies of `batch` (committed or failed). Lock held."""
+        done: Dict[str, int] = {}
+        for item in batch:
+            if item[0] != "flush":
+                done[item[1]] = done.get(item[1], 0) + 1
+        with self._pending_lock:
+            for sid, n in done.items():
+                left = self._pending.get(sid, [])[n:]  # FIFO: the batch holds each session's oldest ops
+                if left:
+                    self._pending[sid] = left
+                else:
+                    self._pending.pop(sid, None)
+
+    def _delete_sessions(self, sids: List[Tuple[str]]) -> None:
+        self._conn.executemany("DELETE FROM messages WHERE session_id = ?", sids)
+        self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", sids)
+        self._conn.executemany("DELETE FROM summaries WHERE session_id = ?", sids)
+
+    def purge(self) -> int:
+        self._last_purge = monotonic()
+        cutoff = time() - self.ttl_s
+        try:
+            with self._lock, self._conn:
+                stale = [r[0] for r in self._conn.execute("SELECT session_id FROM sessions WHERE updated_at < ?", (cutoff,))]
+                for start in range(0, len(stale), 500):
+                    self._delete_sessions([(sid,) for sid in stale[start:start + 500]])
+        except sqlite3.Error as e:
+            print(f"⚠️ Chat history purge failed: {e}")
+            return 0
+        if stale:
+            HISTORY_PURGED.inc(len(stale))
+        return len(stale)
+
+    # -- reads ------------------------------------------------------------------
+
+    def _read(self, session_id: str) -> Tuple[List[Tuple[float, str]], Optional[str]]:
+        """Committed rows and summary of one session with its pending writes applied on top."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT created_at, message FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+            row = self._conn.execute("SELECT summary FROM summaries WHERE session_id = ?", (session_id,)).fetchone()
+            with self._pending_lock:
+                pending = list(self._pending.get(session_id, ()))
+        summary = row[0] if row else None
+        for op, _, ts, payload in pending:
+            if op == "add":
+                rows.append((ts, payload))
+            elif op == "summary":
+                summary = payload
+            elif op == "drop":
+                rows = rows[payload:]
+            elif op == "delete":
+                rows, summary = [], None
+        return rows, summary
+
+    def load(self, session_id: str) -> List[Tuple[float, BaseMessage]]:
+        """(created_at, message) pairs of one session, oldest first, including not yet committed turns."""
+        rows, _ = self._read(session_id)
+        return [(ts, messages_from_dict([json.loads(payload)])[0]) for ts, payload in rows]
+
+    def load_summary(self, session_id: str) -> Optional[str]:
+        return self._read(session_id)[1]
+
+    def history(self, session_id: str, system_prompt: Optional[str] = None) -> "SQLiteChatHistory":
+        return SQLiteChatHistory(self, session_id, system_prompt)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            sessions = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            messages = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        return {"sessions": sessions, "messages": messages, "pending_writes": self._queue.qsize()}
+
+
+class SQLiteChatHistory(BaseChatMessageHistory):
+    """Chat history of one session; loaded on first access, appended write-behind.
+
+    The system prompt is prepended in memory only; it is part of the code, not
+    of the conversation.
+    """
+
+    def __init__(self, store: HistoryStore, session_id: str, system_prompt: Optional[str] = None):
+        self.store = store
+        self.session_id = session_id
+        self.system_prompt = system_prompt
+        self._messages: Optional[List[BaseMessage]] = None
+
+    @property
+    def messages(self) -> List[BaseMessage]:  # type: ignore[override]
+        if self._messages is None:
+            loaded = [m for _, m in self.store.load(self.session_id)]
+            head = [SystemMessage(content=self.system_prompt)] if self.system_prompt else []
+            self._messages = head + loaded
+        return self._messages
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.messages.extend(messages)
+        self.store.append(self.session_id, messages)
+
+    def clear(self) -> None:
+        self._messages = None
+        self.store.delete(self.session_id)
+
+    def load_summary(self) -> Optional[str]:
+        return self.store.load_summary(self.session_id)
+
+    def save_summary(self, summary: str) -> None:
+        self.store.save_summary(self.session_id, summary)
+
+    def drop_oldest(self, count: int) -> None:
+        self.store.drop_oldest(self.session_id, count)
+
+
+_STORE: Optional[HistoryStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = HistoryStore(os.getenv("CHAT_HISTORY_PATH", DEFAULT_PATH))
+    return _STORE
+
+
+_SECRET: Optional[bytes] = None
+
+
+def _token_secret() -> bytes:
+    """`SESSION_TOKEN_SECRET`, or a random key kept next to the history database so restarts keep it."""
+    global _SECRET
+    if _SECRET is None:
+        with _STORE_LOCK:
+            if _SECRET is None:
+                configured = os.getenv("SESSION_TOKEN_SECRET")
+                if configured:
+                    _SECRET = configured.encode("utf-8")
+                else:
+                    path = os.path.join(os.path.dirname(os.getenv("CHAT_HISTORY_PATH", DEFAULT_PATH)) or ".", "session_secret")
+                    try:
+                        with open(path, "rb") as f:
+                            _SECRET = f.read()
+                    except FileNotFoundError:
+                        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                        _SECRET = secrets.token_bytes(32)
+                        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                        with os.fdopen(fd, "wb") as f:
+                            f.write(_SECRET)
+    return _SECRET
+
+
+def _signature(session_id: str) -> str:
+    return hmac.new(_token_secret(), session_id.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+def session_token(session_id: str) -> str:
+    """Resume token for a server-generated session id; whoever holds it can read the conversation."""
+    return f"{session_id}.{_signature(session_id)}"
+
+
+def session_from_token(token: Optional[str]) -> Optional[str]:
+    """The session id a token was issued for, or None if it was not signed by this server."""
+    session_id, _, signature = (token or "").rpartition(".")
+    if not session_id or not hmac.compare_digest(signature, _signature(session_id)):
+        return None
+    return session_id
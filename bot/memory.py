@@ -10,6 +10,33 @@ try:
 except Exception:
     from langchain.schema import SystemMessage  # type: ignore
 
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+from typing import Any, Deque, Dict, Optional
+
+from pydantic import Field, PrivateAttr
+
+from bot.history_store import get_history_store, history_backend
+from monitoring import metrics
+from monitoring.tokens import count_tokens
+from monitoring.tracing import set_attributes
+
+MEMORY_PROMPT_TOKENS = metrics.counter("memory_prompt_tokens_total", "Chat-history tokens fed to the chain")
+MEMORY_SUMMARIES = metrics.counter("memory_summaries_total", "Background summary updates by result")
+
+# Summaries run off the request path; a couple of workers is plenty for one process
+_SUMMARY_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+
+SUMMARY_PROMPT = (
+    "Progressively summarize the conversation between a user and the Nepal Manifesto assistant. "
+    "Keep the parties, policies, numbers and open questions that later questions may refer to. "
+    "Reply with the new summary only, at most {max_words} words.\n\n"
+    "Current summary:\n{summary}\n\nNew lines of conversation:\n{lines}\n\nNew summary:"
+)
+
 
 # Simple, general starting prompt applied once at session start.
 #multistring is used to add multiple lines of text
@@ -21,10 +48,181 @@ SYSTEM_PROMPT = (
     "and optionally ask a clarifying question. Keep responses safe and professional."
 )
 
-def get_memory():
-    chat_history = ChatMessageHistory()
-    chat_history.add_message(SystemMessage(content=SYSTEM_PROMPT))
+# Per-turn history sizes kept for the sidebar and the session log
+TURN_TOKENS_KEPT = 32
+
+
+def messages_tokens(messages) -> int:
+    # ~4 tokens of chat framing per message on top of the content
+    return sum(count_tokens(str(m.content)) + 4 for m in messages)
+
+
+class TokenBudgetMemory(ConversationBufferMemory):
+    """Chat memory with a hard token budget.
+
+    The chain sees the system prompt, a running summary of older turns and the
+    last `keep_turns` exchanges verbatim. When turns fall out of that window they
+    are folded into the summary by `summary_llm` on a background thread, so the
+    request path never waits for it. If the window alone is over `max_tokens`,
+    the oldest verbatim turns are dropped from the prompt. `turn_tokens` records
+    the history size fed to the last `TURN_TOKENS_KEPT` turns. With the SQLite
+    history the summary is stored next to the turns and folded turns are
+    deleted from disk, so eviction and restarts neither lose the summary nor
+    bring the folded turns back.
+    """
+
+    max_tokens: int = 1500
+    keep_turns: int = 3
+    summary_max_words: int = 200
+    summary_llm: Any = None
+    summary: str = ""
+    turn_tokens: Deque[int] = Field(default_factory=lambda: deque(maxlen=TURN_TOKENS_KEPT))
+    _lock: Any = PrivateAttr(default_factory=threading.RLock)
+    _summarizing: bool = PrivateAttr(default=False)
+    _summary_loaded: bool = PrivateAttr(default=False)
+
+    def _load_summary(self) -> None:
+        """Pick up the stored summary on first use (lock held)."""
+        if self._summary_loaded:
+            return
+        self._summary_loaded = True
+        load = getattr(self.chat_memory, "load_summary", None)
+        if load is not None and not self.summary:
+            self.summary = load() or ""
+
+    def _prompt_messages(self) -> list:
+        with self._lock:
+            self._load_summary()
+            messages = list(self.chat_memory.messages)
+            summary = self.summary
+        system = [m for m in messages if getattr(m, "type", None) == "system"]
+        turns = [m for m in messages if getattr(m, "type", None) != "system"]
+        turns = turns[-2 * self.keep_turns:] if self.keep_turns > 0 else []
+        head = list(system)
+        if summary:
+            head.append(SystemMessage(content=f"Summary of the earlier conversation: {summary}"))
+        budget = self.max_tokens - messages_tokens(head)
+        while turns and messages_tokens(turns) > budget:
+            turns = turns[2:]
+        return head + turns
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        messages = self._prompt_messages()
+        tokens = messages_tokens(messages)
+        self.turn_tokens.append(tokens)
+        MEMORY_PROMPT_TOKENS.inc(tokens)
+        set_attributes(rag__memory_tokens=tokens, rag__memory_summary_chars=len(self.summary))
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {self.memory_key: self._buffer_as_str(messages)}
+
+    async def aload_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return self.load_memory_variables(inputs)
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        with self._lock:
+            super().save_context(inputs, outputs)
+        self._schedule_summary()
+
+    async def asave_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        self.save_context(inputs, outputs)
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            self.summary = ""
+            self._summary_loaded = True
+
+    def _overflow(self) -> list:
+        """Turns that have left the verbatim window and are not yet summarized."""
+        turns = [m for m in self.chat_memory.messages if getattr(m, "type", None) != "system"]
+        return turns[:max(0, len(turns) - 2 * self.keep_turns)]
+
+    def _schedule_summary(self) -> None:
+        with self._lock:
+            if self._summarizing or not self._overflow():
+                return
+            self._summarizing = True
+        _SUMMARY_EXECUTOR.submit(self._summarize)
+
+    def _summarize(self) -> None:
+        try:
+            with self._lock:
+                self._load_summary()
+                overflow = self._overflow()
+                summary = self.summary
+            if not overflow:
+                return
+            lines = self._buffer_as_str(overflow)
+            if self.summary_llm is not None:
+                prompt = SUMMARY_PROMPT.format(max_words=self.summary_max_words, summary=summary or "(none)", lines=lines)
+                new_summary = str(self.summary_llm.invoke(prompt).content).strip()
+            else:
+                # No LLM available: keep only what the user asked about
+                asked = [str(m.content) for m in overflow if getattr(m, "type", None) == "human"]
+                new_summary = " ".join(filter(None, [summary, "Earlier the user asked: " + "; ".join(asked) + "."]))
+            new_summary = _truncate_words(new_summary, self.summary_max_words)
+            with self._lock:
+                self.summary = new_summary
+                save = getattr(self.chat_memory, "save_summary", None)
+                if save is not None:
+                    save(new_summary)
+                # Drop folded turns; save_context only appends, so they are still the oldest
+                folded = 0
+                for m in overflow:
+                    try:
+                        self.chat_memory.messages.remove(m)
+                        folded += 1
+                    except ValueError:
+                        pass  # cleared meanwhile
+                drop = getattr(self.chat_memory, "drop_oldest", None)
+                if drop is not None and folded:
+                    drop(folded)
+            MEMORY_SUMMARIES.inc(labels={"result": "ok"})
+        except Exception as e:  # keep the verbatim turns; retried after the next turn
+            MEMORY_SUMMARIES.inc(labels={"result": "error"})
+            print(f"⚠️ Memory summary failed: {e}")
+        finally:
+            with self._lock:
+                self._summarizing = False
+
+    def wait_for_summary(self, timeout: float = 30.0) -> None:
+        """Block until a pending background summary is done (benchmarks, shutdown)."""
+        deadline = monotonic() + timeout
+        while self._summarizing and monotonic() < deadline:
+            sleep(0.01)
+
+
+def _truncate_words(text: str, max_words: int) -> str:
+    words = text.split()
+    return text if len(words) <= max_words else " ".join(words[-max_words:])
+
+
+def get_memory_mode() -> str:
+    mode = os.getenv("MEMORY_MODE", "buffer").strip().lower()
+    return mode if mode in ("buffer", "summary") else "buffer"
+
+
+def get_memory(summary_llm: Optional[Any] = None, mode: Optional[str] = None, session_id: Optional[str] = None):
+    if session_id and history_backend() == "sqlite":
+        # Turns live in SQLite; nothing is read until the chain first needs them
+        chat_history = get_history_store().history(session_id, system_prompt=SYSTEM_PROMPT)
+    else:
+        chat_history = ChatMessageHistory()
+        chat_history.add_message(SystemMessage(content=SYSTEM_PROMPT))
 
+    if (mode or get_memory_mode()) == "summary":
+        return TokenBudgetMemory(
+            memory_key="chat_history",
+            input_key="question",
+            output_key="answer",
+            return_messages=True,
+            chat_memory=chat_history,
+            max_tokens=int(os.getenv("MEMORY_MAX_TOKENS", "1500")),
+            keep_turns=int(os.getenv("MEMORY_KEEP_TURNS", "3")),
+            summary_max_words=int(os.getenv("MEMORY_SUMMARY_WORDS", "200")),
+            summary_llm=summary_llm,
+        )
 
     return ConversationBufferMemory(
         memory_key="chat_history",
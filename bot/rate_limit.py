@@ -0,0 +1,390 @@
+"""Admission control for Azure OpenAI calls (chat, embeddings, eval judge).
+
+Every Azure client's httpx transport is wrapped in `AdmissionTransport` (see
+bot/clients.py), which admits a request only when:
+- the deployment's requests/min and tokens/min buckets have room
+  (`AZURE_RPM`, `AZURE_TPM`; 0 means unlimited),
+- fewer than `AZURE_MAX_CONCURRENCY` calls are in flight process-wide, and
+- the calling session has fewer than `AZURE_PER_SESSION_CONCURRENCY` in flight.
+
+Waiting requests are served in priority order: interactive chat first, then
+eval, then batch (ingest). The priority and session come from
+`admission_context()`, or else from the transport's default. A request that
+cannot be admitted within `AZURE_ADMISSION_TIMEOUT_S` gets a synthetic 429 with
+`Retry-After`, which the openai SDK already backs off and retries on. Limits
+are per process. When eval runs in its own process on the same key, give it a
+smaller `AZURE_TPM`.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from time import monotonic
+from typing import Dict, Iterator, Optional, Tuple
+
+import httpx
+
+from monitoring import metrics
+
+ADMISSIONS = metrics.counter("llm_admission_total", "Azure calls by priority and outcome (admitted/queued/rejected)")
+ADMISSION_WAIT_MS = metrics.histogram("llm_admission_wait_ms", "Time Azure calls waited for admission")
+IN_FLIGHT = metrics.gauge("llm_in_flight", "Azure calls currently in flight")
+
+PRIORITIES = {"interactive": 0, "eval": 1, "batch": 2}
+
+_PRIORITY: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("admission_priority", default=None)
+_SESSION: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("admission_session", default=None)
+
+_DEPLOYMENT_RE = re.compile(r"/deployments/([^/]+)/")
+
+
+def admission_enabled() -> bool:
+    return os.getenv("AZURE_ADMISSION", "1").lower() not in ("0", "false", "no")
+
+
+@contextmanager
+def admission_context(priority: Optional[str] = None, session_id: Optional[str] = None) -> Iterator[None]:
+    """Tag Azure calls made inside this block (threads started from it inherit it)."""
+    tokens = []
+    if priority is not None:
+        tokens.append((_PRIORITY, _PRIORITY.set(priority)))
+    if session_id is not None:
+        tokens.append((_SESSION, _SESSION.set(session_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class Rejected(Exception):
+    def __init__(self, retry_after_s: float):
+        super().__init__(f"admission timed out; retry after {retry_after_s:.1f}s")
+        self.retry_after_s = retry_after_s
+
+
+class TokenBucket:
+    """`rate_per_min` units per minute, bursting up to one minute's worth."""
+
+    def __init__(self, rate_per_min: float):
+        self.rate_per_s = rate_per_min / 60.0
+        self.capacity = float(rate_per_min)
+        self.level = self.capacity
+        self._stamp = monotonic()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self.level = min(self.capacity, self.level + (now - self._stamp) * self.rate_per_s)
+        self._stamp = now
+
+    def wait_s(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        if self.rate_per_s <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)  # oversized requests wait for a full bucket
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate_per_s
+
+    def take(self, amount: float) -> None:
+        if self.rate_per_s > 0:
+            self.level -= min(amount, self.capacity)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        per_session_concurrency: Optional[int] = None,
+        timeout_s: Optional[float] = None,
+    ):
+        self.rpm = rpm if rpm is not None else float(os.getenv("AZURE_RPM", "0"))
+        self.tpm = tpm if tpm is not None else float(os.getenv("AZURE_TPM", "0"))
+        self.max_concurrency = max_concurrency or int(os.getenv("AZURE_MAX_CONCURRENCY", "16"))
+        self.per_session = per_session_concurrency or int(os.getenv("AZURE_PER_SESSION_CONCURRENCY", "2"))
+        self.timeout_s = timeout_s if timeout_s is not None else float(os.getenv("AZURE_ADMISSION_TIMEOUT_S", "30"))
+        self._buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self._cond = threading.Condition()
+        self._waiting: list = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self.in_flight = 0
+        self._session_in_flight: Dict[str, int] = {}
+
+    def _bucket(self, deployment: str) -> Tuple[TokenBucket, TokenBucket]:
+        if deployment not in self._buckets:
+            self._buckets[deployment] = (TokenBucket(self.rpm), TokenBucket(self.tpm))
+        return self._buckets[deployment]
+
+    def _try_admit(self, ticket, deployment: str, tokens: float) -> Optional[float]:
+        """Admit `ticket` if it is first in line and everything has room; else seconds to wait. Lock held."""
+        if self._waiting[0] != ticket:
+            return None  # someone with higher priority (or older) goes first
+        if self.in_flight >= self.max_concurrency:
+            return None
+        requests, token_bucket = self._bucket(deployment)
+        wait = max(requests.wait_s(1), token_bucket.wait_s(tokens))
+        if wait > 0:
+            return wait
+        requests.take(1)
+        token_bucket.take(tokens)
+        heapq.heappop(self._waiting)
+        self.in_flight += 1
+        IN_FLIGHT.set(self.in_flight)
+        return 0.0
+
+    def _try_reserve_session(self, session: Optional[str]) -> bool:
+        # Checked before joining the shared queue, so a session at its cap
+        # waits on its own instead of blocking the head of the line. Lock held.
+        if session is None:
+            return True
+        if self._session_in_flight.get(session, 0) >= self.per_session:
+            return False
+        self._session_in_flight[session] = self._session_in_flight.get(session, 0) + 1
+        return True
+
+    def _release_session(self, session: Optional[str]) -> None:
+        if session is None:
+            return
+        left = self._session_in_flight.get(session, 1) - 1
+        if left <= 0:
+            self._session_in_flight.pop(session, None)
+        else:
+            self._session_in_flight[session] = left
+
+    def _enqueue(self, priority: str):
+        ticket = (PRIORITIES.get(priority, 0), next(self._seq))
+        heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _abandon(self, ticket, session: Optional[str]) -> None:
+        if ticket is not None:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self._release_session(session)
+        self._cond.notify_all()
+
+    def _give_up(self, ticket, priority: str, session: Optional[str]) -> Rejected:
+        self._abandon(ticket, session)
+        ADMISSIONS.inc(labels={"priority": priority, "outcome": "rejected"})
+        return Rejected(retry_after_s=max(1.0, 60.0 / self.rpm if self.rpm > 0 else 1.0))
+
+    def _step(self, state: dict, deployment: str, tokens: float, priority: str, session: Optional[str]) -> Optional[float]:
+        """One admission attempt (lock held): 0.0 when admitted, else how long to wait (None: until notified)."""
+        if state["ticket"] is None:
+            if not self._try_reserve_session(session):
+                return None
+            state["ticket"] = self._enqueue(priority)
+        return self._try_admit(state["ticket"], deployment, tokens)
+
+    def _admitted(self, priority: str, start: float, queued: bool) -> None:
+        if queued:
+            ADMISSIONS.inc(labels={"priority": priority, "outcome": "queued"})
+        ADMISSIONS.inc(labels={"priority": priority, "outcome": "admitted"})
+        ADMISSION_WAIT_MS.observe((monotonic() - start) * 1000.0, labels={"priority": priority})
+
+    def _wait_limit_s(self, timeout_s: Optional[float]) -> float:
+        return self.timeout_s if timeout_s is None else min(self.timeout_s, timeout_s)
+
+    def acquire(self, deployment: str, tokens: float, priority: str, session: Optional[str],
+                timeout_s: Optional[float] = None) -> None:
+        start = monotonic()
+        deadline = start + self._wait_limit_s(timeout_s)
+        state = {"ticket": None}
+        queued = False
+        with self._cond:
+            while True:
+                wait = self._step(state, deployment, tokens, priority, session)
+                if wait == 0.0:
+                    self._cond.notify_all()  # the next in line may fit too
+                    break
+                queued = True
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    raise self._give_up(state["ticket"], priority, session)
+                self._cond.wait(min(remaining, wait or 1.0))
+        self._admitted(priority, start, queued)
+
+    async def aacquire(self, deployment: str, tokens: float, priority: str, session: Optional[str],
+                       timeout_s: Optional[float] = None) -> None:
+        # Same queue as the sync path; the event loop must not block on the
+        # condition, so poll briefly instead
+        start = monotonic()
+        deadline = start + self._wait_limit_s(timeout_s)
+        state = {"ticket": None}
+        queued = False
+        while True:
+            with self._cond:
+                wait = self._step(state, deployment, tokens, priority, session)
+                if wait == 0.0:
+                    self._cond.notify_all()
+                    break
+                if monotonic() >= deadline:
+                    raise self._give_up(state["ticket"], priority, session)
+            queued = True
+            try:
+                await asyncio.sleep(min(wait or 0.02, 0.25))
+            except asyncio.CancelledError:
+                # e.g. the request deadline fired; don't leave a dead ticket at the head
+                with self._cond:
+                    self._abandon(state["ticket"], session)
+                raise
+        self._admitted(priority, start, queued)
+
+    def release(self, session: Optional[str]) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            IN_FLIGHT.set(self.in_flight)
+            self._release_session(session)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": self.in_flight, "waiting": len(self._waiting), "max_concurrency": self.max_concurrency}
+
+
+def estimate_tokens(request: httpx.Request) -> Tuple[str, float]:
+    """(deployment, tokens) for the bucket: ~4 bytes per prompt token plus requested completion tokens."""
+    match = _DEPLOYMENT_RE.search(request.url.path)
+    deployment = match.group(1) if match else request.url.host
+    body = request.content or b""
+    tokens = len(body) / 4.0
+    if body and b"max_tokens" in body:
+        try:
+            tokens += float(json.loads(body).get("max_tokens") or 0)
+        except (ValueError, AttributeError):
+            pass
+    return deployment, max(1.0, tokens)
+
+
+def _pool_timeout_s(request: httpx.Request) -> Optional[float]:
+    # A request with a short per-call timeout (e.g. an embedding with a budget) must not queue longer than that
+    return (request.extensions.get("timeout") or {}).get("pool")
+
+
+def _rejected_response(request: httpx.Request, e: Rejected) -> httpx.Response:
+    return httpx.Response(
+        429,
+        headers={"retry-after": f"{e.retry_after_s:.0f}", "x-admission": "rejected"},
+        json={"error": {"code": "429", "message": f"Local admission control: {e}"}},
+        request=request,
+    )
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+def _once(fn):
+    done = []
+
+    def wrapper():
+        if not done:
+            done.append(True)
+            fn()
+    return wrapper
+
+
+class AdmissionTransport(httpx.BaseTransport):
+    """Holds an admission slot from request start until the (streamed) body is closed."""
+
+    def __init__(self, inner: httpx.BaseTransport, controller: "AdmissionController", default_priority: str = "interactive"):
+        self.inner = inner
+        self.controller = controller
+        self.default_priority = default_priority
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        deployment, tokens = estimate_tokens(request)
+        priority, session = _PRIORITY.get() or self.default_priority, _SESSION.get()
+        try:
+            self.controller.acquire(deployment, tokens, priority, session, _pool_timeout_s(request))
+        except Rejected as e:
+            return _rejected_response(request, e)
+        release = _once(lambda: self.controller.release(session))
+        try:
+            response = self.inner.handle_request(request)
+        except BaseException:
+            release()
+            raise
+        if isinstance(response.stream, httpx.ByteStream):
+            release()  # body already in memory (synthetic/mock responses)
+        else:
+            response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class AsyncAdmissionTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport, controller: "AdmissionController", default_priority: str = "interactive"):
+        self.inner = inner
+        self.controller = controller
+        self.default_priority = default_priority
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        deployment, tokens = estimate_tokens(request)
+        priority, session = _PRIORITY.get() or self.default_priority, _SESSION.get()
+        try:
+            await self.controller.aacquire(deployment, tokens, priority, session, _pool_timeout_s(request))
+        except Rejected as e:
+            return _rejected_response(request, e)
+        release = _once(lambda: self.controller.release(session))
+        try:
+            response = await self.inner.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        if isinstance(response.stream, httpx.ByteStream):
+            release()  # body already in memory (synthetic/mock responses)
+        else:
+            response.stream = _AsyncReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+_CONTROLLER: Optional[AdmissionController] = None
+_CONTROLLER_LOCK = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    global _CONTROLLER
+    if _CONTROLLER is None:
+        with _CONTROLLER_LOCK:
+            if _CONTROLLER is None:
+                _CONTROLLER = AdmissionController()
+    return _CONTROLLER
+
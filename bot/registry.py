@@ -0,0 +1,201 @@
+"""Process-wide registry for the heavy RAG resources.
+
+Streamlit re-executes `app.py` on every interaction, but imported modules stay
+in `sys.modules`, so state kept here lives for the whole process. The LLM
+client, embeddings client, Chroma store and retriever are built once and
+shared by every session; they are rebuilt only when the index on disk changes
+(see `retriever.retriever.get_index_version`).
+"""
+import os
+import threading
+import weakref
+from dataclasses import dataclass
+from time import perf_counter, time
+from typing import Any, Dict, Optional
+
+from monitoring import metrics
+from retriever.retriever import (
+    CHROMA_DIR,
+    get_embeddings,
+    get_index_version,
+    get_retriever,
+    get_vectorstore,
+    retriever_backend,
+)
+
+VECTORSTORE_CHUNKS = metrics.gauge("vectorstore_chunks", "Chunks in the loaded Chroma collection")
+VECTORSTORE_BYTES = metrics.gauge("vectorstore_bytes", "On-disk size of the Chroma store")
+
+
+@dataclass
+class Resources:
+    llm: Any
+    condense_llm: Any
+    embeddings: Any
+    vectordb: Any
+    retriever: Any
+    semantic_cache: Any
+    index_version: str
+    built_at: float
+    build_ms: float
+
+
+def _retire_chroma_system(old: Resources) -> None:
+    """Let the rebuilt store get a fresh Chroma system without pulling it from under old sessions.
+
+    Chroma caches one client system per path, so the rebuilt store would reuse
+    the old segments. Only that path's entry is unregistered; the old system
+    keeps serving the sessions and in-flight requests still bound to `old`. It is
+    stopped once they have all rebound (bot/sessions.py) and `old` is collected.
+    """
+    client = getattr(old.vectordb, "_client", None)
+    identifier = getattr(client, "_identifier", None)
+    if identifier is None:
+        return  # exact backend without Chroma
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+    except ImportError:
+        return
+    system = SharedSystemClient._identifier_to_system.pop(identifier, None)
+    if system is not None:
+        weakref.finalize(old, _stop_system, system)
+
+
+def _stop_system(system) -> None:
+    try:
+        system.stop()
+    except Exception as e:
+        print(f"⚠️ Retired Chroma system did not stop cleanly: {e}")
+
+
+class ResourceRegistry:
+    def __init__(self, persist_directory: str = CHROMA_DIR, check_interval_s: Optional[float] = None):
+        self.persist_directory = persist_directory
+        if check_interval_s is None:
+            check_interval_s = float(os.getenv("INDEX_CHECK_INTERVAL_S", "5"))
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._resources: Optional[Resources] = None
+        self._last_check = 0.0
+        self._builds = 0
+        self._reuses = 0
+        self._last_get_ms = 0.0
+
+    def get(self) -> Resources:
+        start = perf_counter()
+        with self._lock:
+            res = self._resources
+            if res is None:
+                res = self._build(get_index_version(self.persist_directory))
+            elif perf_counter() - self._last_check >= self.check_interval_s:
+                self._last_check = perf_counter()
+                version = get_index_version(self.persist_directory)
+                if version != res.index_version:
+                    print(f"🔄 Index changed ({res.index_version} -> {version}), reloading resources.")
+                    res = self._build(version)
+                else:
+                    self._reuses += 1
+            else:
+                self._reuses += 1
+            self._last_get_ms = (perf_counter() - start) * 1000.0
+        return res
+
+    def _build(self, index_version: str) -> Resources:
+        from bot.chain import answer_cache_key, get_llm
+        from bot.fakes import get_fake_embeddings, get_fake_llm, use_fakes
+        from bot.semantic_cache import SemanticCache, cache_enabled
+        from bot.streaming import ANSWER_TAG
+
+        start = perf_counter()
+        if self._resources is not None:
+            _retire_chroma_system(self._resources)
+            if self._resources.semantic_cache is not None:
+                # Written out before the new cache loads the same files
+                self._resources.semantic_cache.close()
+        if use_fakes():
+            llm = get_fake_llm(streaming=True, tags=[ANSWER_TAG])
+            condense_llm = get_fake_llm()
+            embeddings = get_fake_embeddings()
+        else:
+            llm = get_llm(streaming=True, tags=[ANSWER_TAG])
+            condense_llm = get_llm()
+            embeddings = get_embeddings()
+        # The exact backend never opens Chroma; it falls back to it if its files are missing
+        vectordb = None
+        if retriever_backend() != "exact":
+            vectordb = get_vectorstore(embeddings, persist_directory=self.persist_directory)
+        retriever = get_retriever(
+            vectordb, index_version=index_version, embeddings=embeddings, persist_directory=self.persist_directory
+        )
+        vectordb = vectordb or retriever.vectorstore
+        semantic_cache = SemanticCache(embeddings, answer_cache_key(llm, index_version)) if cache_enabled() else None
+        build_ms = (perf_counter() - start) * 1000.0
+        self._resources = Resources(
+            llm=llm,
+            condense_llm=condense_llm,
+            embeddings=embeddings,
+            vectordb=vectordb,
+            retriever=retriever,
+            semantic_cache=semantic_cache,
+            index_version=index_version,
+            built_at=time(),
+            build_ms=build_ms,
+        )
+        self._builds += 1
+        self._last_check = perf_counter()
+        print(f"✅ RAG resources built in {build_ms:.0f} ms (index {index_version}).")
+        return self._resources
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._last_check = 0.0
+            if self._resources is not None:
+                self._resources.index_version = "invalidated"
+
+    def stats(self) -> Dict[str, Any]:
+        res = self._resources
+        return {
+            "builds": self._builds,
+            "reuses": self._reuses,
+            "last_build_ms": round(res.build_ms, 2) if res else None,
+            "last_get_ms": round(self._last_get_ms, 3),
+            "index_version": res.index_version if res else None,
+        }
+
+
+_REGISTRY: Optional[ResourceRegistry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry() -> ResourceRegistry:
+    global _REGISTRY
+    if _REGISTRY is None:
+        with _REGISTRY_LOCK:
+            if _REGISTRY is None:
+                _REGISTRY = ResourceRegistry()
+    return _REGISTRY
+
+
+def get_resources() -> Resources:
+    return get_registry().get()
+
+
+def _collect_vectorstore_metrics() -> None:
+    if _REGISTRY is None or _REGISTRY._resources is None:
+        return
+    res = _REGISTRY._resources
+    if res.retriever.exact_index is not None:
+        VECTORSTORE_CHUNKS.set(len(res.retriever.exact_index))
+    else:
+        VECTORSTORE_CHUNKS.set(res.vectordb._collection.count())
+    total = 0
+    for root, _, files in os.walk(_REGISTRY.persist_directory):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    VECTORSTORE_BYTES.set(total)
+
+
+metrics.register_collector(_collect_vectorstore_metrics)
@@ -0,0 +1,69 @@
+"""Policy for the condense-question ("rewrite") LLM call.
+
+`ConversationalRetrievalChain` rephrases the question whenever the chat history
+renders to a non-empty string. Because `bot/memory.py` seeds a SystemMessage,
+that includes the very first turn, costing a full LLM round-trip for nothing.
+
+Policies (env `REWRITE_POLICY`):
+- `always`: previous behaviour, rewrite whenever there is any history.
+- `never`: always use the raw question.
+- `after_first_turn` (default): skip the rewrite until there is a real
+  user/assistant exchange; the seeded system prompt does not count.
+- `heuristic`: like `after_first_turn`, and then only rewrite follow-ups that
+  look context-dependent (pronouns, "what about ...", very short questions).
+"""
+import os
+import re
+from typing import Any, List, Tuple
+
+REWRITE_POLICIES = ("always", "never", "after_first_turn", "heuristic")
+
+# Words that usually point back at something said earlier
+_ANAPHORA = {
+    "it", "its", "they", "them", "their", "theirs", "this", "that", "these", "those",
+    "he", "she", "him", "her", "his", "there", "such", "same", "former", "latter",
+    "above", "previous", "earlier", "else", "again", "more", "further", "other", "one", "ones",
+}
+_CONTINUATIONS = (
+    "and ", "but ", "also ", "so ", "then ", "what about", "how about", "and what",
+    "why", "how so", "elaborate", "explain more", "tell me more", "what else", "any other",
+)
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def get_rewrite_policy() -> str:
+    policy = os.getenv("REWRITE_POLICY", "after_first_turn").strip().lower()
+    return policy if policy in REWRITE_POLICIES else "after_first_turn"
+
+
+def has_prior_turns(chat_history: List[Any]) -> bool:
+    for turn in chat_history or []:
+        if isinstance(turn, tuple):
+            return True
+        if getattr(turn, "type", None) in ("human", "ai"):
+            return True
+    return False
+
+
+def looks_standalone(question: str) -> bool:
+    """Cheap local check: does the question make sense without the conversation?"""
+    q = (question or "").strip().lower()
+    words = _WORD_RE.findall(q)
+    if len(words) <= 3:
+        return False
+    if q.startswith(_CONTINUATIONS):
+        return False
+    return not any(w in _ANAPHORA for w in words)
+
+
+def should_rewrite(policy: str, question: str, chat_history: List[Any]) -> Tuple[bool, str]:
+    """Return (rewrite?, reason) for one turn."""
+    if policy == "never":
+        return False, "policy_never"
+    if policy == "always":
+        return True, "policy_always"
+    if not has_prior_turns(chat_history):
+        return False, "first_turn"
+    if policy == "heuristic" and looks_standalone(question):
+        return False, "standalone"
+    return True, "follow_up"
@@ -0,0 +1,268 @@
+"""Semantic answer cache keyed on standalone-question embeddings.
+
+Paraphrased questions ("healthcare commitments" vs "what will they do on
+health") land close together in embedding space. Before calling the LLM the
+chain embeds the standalone question with the same `text-embedding-3-large`
+client the retriever uses and, if a cached question is above the cosine
+threshold, returns that answer directly. The embedding gets the retriever's
+timeout, so a slow endpoint does not stall the request before the lexical
+fallback can help.
+
+The cache is keyed on everything an answer depends on besides the question
+(`cache_key`): the index version, the chat model and the prompt texts. When the
+registry rebuilds after a re-ingest, or a deploy changes the model or a
+prompt, the persisted cache no longer matches and starts empty. Eval runs turn
+it off (`SEMANTIC_CACHE=0`) so they score fresh answers.
+
+Everything is persisted under `cache/semantic/` so restarts keep the warm
+cache. `store` only updates memory; a background thread writes the files at
+most every `SEMANTIC_CACHE_FLUSH_S` (default 5), outside the lock, so lookups
+never wait on disk. The registry `close()`s a cache when it rebuilds the
+resources: pending stores are written, the writer thread stops and later
+stores to the old instance are dropped.
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+from time import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from monitoring import metrics
+from retriever.retriever import aembed_query_within, embed_query_within
+
+CACHE_EVENTS = metrics.counter("semantic_cache_total", "Semantic cache lookups by result (hit/miss)")
+SAVED_MS = metrics.counter("semantic_cache_saved_ms_total", "Generation latency avoided by semantic cache hits")
+
+DEFAULT_DIR = os.path.join("cache", "semantic")
+
+
+def cache_key(index_version: str, model: str = "", prompts: Sequence[str] = ()) -> str:
+    """Fingerprint of what a cached answer was produced with: corpus, chat model and prompts."""
+    h = hashlib.sha1()
+    for part in (index_version, model, *prompts):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return f"{index_version}-{h.hexdigest()[:12]}"
+
+
+def _normalize(vec) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm > 0 else v
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        embeddings,
+        key: str,
+        path: str = DEFAULT_DIR,
+        threshold: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        ttl_s: Optional[float] = None,
+        flush_s: Optional[float] = None,
+    ):
+        self.embeddings = embeddings
+        self.key = key
+        self.path = path
+        self.threshold = threshold if threshold is not None else float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+        self.max_entries = max_entries or int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+        self.ttl_s = ttl_s if ttl_s is not None else float(os.getenv("SEMANTIC_CACHE_TTL_S", str(7 * 24 * 3600)))
+        self.flush_s = flush_s if flush_s is not None else float(os.getenv("SEMANTIC_CACHE_FLUSH_S", "5"))
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self._vectors: Optional[np.ndarray] = None  # (n, dim) unit-norm float32 rows, a view of _buffer
+        self._buffer: Optional[np.ndarray] = None  # grows by doubling, so a store does not copy every row
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self._load()
+        self._dirty = threading.Event()
+        self._closed = threading.Event()
+        self._save_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_loop, name="semantic-cache-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    # -- lookup / store -----------------------------------------------------
+
+    def lookup(self, question: str, timeout_s: Optional[float] = None) -> Tuple[Optional[Dict[str, Any]], np.ndarray]:
+        """Return (entry or None, query vector); pass the vector back to `store` on a miss."""
+        vec = _normalize(embed_query_within(self.embeddings, question, timeout_s))
+        return self._match(vec), vec
+
+    async def alookup(self, question: str, timeout_s: Optional[float] = None) -> Tuple[Optional[Dict[str, Any]], np.ndarray]:
+        vec = _normalize(await aembed_query_within(self.embeddings, question, timeout_s))
+        return self._match(vec), vec
+
+    def _match(self, vec: np.ndarray) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._expire()
+            entry = None
+            if self._vectors is not None and len(self._entries):
+                sims = self._vectors @ vec
+                best = int(np.argmax(sims))
+                if float(sims[best]) >= self.threshold:
+                    entry = self._entries[best]
+                    entry["last_used"] = time()
+                    entry["hits"] = entry.get("hits", 0) + 1
+            if entry is None:
+                self.misses += 1
+                CACHE_EVENTS.inc(labels={"result": "miss"})
+                return None
+            self.hits += 1
+            self.saved_ms += entry.get("latency_ms", 0.0)
+            CACHE_EVENTS.inc(labels={"result": "hit"})
+            SAVED_MS.inc(entry.get("latency_ms", 0.0))
+            return entry
+
+    def store(self, question: str, vec: np.ndarray, answer: str, docs, latency_ms: float) -> None:
+        now = time()
+        entry = {
+            "question": question,
+            "answer": answer,
+            "sources": [
+                {
+                    "id": getattr(d, "id", None),
+                    "page_content": d.page_content,
+                    "metadata": dict(getattr(d, "metadata", {}) or {}),
+                }
+                for d in docs
+            ],
+            "latency_ms": round(latency_ms, 2),
+            "created": now,
+            "last_used": now,
+            "hits": 0,
+        }
+        row = np.asarray(vec, dtype=np.float32)
+        with self._lock:
+            if self._closed.is_set():
+                return  # retired by a rebuild; its answers belong to the old index
+            if self._vectors is None or self._vectors.shape[1] != row.shape[0]:
+                self._entries, self._buffer = [], None
+            n = len(self._entries)
+            if self._buffer is None or n == len(self._buffer):
+                grown = np.empty((max(16, 2 * n), row.shape[0]), dtype=np.float32)
+                grown[:n] = self._vectors[:n] if n else 0.0
+                self._buffer = grown
+            self._buffer[n] = row
+            self._entries.append(entry)
+            self._vectors = self._buffer[:n + 1]
+            self._evict_lru()
+        self._dirty.set()
+
+    # -- eviction -----------------------------------------------------------
+
+    def _keep(self, mask) -> None:
+        idx = [i for i, keep in enumerate(mask) if keep]
+        self._entries = [self._entries[i] for i in idx]
+        if self._vectors is None:
+            return
+        # A fresh array (rows of the old buffer may still be in a snapshot being
+        # written), with the same spare capacity so the next stores don't regrow it
+        buffer = np.empty_like(self._buffer)
+        buffer[:len(idx)] = self._vectors[idx]
+        self._buffer = buffer
+        self._vectors = buffer[:len(idx)]
+
+    def _expire(self) -> None:
+        if self.ttl_s <= 0 or not self._entries:
+            return
+        cutoff = time() - self.ttl_s
+        mask = [e["created"] >= cutoff for e in self._entries]
+        if not all(mask):
+            self._keep(mask)
+
+    def _evict_lru(self) -> None:
+        overflow = len(self._entries) - self.max_entries
+        if overflow <= 0:
+            return
+        order = sorted(range(len(self._entries)), key=lambda i: self._entries[i]["last_used"])
+        drop = set(order[:overflow])
+        self._keep([i not in drop for i in range(len(self._entries))])
+
+    # -- persistence --------------------------------------------------------
+
+    def _load(self) -> None:
+        meta_path = os.path.join(self.path, "entries.json")
+        vec_path = os.path.join(self.path, "vectors.npy")
+        if not (os.path.exists(meta_path) and os.path.exists(vec_path)):
+            return
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            vectors = np.load(vec_path)
+        except Exception as e:
+            print(f"⚠️ Semantic cache not loaded: {e}")
+            return
+        if meta.get("key") != self.key or len(meta.get("entries", [])) != len(vectors):
+            return  # other corpus/model/prompts, or a torn write: start empty
+        self._entries = meta["entries"]
+        self._vectors = self._buffer = vectors.astype(np.float32, copy=False)
+        self._expire()
+
+    def _write_loop(self) -> None:
+        while True:
+            self._dirty.wait()
+            if self._closed.is_set():
+                return
+            # Let a burst of stores land in one write (cut short by close())
+            self._closed.wait(self.flush_s)
+            self.flush()
+
+    def close(self) -> None:
+        """Write pending stores, stop the writer thread and drop the exit hook."""
+        with self._lock:
+            if self._closed.is_set():
+                return
+            self._closed.set()
+        pending = self._dirty.is_set()
+        self._dirty.set()  # wake the writer so it sees the close
+        self._writer.join(timeout=5)
+        if pending:
+            self.flush()
+        self._dirty.clear()
+        atexit.unregister(self.flush)
+
+    def flush(self) -> None:
+        """Write the current entries now (the writer thread does this after each burst of stores)."""
+        with self._save_lock:
+            if not self._dirty.is_set():
+                return
+            self._dirty.clear()
+            with self._lock:
+                # Rows below len(entries) are never written again, so the view is a stable snapshot
+                entries, vectors = list(self._entries), self._vectors
+            self._save(entries, vectors)
+
+    def _save(self, entries: List[Dict[str, Any]], vectors: Optional[np.ndarray]) -> None:
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            vec_tmp = os.path.join(self.path, f"vectors.tmp-{os.getpid()}.npy")
+            meta_tmp = os.path.join(self.path, f"entries.json.tmp-{os.getpid()}")
+            vectors = vectors if vectors is not None else np.empty((0, 0), dtype=np.float32)
+            np.save(vec_tmp, vectors)
+            with open(meta_tmp, "w", encoding="utf-8") as f:
+                json.dump({"key": self.key, "entries": entries}, f, ensure_ascii=False)
+            os.replace(vec_tmp, os.path.join(self.path, "vectors.npy"))
+            os.replace(meta_tmp, os.path.join(self.path, "entries.json"))
+        except Exception as e:
+            print(f"⚠️ Semantic cache not saved: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "saved_ms": round(self.saved_ms, 2),
+        }
+
+
+def cache_enabled() -> bool:
+    return os.getenv("SEMANTIC_CACHE", "1").lower() not in ("0", "false", "no")
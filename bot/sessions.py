@@ -0,0 +1,219 @@
+"""Per-session chains on top of the shared registry resources.
+
+Each browser session (keyed by `st.session_state.session_id`) gets its own
+memory and a thin `ConversationalRetrievalChain`; the LLM, embeddings and
+retriever come from `bot.registry` and are shared. The pool is bounded by
+count, idle time and process RSS, evicting least-recently-used sessions first.
+Only the RSS above a baseline sampled right after the resources are built
+(clients, index, numpy) can be freed by evicting, so the ceiling is checked
+at most every `SESSION_RSS_CHECK_S` and eviction stops as soon as it no
+longer brings RSS down.
+With `CHAT_HISTORY_BACKEND=sqlite` (bot/history_store.py) an evicted session
+loses nothing: its history is reloaded from disk the next time it is used.
+"""
+import gc
+import os
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Dict, Optional
+
+from bot.chain import get_chain
+from bot.memory import get_memory
+from bot.registry import get_resources
+from monitoring import metrics
+
+ACTIVE_SESSIONS = metrics.gauge("active_sessions", "Chat sessions held in this process")
+SESSION_EVICTIONS = metrics.counter("session_evictions_total", "Sessions evicted, by reason (lru/idle/memory)")
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None if it cannot be read."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        pass
+    try:
+        import psutil  # type: ignore
+        return int(psutil.Process().memory_info().rss)
+    except Exception:
+        return None
+
+
+class Session:
+    def __init__(self, session_id: str, chain, memory, resources):
+        self.session_id = session_id
+        self.chain = chain
+        self.memory = memory
+        self.resources = resources
+        self.created_at = monotonic()
+        self.last_used = self.created_at
+        self.turns = 0
+        self.api_lock = None  # set by api/server.py on first use
+
+
+class SessionManager:
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        idle_timeout_s: Optional[float] = None,
+        max_rss_mb: Optional[float] = None,
+        rss_check_interval_s: Optional[float] = None,
+    ):
+        if max_sessions is None:
+            max_sessions = int(os.getenv("SESSION_MAX", "200"))
+        if idle_timeout_s is None:
+            idle_timeout_s = float(os.getenv("SESSION_IDLE_TIMEOUT_S", "1800"))
+        if max_rss_mb is None:
+            max_rss_mb = float(os.getenv("SESSION_MAX_RSS_MB", "0"))  # 0 = no ceiling
+        if rss_check_interval_s is None:
+            rss_check_interval_s = float(os.getenv("SESSION_RSS_CHECK_S", "5"))
+        self.max_sessions = max(1, max_sessions)
+        self.idle_timeout_s = idle_timeout_s
+        self.max_rss_bytes = int(max_rss_mb * 1024 * 1024) if max_rss_mb > 0 else None
+        self.rss_check_interval_s = rss_check_interval_s
+        self.baseline_rss: Optional[int] = None  # RSS that evicting sessions cannot free
+        self._baseline_for = None
+        self._last_rss_check = float("-inf")
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.evictions = {"lru": 0, "idle": 0, "memory": 0}
+
+    def get(self, session_id: str) -> Session:
+        resources = self._get_resources()
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                # Summary mode folds old turns with the (non-streaming) condense model
+                memory = get_memory(summary_llm=resources.condense_llm, session_id=session_id)
+                chain = get_chain(
+                    llm=resources.llm,
+                    retriever=resources.retriever,
+                    memory=memory,
+                    condense_llm=resources.condense_llm,
+                    index_version=resources.index_version,
+                    semantic_cache=resources.semantic_cache,
+                )
+                session = Session(session_id, chain, memory, resources)
+                self._sessions[session_id] = session
+            elif session.resources is not resources:
+                # Index was reloaded: keep the history, rebind to the new clients
+                session.chain = get_chain(
+                    llm=resources.llm,
+                    retriever=resources.retriever,
+                    memory=session.memory,
+                    condense_llm=resources.condense_llm,
+                    index_version=resources.index_version,
+                    semantic_cache=resources.semantic_cache,
+                )
+                session.resources = resources
+            self._sessions.move_to_end(session_id)
+            session.last_used = monotonic()
+            while len(self._sessions) > self.max_sessions:
+                self._pop_oldest("lru")
+            self._enforce_memory_ceiling(keep=session_id)
+        return session
+
+    def _get_resources(self):
+        if self.max_rss_bytes is None:
+            return get_resources()
+        before = current_rss_bytes()
+        resources = get_resources()
+        if resources is not self._baseline_for:
+            # Built (or rebuilt) just now: what that added is not session memory
+            after = current_rss_bytes()
+            with self._lock:
+                if self._baseline_for is None:
+                    self.baseline_rss = after
+                elif self.baseline_rss is not None and before is not None and after is not None:
+                    self.baseline_rss += max(0, after - before)
+                self._baseline_for = resources
+            if self.baseline_rss is not None and self.baseline_rss >= self.max_rss_bytes:
+                print(
+                    f"⚠️ SESSION_MAX_RSS_MB ({self.max_rss_bytes / 2 ** 20:.0f} MB) is below the "
+                    f"{self.baseline_rss / 2 ** 20:.0f} MB the process needs without sessions; not evicting for memory."
+                )
+        return resources
+
+    def drop(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _pop_oldest(self, reason: str) -> None:
+        self._sessions.popitem(last=False)
+        self.evictions[reason] += 1
+        SESSION_EVICTIONS.inc(labels={"reason": reason})
+
+    def _evict_idle(self) -> None:
+        if self.idle_timeout_s <= 0:
+            return
+        cutoff = monotonic() - self.idle_timeout_s
+        # OrderedDict is in LRU order, so idle sessions sit at the front
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.last_used >= cutoff:
+                break
+            self._pop_oldest("idle")
+
+    def _enforce_memory_ceiling(self, keep: str) -> None:
+        if self.max_rss_bytes is None or self.baseline_rss is None or self.baseline_rss >= self.max_rss_bytes:
+            return
+        now = monotonic()
+        if now - self._last_rss_check < self.rss_check_interval_s:
+            return
+        self._last_rss_check = now
+        rss = current_rss_bytes()
+        while rss is not None and rss > self.max_rss_bytes and len(self._sessions) > 1:
+            # Evict in batches; freed memory only shows up in RSS after a collection
+            batch = max(1, len(self._sessions) // 10)
+            for _ in range(batch):
+                if len(self._sessions) <= 1:
+                    break
+                oldest_id = next(iter(self._sessions))
+                if oldest_id == keep:
+                    self._sessions.move_to_end(keep)
+                    continue
+                self._pop_oldest("memory")
+            gc.collect()
+            previous, rss = rss, current_rss_bytes()
+            if rss is None or rss >= previous:
+                break  # the growth is not in the sessions (or the allocator kept the pages)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        rss = current_rss_bytes()
+        return {
+            "active_sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "idle_timeout_s": self.idle_timeout_s,
+            "rss_mb": round(rss / (1024 * 1024), 1) if rss else None,
+            "baseline_rss_mb": round(self.baseline_rss / (1024 * 1024), 1) if self.baseline_rss else None,
+            "evictions": dict(self.evictions),
+        }
+
+
+_MANAGER: Optional[SessionManager] = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def get_session_manager() -> SessionManager:
+    global _MANAGER
+    if _MANAGER is None:
+        with _MANAGER_LOCK:
+            if _MANAGER is None:
+                _MANAGER = SessionManager()
+    return _MANAGER
+
+
+def _collect_session_metrics() -> None:
+    if _MANAGER is None:
+        return
+    ACTIVE_SESSIONS.set(len(_MANAGER))
+
+
+metrics.register_collector(_collect_session_metrics)
@@ -0,0 +1,130 @@
+"""Single-flight coalescing of identical in-flight work.
+
+The first caller for a key (the leader) runs the function; callers arriving
+with the same key while it is still running (followers) wait and get the same
+result instead of repeating the retrieval + LLM work. A follower waits at most
+until its own request deadline (bot/deadline.py), whatever the leader's is.
+If the leader ran out of its own time or was cancelled, a follower with time
+left takes over as the new leader; any other failure reaches the followers as
+`LeaderFailed`, chained to the leader's exception.
+
+On the async path the shared work runs as its own task without any request's
+deadline, and is cancelled once no caller is waiting for it anymore.
+"""
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+from bot.deadline import DeadlineExceeded, no_deadline, remaining_s
+from monitoring import metrics
+
+COALESCED = metrics.counter("singleflight_calls_total", "Coalesced calls by role (leader/follower)")
+
+
+class LeaderFailed(RuntimeError):
+    """The call a follower waited on failed; the leader's exception is the `__cause__`."""
+
+
+def normalize_question(question: str) -> str:
+    return " ".join((question or "").lower().split()).rstrip(" ?.!")
+
+
+def _leader_ran_out(error: BaseException) -> bool:
+    # The leader's own deadline or cancellation says nothing about a follower's request
+    return isinstance(error, (DeadlineExceeded, asyncio.CancelledError, concurrent.futures.CancelledError))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, List] = {}  # key -> [task, waiters]
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+            if leader:
+                break
+            self._count("follower")
+            remaining = remaining_s()
+            if not call.done.wait(None if remaining is None else max(0.0, remaining)):
+                raise DeadlineExceeded(f"singleflight:{self.name}")
+            if call.error is None:
+                return call.result
+            if not _leader_ran_out(call.error):
+                raise LeaderFailed(f"singleflight:{self.name}: shared call failed") from call.error
+
+        self._count("leader")
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            entry = self._tasks.get(key)
+            leader = entry is None
+            if leader:
+                self._count("leader")
+                entry = self._tasks[key] = [asyncio.ensure_future(self._shared(fn)), 0]
+                entry[0].add_done_callback(lambda _, entry=entry: self._forget(key, entry))
+            else:
+                self._count("follower")
+            task = entry[0]
+            entry[1] += 1
+            try:
+                # shield: a caller hitting its deadline leaves the others waiting
+                return await asyncio.shield(task)
+            except BaseException as e:
+                if not task.done():
+                    raise  # this caller was cancelled, the shared work goes on
+                if task.cancelled() or _leader_ran_out(e):
+                    continue
+                if leader:
+                    raise
+                raise LeaderFailed(f"singleflight:{self.name}: shared call failed") from e
+            finally:
+                entry[1] -= 1
+                if entry[1] == 0 and not task.done():
+                    task.cancel()  # nobody is waiting for it anymore
+
+    @staticmethod
+    async def _shared(fn: Callable[[], Awaitable[Any]]) -> Any:
+        # The task copied the leader's context; its callers each wait with their own deadline
+        with no_deadline():
+            return await fn()
+
+    def _forget(self, key: Hashable, entry: List) -> None:
+        if self._tasks.get(key) is entry:
+            del self._tasks[key]
+
+    def _count(self, role: str) -> None:
+        if role == "leader":
+            self.leaders += 1
+        else:
+            self.followers += 1
+        COALESCED.inc(labels={"name": self.name, "role": role})
+
+    def stats(self) -> Dict[str, int]:
+        return {"leaders": self.leaders, "followers": self.followers, "in_flight": len(self._calls) + len(self._tasks)}
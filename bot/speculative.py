@@ -0,0 +1,85 @@
+"""Speculative retrieval on the raw question while the rewrite LLM call runs.
+
+On follow-up turns the chain normally waits for the condensed question before
+embedding and searching. With `SPECULATIVE_RETRIEVAL=1` it retrieves for the
+raw user question in parallel; when the rewrite comes back close enough to the
+raw question (edit-distance ratio, or cosine of the two embeddings with
+`SPECULATIVE_MATCH=embedding`), those documents are used and the retrieval
+drops off the critical path. Otherwise, or if the embeddings for the match do
+not come back within the embedding budget, the chain retrieves again as usual.
+"""
+import contextvars
+import difflib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from bot.singleflight import normalize_question
+from monitoring import metrics
+from retriever.retriever import embed_query_within, embed_timeout_s, note_embedding_failure
+
+SPECULATIONS = metrics.counter("speculative_retrieval_total", "Speculative retrievals by outcome (used/discarded)")
+SPECULATION_SAVED_MS = metrics.counter("speculative_retrieval_saved_ms_total", "Critical-path latency removed by speculation")
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+
+def speculation_enabled() -> bool:
+    return os.getenv("SPECULATIVE_RETRIEVAL", "0").lower() in ("1", "true", "yes")
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(
+            max_workers=int(os.getenv("SPECULATIVE_WORKERS", "8")),
+            thread_name_prefix="speculative-retrieval",
+        )
+    return _EXECUTOR
+
+
+def submit(fn, *args, **kwargs):
+    # Keep the caller's context (trace span, deadlines) in the worker thread
+    ctx = contextvars.copy_context()
+    return _executor().submit(ctx.run, fn, *args, **kwargs)
+
+
+def speculative_vector(spec) -> Optional[List[float]]:
+    """The raw question's vector from a speculative retrieval that already finished, else None."""
+    if not spec.done() or spec.cancelled() or spec.exception() is not None:
+        return None
+    return spec.result()[2].get("vector")
+
+
+def questions_match(raw: str, rewritten: str, embeddings=None, raw_vector=None) -> Tuple[bool, float]:
+    """Is the rewritten question close enough to reuse the raw question's documents?"""
+    mode = os.getenv("SPECULATIVE_MATCH", "edit").lower()
+    if mode == "embedding" and embeddings is not None:
+        # The rewritten question's vector is needed anyway; the raw one comes from
+        # the speculative retrieval when it has finished. Both get the embedding
+        # budget, and a slow or failing endpoint just means "not used": the
+        # retriever then decides on its own fallback.
+        try:
+            a = raw_vector if raw_vector is not None else embed_query_within(embeddings, raw, embed_timeout_s())
+            b = embed_query_within(embeddings, rewritten, embed_timeout_s())
+        except Exception as e:
+            note_embedding_failure(e)
+            print(f"⚠️ Speculation match skipped, embedding failed: {e!r}")
+            return False, 0.0
+        a = np.asarray(a, dtype=np.float32)
+        b = np.asarray(b, dtype=np.float32)
+        denom = float(np.linalg.norm(a) * np.linalg.norm(b)) or 1.0
+        score = float(a @ b) / denom
+        threshold = float(os.getenv("SPECULATIVE_EMBED_THRESHOLD", "0.92"))
+    else:
+        score = difflib.SequenceMatcher(None, normalize_question(raw), normalize_question(rewritten)).ratio()
+        threshold = float(os.getenv("SPECULATIVE_EDIT_THRESHOLD", "0.85"))
+    return score >= threshold, score
+
+
+def record(used: bool, saved_ms: float = 0.0) -> None:
+    SPECULATIONS.inc(labels={"outcome": "used" if used else "discarded"})
+    if used:
+        SPECULATION_SAVED_MS.inc(max(0.0, saved_ms))
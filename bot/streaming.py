@@ -0,0 +1,132 @@
+"""Token streaming from the conversational chain.
+
+The chain still runs through `chain.invoke` (so memory, source documents and
+tracing behave exactly as before), but in a worker thread. A callback handler
+forwards tokens from the answer LLM, tagged with `ANSWER_TAG`, into a queue
+that the caller iterates over. The condense-question LLM is not tagged, so its
+rephrased question never leaks into the rendered answer.
+"""
+import asyncio
+import contextvars
+import queue
+import threading
+from time import perf_counter
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from langchain_core.callbacks import AsyncCallbackHandler, BaseCallbackHandler
+
+ANSWER_TAG = "rag.answer"
+
+_DONE = object()
+
+
+class _TokenQueueHandler(BaseCallbackHandler):
+    def __init__(self, token_queue: "queue.Queue"):
+        self.token_queue = token_queue
+
+    def on_llm_new_token(self, token: str, *, tags: Optional[list] = None, **kwargs: Any) -> None:
+        if token and tags and ANSWER_TAG in tags:
+            self.token_queue.put(token)
+
+
+class _AsyncTokenQueueHandler(AsyncCallbackHandler):
+    def __init__(self, token_queue: "asyncio.Queue"):
+        self.token_queue = token_queue
+
+    async def on_llm_new_token(self, token: str, *, tags: Optional[list] = None, **kwargs: Any) -> None:
+        if token and tags and ANSWER_TAG in tags:
+            self.token_queue.put_nowait(token)
+
+
+class AnswerStream:
+    """Iterate to receive answer tokens; `result` holds the full chain output afterwards."""
+
+    def __init__(self, chain, question: str):
+        self.chain = chain
+        self.question = question
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+        self.ttft_ms: Optional[float] = None
+        self.latency_ms: Optional[float] = None
+        self._queue: "queue.Queue" = queue.Queue()
+
+    def _run(self) -> None:
+        try:
+            self.result = self.chain.invoke(
+                {"question": self.question},
+                config={"callbacks": [_TokenQueueHandler(self._queue)]},
+            )
+        except BaseException as e:  # re-raised on the consumer side
+            self.error = e
+        finally:
+            self._queue.put(_DONE)
+
+    def __iter__(self) -> Iterator[str]:
+        start = perf_counter()
+        # Carry the caller's context (e.g. the active trace span) into the worker
+        ctx = contextvars.copy_context()
+        worker = threading.Thread(target=ctx.run, args=(self._run,), daemon=True)
+        worker.start()
+        streamed = False
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                break
+            if self.ttft_ms is None:
+                self.ttft_ms = (perf_counter() - start) * 1000.0
+            streamed = True
+            yield item
+        worker.join()
+        self.latency_ms = (perf_counter() - start) * 1000.0
+        if self.error is not None:
+            raise self.error
+        if not streamed and self.result is not None:
+            # Answer came back without token callbacks (e.g. a non-streaming model)
+            self.ttft_ms = self.latency_ms
+            yield self.result.get("answer", "")
+
+    @property
+    def answer(self) -> str:
+        return (self.result or {}).get("answer", "")
+
+
+class AsyncAnswerStream:
+    """`async for` counterpart of AnswerStream, driven by `chain.ainvoke` on the running loop."""
+
+    def __init__(self, chain, question: str):
+        self.chain = chain
+        self.question = question
+        self.result: Optional[Dict[str, Any]] = None
+        self.ttft_ms: Optional[float] = None
+        self.latency_ms: Optional[float] = None
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        start = perf_counter()
+        token_queue: "asyncio.Queue" = asyncio.Queue()
+        task = asyncio.ensure_future(self.chain.ainvoke(
+            {"question": self.question},
+            config={"callbacks": [_AsyncTokenQueueHandler(token_queue)]},
+        ))
+        task.add_done_callback(lambda _: token_queue.put_nowait(_DONE))
+        streamed = False
+        try:
+            while True:
+                item = await token_queue.get()
+                if item is _DONE:
+                    break
+                if self.ttft_ms is None:
+                    self.ttft_ms = (perf_counter() - start) * 1000.0
+                streamed = True
+                yield item
+            self.result = task.result()
+        finally:
+            if not task.done():
+                task.cancel()
+        self.latency_ms = (perf_counter() - start) * 1000.0
+        if not streamed:
+            self.ttft_ms = self.latency_ms
+            yield self.answer
+
+    @property
+    def answer(self) -> str:
+        return (self.result or {}).get("answer", "")
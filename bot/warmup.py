@@ -0,0 +1,115 @@
+"""Warm-up before the first user: open the index, touch its pages, run one retrieval.
+
+`serve.py` (the container entrypoint) and the API server call
+`start_warmup()` at boot. It runs in a background thread and:
+
+1. builds the shared resources (clients, Chroma store, retriever) in the
+   process-wide registry,
+2. reads the HNSW segment files (`data_level0.bin` and friends) so they sit
+   in the page cache,
+3. runs one synthetic retrieval, which loads the HNSW index into memory and
+   opens the first pooled TLS connection to the embeddings endpoint,
+4. with `WARMUP_LLM_PING=1`, sends a one-token request to the chat model.
+
+Each step is timed, printed, and exported as `warmup_ms{step}`. Readiness
+(`monitoring.startup.readiness`, `GET /ready` on the metrics sidecar) flips
+when warm-up finishes. It stays down only if the resources could not be
+built. A failed retrieval or ping is logged, but the process can still serve.
+"""
+import os
+import threading
+from time import perf_counter
+from typing import Dict, Optional
+
+from monitoring import metrics
+from monitoring.startup import set_ready
+
+WARMUP_MS = metrics.gauge("warmup_ms", "Duration of each warm-up step")
+
+_THREAD: Optional[threading.Thread] = None
+_LOCK = threading.Lock()
+
+
+def warmup_enabled() -> bool:
+    return os.getenv("WARMUP", "1").lower() not in ("0", "false", "no")
+
+
+def _read_segments(persist_directory: str) -> int:
+    """Read every HNSW segment file once (1 MiB at a time); returns bytes read."""
+    total = 0
+    for root, _, files in os.walk(persist_directory):
+        for name in files:
+            if not name.endswith(".bin"):
+                continue
+            with open(os.path.join(root, name), "rb", buffering=0) as f:
+                while True:
+                    chunk = f.read(1 << 20)
+                    if not chunk:
+                        break
+                    total += len(chunk)
+    return total
+
+
+def warm_up() -> Dict[str, float]:
+    """Run the warm-up steps in order; returns ms per step."""
+    from bot.rate_limit import admission_context
+    from bot.registry import get_registry
+
+    timings: Dict[str, float] = {}
+    set_ready(False, "warming")
+
+    def step(name: str, fn):
+        start = perf_counter()
+        try:
+            return fn()
+        finally:
+            timings[name] = round((perf_counter() - start) * 1000.0, 1)
+            WARMUP_MS.set(timings[name], labels={"step": name})
+            print(f"🔥 Warm-up {name}: {timings[name]:.0f} ms")
+
+    registry = get_registry()
+    try:
+        resources = step("resources", registry.get)
+    except Exception as e:
+        print(f"❌ Warm-up failed to build resources: {e}")
+        set_ready(False, "failed", error=str(e), timings_ms=timings)
+        return timings
+
+    errors = {}
+    try:
+        size = step("segments", lambda: _read_segments(registry.persist_directory))
+        print(f"🔥 Warm-up read {size / 1e6:.1f} MB of HNSW segments")
+    except OSError as e:
+        errors["segments"] = str(e)
+    query = os.getenv("WARMUP_QUERY", "What does the manifesto say about education?")
+    with admission_context(priority="interactive"):
+        try:
+            step("retrieval", lambda: resources.retriever.invoke(query))
+        except Exception as e:
+            errors["retrieval"] = str(e)
+        if os.getenv("WARMUP_LLM_PING", "0").lower() in ("1", "true", "yes"):
+            try:
+                step("llm_ping", lambda: resources.condense_llm.invoke("ping", max_tokens=1))
+            except Exception as e:
+                errors["llm_ping"] = str(e)
+    for name, error in errors.items():
+        print(f"⚠️ Warm-up {name} failed: {error}")
+
+    timings["total"] = round(sum(timings.values()), 1)
+    WARMUP_MS.set(timings["total"], labels={"step": "total"})
+    print(f"✅ Warm-up finished in {timings['total']:.0f} ms; ready for traffic.")
+    set_ready(True, "ready", timings_ms=timings, errors=errors)
+    return timings
+
+
+def start_warmup() -> Optional[threading.Thread]:
+    """Run `warm_up` once per process in a daemon thread; readiness is immediate with `WARMUP=0`."""
+    global _THREAD
+    with _LOCK:
+        if _THREAD is None:
+            if not warmup_enabled():
+                set_ready(True, "ready", warmup="disabled")
+                return None
+            _THREAD = threading.Thread(target=warm_up, name="warmup", daemon=True)
+            _THREAD.start()
+    return _THREAD
@@ -23,7 +23,8 @@ else
   echo "[entrypoint] Chroma store already populated. Skipping ingestion."
 fi
 
-# Launch Streamlit
-exec streamlit run /app/app.py --server.port ${STREAMLIT_SERVER_PORT:-8501} --server.address ${STREAMLIT_SERVER_ADDRESS:-0.0.0.0}
+# Launch Streamlit through serve.py: it warms up the index and clients in the
+# same process first, and /ready on the metrics port flips once that is done
+exec python /app/serve.py --server.port ${STREAMLIT_SERVER_PORT:-8501} --server.address ${STREAMLIT_SERVER_ADDRESS:-0.0.0.0}
 
 docker run -p 8501:8501 manifesto-chatbot:latest
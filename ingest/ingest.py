@@ -9,6 +9,14 @@ from dotenv import load_dotenv
 
 import shutil  
 import os  
+import sys  
+
+# Allow `python ingest/ingest.py` to import the sibling packages (retriever/, ...)
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+from retriever.retriever import embedding_cache_enabled
+from retriever.exact_index import export_from_chroma
+from retriever.bm25 import export_bm25_from_chroma
+from bot.clients import get_http_clients
 
 def clear_chroma_store(directory="chroma_store"):  
     if os.path.exists(directory):  
@@ -49,12 +57,26 @@ def ingest():
         raise EnvironmentError("Missing AZURE_OPENAI_ENDPOINT (or AZURE_ENDPOINT) in environment or .env")  
     deployment = os.getenv("AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT") or "text-embedding-3-large"  
   
+    # Batch priority: a re-ingest must not starve live chat on the same key
+    http_client, http_async_client = get_http_clients("batch")
     embeddings = AzureOpenAIEmbeddings(  
         deployment=deployment,  
         azure_endpoint=azure_endpoint,  
+        http_client=http_client,  
+        http_async_client=http_async_client,  
     )  
+    if embedding_cache_enabled():
+        # Unchanged chunks are served from cache/embeddings.sqlite3 on re-ingest
+        from retriever.embedding_cache import CachedEmbeddings
+        embeddings = CachedEmbeddings(embeddings, namespace=deployment)
   
     vectordb = Chroma.from_documents(chunks, embeddings, persist_directory="chroma_store")  
+    # Same vectors as one memory-mapped float32 matrix for RETRIEVER_BACKEND=exact
+    print(f"Exact index: {export_from_chroma(vectordb, 'chroma_store')}")
+    # Lexical postings for RETRIEVAL_MODE=hybrid
+    print(f"BM25 index: {export_bm25_from_chroma(vectordb, 'chroma_store')}")
+    if hasattr(embeddings, "stats"):
+        print(f"Embedding cache: {embeddings.stats()}")
     print("✅ Ingestion completed.")  
   
 if __name__ == "__main__":  
@@ -10,6 +10,8 @@ import os
 
 from langchain_openai import AzureChatOpenAI
 
+from bot.clients import get_http_clients
+
 logger = logging.getLogger(__name__)
 
 
@@ -119,12 +121,16 @@ def get_eval_llm() -> AzureChatOpenAI:
     global _EVAL_LLM
     if _EVAL_LLM is None:
         deployment = os.getenv("EVAL_AZURE_DEPLOYMENT", os.getenv("AZURE_EVAL_DEPLOYMENT", "gpt-4.1"))
+        # Judge calls queue behind interactive chat (bot/rate_limit.py)
+        http_client, http_async_client = get_http_clients("eval")
         _EVAL_LLM = AzureChatOpenAI(
             azure_deployment=deployment,
             openai_api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2023-12-01-preview"),
             openai_api_key=os.getenv("AZURE_OPENAI_API_KEY"),
             azure_endpoint=os.getenv("AZURE_ENDPOINT"),
-            temperature=0
+            temperature=0,
+            http_client=http_client,
+            http_async_client=http_async_client,
         )
     return _EVAL_LLM
 
@@ -0,0 +1,148 @@
+"""Cold-start benchmark: per-module import cost and the app's time-to-first-render.
+
+Each target runs in a fresh interpreter under `python -X importtime`, so the
+numbers are what a new container pays. A target is either a module name or
+`app`, which runs `app.py` once through Streamlit's AppTest (with the offline
+fakes) and also reports the `first_render` / `ready` milestones from
+monitoring/startup.py.
+
+    python -m monitoring.import_bench                     # app, run_eval_v3, bot.sessions
+    python -m monitoring.import_bench app --save cold.json
+    python -m monitoring.import_bench --baseline cold.json --max-regression-pct 20
+
+With `--baseline`, the exit code is 1 if any target's total import time (or a
+milestone) got slower by more than the allowed percentage, so CI can catch
+container boot regressions.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from time import perf_counter
+from typing import Dict, List
+
+DEFAULT_TARGETS = ["app", "run_eval_v3", "bot.sessions"]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+
+_APP_SCRIPT = """
+import json
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=300).run()
+if at.exception:
+    raise SystemExit(str(at.exception[0].value))
+from monitoring.startup import marks
+print("MARKS " + json.dumps(marks()))
+"""
+
+
+def _command(target: str) -> List[str]:
+    if target == "app":
+        return [sys.executable, "-X", "importtime", "-c", _APP_SCRIPT.format(app=os.path.join(ROOT, "app.py"))]
+    return [sys.executable, "-X", "importtime", "-c", f"import {target}"]
+
+
+def parse_importtime(stderr: str) -> Dict[str, object]:
+    """Sum `-X importtime` output: self time per top-level package, cumulative per top-level import."""
+    by_package: Dict[str, float] = defaultdict(float)
+    top_level: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        self_us, cumulative_us, indent, module = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+        by_package[module.split(".")[0]] += self_us / 1000.0
+        if len(indent) <= 2:  # imported directly by the target, not by another module
+            top_level[module] = top_level.get(module, 0.0) + cumulative_us / 1000.0
+    return {
+        "total_ms": round(sum(by_package.values()), 1),
+        "packages_ms": {k: round(v, 1) for k, v in sorted(by_package.items(), key=lambda kv: -kv[1])},
+        "top_level_ms": {k: round(v, 1) for k, v in sorted(top_level.items(), key=lambda kv: -kv[1])},
+    }
+
+
+def run_target(target: str) -> Dict[str, object]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    if target == "app":
+        # Offline and side-effect free: fake clients, no sidecar port, no session files
+        env.update({"CHATBOT_FAKE_LLM": "1", "METRICS_PORT": "0", "SESSION_LOG": "0"})
+    # Run from an empty directory so the app's relative paths (chroma_store/,
+    # cache/) don't touch the real index
+    with tempfile.TemporaryDirectory() as cwd:
+        start = perf_counter()
+        proc = subprocess.run(_command(target), capture_output=True, text=True, env=env, cwd=cwd)
+        wall_ms = (perf_counter() - start) * 1000.0
+    if proc.returncode != 0:
+        tail = "\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:"))[-2000:]
+        raise RuntimeError(f"{target} failed:\n{tail or proc.stdout[-2000:]}")
+    result = parse_importtime(proc.stderr)
+    result["wall_ms"] = round(wall_ms, 1)
+    for line in proc.stdout.splitlines():
+        if line.startswith("MARKS "):
+            result["milestones_ms"] = json.loads(line[len("MARKS "):])
+    return result
+
+
+def best_of(target: str, repeat: int) -> Dict[str, object]:
+    # Min over runs: noise only ever makes imports slower
+    return min((run_target(target) for _ in range(repeat)), key=lambda r: r["total_ms"])
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], max_regression_pct: float) -> List[str]:
+    regressions = []
+    for target, result in results.items():
+        base = baseline.get(target)
+        if not base:
+            continue
+        pairs = [("total_ms", result["total_ms"], base["total_ms"])]
+        for name, ms in (result.get("milestones_ms") or {}).items():
+            if name in (base.get("milestones_ms") or {}):
+                pairs.append((name, ms, base["milestones_ms"][name]))
+        for name, now, before in pairs:
+            if before and (now - before) / before * 100.0 > max_regression_pct:
+                regressions.append(f"{target} {name}: {before:.0f} ms -> {now:.0f} ms")
+    return regressions
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("targets", nargs="*", default=DEFAULT_TARGETS)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--top", type=int, default=12, help="packages to list per target")
+    p.add_argument("--save", help="write the results as JSON (use as a later --baseline)")
+    p.add_argument("--baseline", help="JSON from an earlier --save to compare against")
+    p.add_argument("--max-regression-pct", type=float, default=20.0)
+    args = p.parse_args()
+
+    results = {}
+    for target in args.targets:
+        r = results[target] = best_of(target, args.repeat)
+        print(f"\n{target}: imports {r['total_ms']:.0f} ms, process {r['wall_ms']:.0f} ms")
+        for name, ms in (r.get("milestones_ms") or {}).items():
+            print(f"  {name:<24} {ms:8.0f} ms after process start")
+        for package, ms in list(r["packages_ms"].items())[: args.top]:
+            print(f"  {package:<24} {ms:8.1f} ms")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved to {args.save}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression_pct)
+        if regressions:
+            print(f"\nStartup regressions over {args.max_regression_pct:.0f}%:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo startup regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Tiny in-process metrics registry (counters, gauges and histograms).
+
+Works without Phoenix or any exporter; `snapshot()` returns a plain dict that
+the API server and the Streamlit sidebar can show directly, and
+`render_prometheus()` the Prometheus text format (served by
+monitoring/metrics_server.py). Collectors registered with `register_collector`
+run before each export to refresh gauges that are cheaper to read than to track.
+"""
+import os
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> _LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+class Counter:
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self._values: Dict[_LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, labels: Optional[Dict[str, str]] = None) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, labels: Optional[Dict[str, str]] = None) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+
+class Gauge(Counter):
+    def set(self, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, labels: Optional[Dict[str, str]] = None) -> None:
+        self.inc(-amount, labels)
+
+
+class Histogram:
+    """Latency-style observations; percentiles come from the most recent `window` values."""
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, name: str, help: str = "", window: Optional[int] = None):
+        self.name = name
+        self.help = help
+        self.window = window or int(os.getenv("METRICS_HISTOGRAM_WINDOW", "2048"))
+        self._recent: Dict[_LabelKey, Deque[float]] = {}
+        self._totals: Dict[_LabelKey, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent is None:
+                recent = self._recent[key] = deque(maxlen=self.window)
+            recent.append(float(value))
+            count, total = self._totals.get(key, (0, 0.0))
+            self._totals[key] = (count + 1, total + float(value))
+
+    def summary(self, labels: Optional[Dict[str, str]] = None) -> Dict[str, float]:
+        key = _label_key(labels)
+        with self._lock:
+            return self._summary(key)
+
+    def _summary(self, key: _LabelKey) -> Dict[str, float]:
+        count, total = self._totals.get(key, (0, 0.0))
+        out = {"count": count, "sum": round(total, 3)}
+        recent = self._recent.get(key)
+        if recent:
+            import numpy as np  # only when a histogram is read; keeps numpy out of the startup imports
+
+            values = np.percentile(np.fromiter(recent, dtype=np.float64), [q * 100 for q in self.QUANTILES])
+            out.update({f"p{int(q * 100)}": round(float(v), 3) for q, v in zip(self.QUANTILES, values)})
+        return out
+
+    def items(self):
+        with self._lock:
+            return [(key, self._summary(key)) for key in list(self._totals)]
+
+
+_METRICS: Dict[str, Any] = {}
+_COLLECTORS: List[Callable[[], None]] = []
+_LOCK = threading.Lock()
+
+
+def _get_or_create(cls, name: str, help: str):
+    with _LOCK:
+        metric = _METRICS.get(name)
+        if metric is None:
+            metric = cls(name, help)
+            _METRICS[name] = metric
+        elif type(metric) is not cls:
+            raise TypeError(f"metric {name!r} already registered as {type(metric).__name__}")
+        return metric
+
+
+def counter(name: str, help: str = "") -> Counter:
+    return _get_or_create(Counter, name, help)
+
+
+def gauge(name: str, help: str = "") -> Gauge:
+    return _get_or_create(Gauge, name, help)
+
+
+def histogram(name: str, help: str = "") -> Histogram:
+    return _get_or_create(Histogram, name, help)
+
+
+def register_collector(fn: Callable[[], None]) -> None:
+    with _LOCK:
+        if fn not in _COLLECTORS:
+            _COLLECTORS.append(fn)
+
+
+def _collect() -> List[Any]:
+    with _LOCK:
+        collectors = list(_COLLECTORS)
+    for fn in collectors:
+        try:
+            fn()
+        except Exception as e:  # a broken collector must not break the export
+            print(f"⚠️ Metrics collector {getattr(fn, '__name__', fn)} failed: {e}")
+    with _LOCK:
+        return list(_METRICS.values())
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    metrics = _collect()
+    for metric in metrics:
+        out[metric.name] = {
+            ",".join(f"{k}={v}" for k, v in key) or "_": value
+            for key, value in metric.items()
+        }
+    return out
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(key, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(key) + sorted((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines: List[str] = []
+    for metric in sorted(_collect(), key=lambda m: m.name):
+        kind = {Counter: "counter", Gauge: "gauge", Histogram: "summary"}[type(metric)]
+        lines.append(f"# HELP {metric.name} {_escape(metric.help)}")
+        lines.append(f"# TYPE {metric.name} {kind}")
+        for key, value in metric.items():
+            if kind != "summary":
+                lines.append(f"{metric.name}{_labels(key)} {value}")
+                continue
+            # Quantiles are over the recent window, count/sum over the process lifetime
+            for q in Histogram.QUANTILES:
+                quantile = value.get(f"p{int(q * 100)}")
+                if quantile is not None:
+                    lines.append(f"{metric.name}{_labels(key, {'quantile': str(q)})} {quantile}")
+            lines.append(f"{metric.name}_sum{_labels(key)} {value['sum']}")
+            lines.append(f"{metric.name}_count{_labels(key)} {value['count']}")
+    return "\n".join(lines) + "\n"
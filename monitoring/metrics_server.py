@@ -0,0 +1,74 @@
+"""Prometheus scrape endpoint on a sidecar port next to Streamlit.
+
+Streamlit owns its own HTTP server, so `start_metrics_server()` runs a small
+`http.server` on `METRICS_PORT` (default 9100) in a daemon thread and serves
+`GET /metrics` from the in-process registry (monitoring/metrics.py). It does
+not depend on Phoenix being reachable. Safe to call on every Streamlit rerun:
+only the first call in a process binds the port. `GET /ready` answers 200 once
+warm-up has finished (bot/warmup.py) and 503 before, for container health checks.
+"""
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from monitoring import metrics
+from monitoring.startup import readiness
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_SERVER: Optional[ThreadingHTTPServer] = None
+_ATTEMPTED = False
+_LOCK = threading.Lock()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive for scrapers; responses carry Content-Length
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            self._send(200, CONTENT_TYPE, metrics.render_prometheus())
+        elif path == "/ready":
+            state = readiness()
+            self._send(200 if state["ready"] else 503, "application/json", json.dumps(state))
+        else:
+            self.send_error(404)
+
+    def _send(self, status: int, content_type: str, text: str):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would flood the Streamlit log
+
+
+def metrics_server_enabled() -> bool:
+    return os.getenv("METRICS_PORT", "9100") not in ("", "0")
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    global _SERVER, _ATTEMPTED
+    if _ATTEMPTED or not metrics_server_enabled():
+        return _SERVER
+    with _LOCK:
+        if not _ATTEMPTED:
+            _ATTEMPTED = True
+            port = port or int(os.getenv("METRICS_PORT", "9100"))
+            host = host or os.getenv("METRICS_HOST", "0.0.0.0")
+            try:
+                server = ThreadingHTTPServer((host, port), _Handler)
+            except OSError as e:
+                # e.g. a second Streamlit process on the same host; keep running without it
+                print(f"⚠️ Metrics endpoint not started on {host}:{port}: {e}")
+                return None
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+            print(f"✅ Prometheus metrics on http://{host}:{port}/metrics")
+            _SERVER = server
+    return _SERVER
@@ -0,0 +1,229 @@
+"""Always-on, append-only session event log (one JSON line per turn).
+
+Replaces the "End session and save log" JSON dump, which re-serialized the
+whole history on the request thread and only existed if the user clicked. Each
+turn is queued here and written by one background thread to
+`logs/sessions/<session_id>.jsonl`. Lines are batched, files are fsynced every
+`SESSION_LOG_FSYNC_S`, and a file is rotated to `<session_id>.<stamp>.jsonl.gz`
+when it passes `SESSION_LOG_MAX_MB` or the day changes. `export` stitches a
+session's rotated parts and live file back together for the download.
+"""
+import glob
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from time import monotonic
+from typing import Any, Dict, List, Optional
+
+from monitoring import metrics
+
+LOG_EVENTS = metrics.counter("session_log_events_total", "Session log lines by outcome (written/dropped)")
+LOG_ROTATIONS = metrics.counter("session_log_rotations_total", "Session log files rotated and compressed")
+
+DEFAULT_DIR = os.path.join("logs", "sessions")
+
+
+def session_log_enabled() -> bool:
+    return os.getenv("SESSION_LOG", "1").lower() not in ("0", "false", "no")
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%d")
+
+
+class _OpenFile:
+    def __init__(self, path: str):
+        self.path = path
+        self.fh = open(path, "ab")
+        # A file left over from before a restart belongs to the day it was last written
+        self.day = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc).strftime("%Y%m%d")
+        self.dirty = False
+
+
+class SessionLogWriter:
+    def __init__(
+        self,
+        directory: str = DEFAULT_DIR,
+        max_bytes: Optional[int] = None,
+        fsync_interval_s: Optional[float] = None,
+        max_open_files: int = 64,
+        max_queue: int = 10000,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes or int(float(os.getenv("SESSION_LOG_MAX_MB", "20")) * 1024 * 1024)
+        self.fsync_interval_s = fsync_interval_s if fsync_interval_s is not None else float(os.getenv("SESSION_LOG_FSYNC_S", "2"))
+        self.max_open_files = max_open_files
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=max_queue)
+        self._files: "OrderedDict[str, _OpenFile]" = OrderedDict()
+        self._last_fsync = monotonic()
+        os.makedirs(directory, exist_ok=True)
+        self._writer = threading.Thread(target=self._write_loop, name="session-log-writer", daemon=True)
+        self._writer.start()
+
+    def path_for(self, session_id: str) -> str:
+        safe = "".join(c for c in str(session_id) if c.isalnum() or c in "-_") or "unknown"
+        return os.path.join(self.directory, f"{safe}.jsonl")
+
+    def parts(self, session_id: str) -> List[str]:
+        """A session's rotated `.jsonl.gz` parts, oldest first, then its live file if present."""
+        path = self.path_for(session_id)
+        stem = path[:-len(".jsonl")]
+
+        def order(part: str):
+            # <stem>.<YYYYmmdd-HHMMSS>[-n].jsonl.gz; a plain sort would put "-1" before its base stamp
+            stamp = part[len(stem) + 1:-len(".jsonl.gz")]
+            return stamp[:15], int(stamp[16:]) if stamp[16:].isdigit() else 0
+
+        rotated = sorted(glob.glob(glob.escape(stem) + ".*.jsonl.gz"), key=order)
+        return rotated + ([path] if os.path.exists(path) else [])
+
+    def export(self, session_id: str) -> bytes:
+        """The session's whole log as one JSONL document, rotated parts included."""
+        self.flush()
+        chunks = []
+        for part in self.parts(session_id):
+            try:
+                if part.endswith(".gz"):
+                    with gzip.open(part, "rb") as f:
+                        chunks.append(f.read())
+                else:
+                    with open(part, "rb") as f:
+                        chunks.append(f.read())
+            except OSError as e:
+                print(f"⚠️ Session log part not readable: {part} ({e})")
+        return b"".join(chunks)
+
+    def log(self, session_id: str, event: Dict[str, Any]) -> None:
+        """Queue one line; never blocks the request (drops if the writer is far behind)."""
+        record = {"ts": datetime.now(timezone.utc).isoformat(), "session_id": session_id, **event}
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        try:
+            self._queue.put_nowait(("line", self.path_for(session_id), line))
+        except queue.Full:
+            LOG_EVENTS.inc(labels={"outcome": "dropped"})
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Wait until everything queued so far is written (e.g. before a download)."""
+        done = threading.Event()
+        self._queue.put(("flush", None, done))
+        done.wait(timeout)
+
+    def _write_loop(self) -> None:
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.fsync_interval_s)]
+            except queue.Empty:
+                batch = []
+            while len(batch) < 512:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            waiters = []
+            lines: Dict[str, List[bytes]] = {}
+            for kind, path, item in batch:
+                if kind == "flush":
+                    waiters.append(item)
+                else:
+                    lines.setdefault(path, []).append(item)
+            for path, chunk in lines.items():
+                try:
+                    self._append(path, chunk)
+                    LOG_EVENTS.inc(len(chunk), labels={"outcome": "written"})
+                except OSError as e:
+                    LOG_EVENTS.inc(len(chunk), labels={"outcome": "dropped"})
+                    print(f"⚠️ Session log write failed: {e}")
+            if waiters or monotonic() - self._last_fsync >= self.fsync_interval_s:
+                self._sync()
+            for done in waiters:
+                done.set()
+
+    def _append(self, path: str, chunk: List[bytes]) -> None:
+        f = self._files.get(path) or self._open(path)
+        if f.fh.tell() > 0 and (f.day != _today() or f.fh.tell() >= self.max_bytes):
+            self._rotate(path)
+            f = self._open(path)
+        self._files.move_to_end(path)
+        f.fh.write(b"".join(chunk))
+        f.fh.flush()  # into the OS page cache; fsync happens in _sync
+        f.dirty = True
+
+    def _open(self, path: str) -> _OpenFile:
+        f = _OpenFile(path)
+        self._files[path] = f
+        while len(self._files) > self.max_open_files:
+            _, old = self._files.popitem(last=False)
+            self._close(old)
+        return f
+
+    def _sync(self) -> None:
+        for f in self._files.values():
+            if f.dirty:
+                try:
+                    os.fsync(f.fh.fileno())
+                except OSError:
+                    pass
+                f.dirty = False
+        self._last_fsync = monotonic()
+
+    def _close(self, f: _OpenFile) -> None:
+        try:
+            if f.dirty:
+                os.fsync(f.fh.fileno())
+            f.fh.close()
+        except OSError:
+            pass
+
+    def _rotate(self, path: str) -> None:
+        f = self._files.pop(path, None)
+        if f is not None:
+            self._close(f)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        rotated = f"{path[:-len('.jsonl')]}.{stamp}.jsonl.gz"
+        n = 1
+        while os.path.exists(rotated):  # several size rotations within one second
+            rotated = f"{path[:-len('.jsonl')]}.{stamp}-{n}.jsonl.gz"
+            n += 1
+        try:
+            with open(path, "rb") as src, gzip.open(rotated, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+            LOG_ROTATIONS.inc()
+        except OSError as e:
+            print(f"⚠️ Session log rotation failed: {e}")
+
+
+_WRITER: Optional[SessionLogWriter] = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_session_log() -> SessionLogWriter:
+    global _WRITER
+    if _WRITER is None:
+        with _WRITER_LOCK:
+            if _WRITER is None:
+                _WRITER = SessionLogWriter(os.getenv("SESSION_LOG_DIR", DEFAULT_DIR))
+    return _WRITER
+
+
+def log_turn(session_id: str, question: str, result: Optional[Dict[str, Any]], **fields: Any) -> None:
+    """Record one question/answer turn; a no-op when `SESSION_LOG=0`."""
+    if not session_log_enabled():
+        return
+    result = result or {}
+    docs = result.get("source_documents") or []
+    event = {
+        "event": "turn",
+        "question": question,
+        "answer": result.get("answer", ""),
+        "generated_question": result.get("generated_question"),
+        "retrieved_ids": [getattr(d, "id", None) or (d.metadata or {}).get("id") for d in docs],
+        "retrieval_path": result.get("retrieval_path"),
+        **fields,
+    }
+    get_session_log().log(session_id, event)
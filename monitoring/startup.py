@@ -0,0 +1,93 @@
+"""Startup milestones (time-to-first-render, time-to-ready) for the Streamlit app.
+
+`app.py` renders its page chrome before importing LangChain, Chroma and the
+Phoenix instrumentation, then calls `mark("first_render")`, and later
+`mark("ready")` once the RAG resources are built. Each milestone is recorded
+once per process, as milliseconds since the interpreter started, in the
+`startup_ms` gauge. `python -m monitoring.import_bench` measures the same
+numbers from a cold process.
+
+Readiness is kept here too: `set_ready()` is called when the warm-up
+(bot/warmup.py) finishes, and the metrics sidecar's `GET /ready` returns 503
+until then. Under a plain `streamlit run app.py` no warm-up runs, so the app
+calls `ready_without_warmup()` once the first session has built the resources.
+"""
+import os
+import threading
+from time import time
+from typing import Any, Dict, Optional
+
+from monitoring import metrics
+
+STARTUP_MS = metrics.gauge("startup_ms", "Milliseconds from process start to each startup milestone")
+READY = metrics.gauge("ready", "1 once warm-up has finished and the process can take traffic")
+
+_MODULE_LOADED = time()
+_MARKS: Dict[str, float] = {}
+_LOCK = threading.Lock()
+_READINESS: Dict[str, Any] = {"ready": False, "status": "starting"}
+
+
+def _process_start() -> float:
+    """Wall-clock start of this process (Linux /proc), else when this module was imported."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = float(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime_s = float(f.read().split()[0])
+        return time() - uptime_s + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return _MODULE_LOADED
+
+
+_PROCESS_START = _process_start()
+
+
+def since_start_ms() -> float:
+    return max(0.0, (time() - _PROCESS_START) * 1000.0)
+
+
+def mark(milestone: str) -> Optional[float]:
+    """Record `milestone` the first time it is reached in this process; returns its ms."""
+    with _LOCK:
+        if milestone not in _MARKS:
+            _MARKS[milestone] = since_start_ms()
+            STARTUP_MS.set(round(_MARKS[milestone], 1), labels={"milestone": milestone})
+            print(f"⏱️ Startup: {milestone} after {_MARKS[milestone]:.0f} ms")
+        return _MARKS[milestone]
+
+
+def marks() -> Dict[str, float]:
+    return dict(_MARKS)
+
+
+def lazy_imports_enabled() -> bool:
+    """`LAZY_IMPORTS=0` imports the whole chat stack before the first render (the old behaviour)."""
+    return os.getenv("LAZY_IMPORTS", "1").lower() not in ("0", "false", "no")
+
+
+
+def set_ready(ready: bool, status: str, **detail: Any) -> None:
+    with _LOCK:
+        _READINESS.clear()
+        _READINESS.update({"ready": ready, "status": status, **detail})
+    READY.set(1 if ready else 0)
+    if ready:
+        mark("warm")
+
+
+def ready_without_warmup() -> bool:
+    """Mark ready unless a warm-up has reported in this process; True if this call did it."""
+    with _LOCK:
+        if _READINESS.get("status") != "starting":
+            return False
+        _READINESS.clear()
+        _READINESS.update({"ready": True, "status": "ready", "warmup": "none"})
+    READY.set(1)
+    mark("warm")
+    return True
+
+
+def readiness() -> Dict[str, Any]:
+    with _LOCK:
+        return dict(_READINESS)
@@ -0,0 +1,37 @@
+"""Token counting with the pinned tiktoken, for budgets and usage metrics.
+
+Falls back to a chars/4 estimate when tiktoken (or its encoding files, which
+are downloaded on first use) is unavailable.
+"""
+try:
+    import tiktoken
+except Exception:
+    tiktoken = None  # optional
+
+_ENCODING = {}
+
+
+def count_tokens(text: str, model: str = "gpt-4.1") -> int:
+    if model not in _ENCODING:
+        _ENCODING[model] = _load_encoding(model)
+    enc = _ENCODING[model]
+    if enc is None:
+        return max(1, len(text) // 4)
+    return len(enc.encode(text))
+
+
+def _load_encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass  # model unknown to this tiktoken version
+    except Exception as e:
+        print(f"⚠️ tiktoken unavailable ({e}); estimating tokens")
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")  # gpt-4.1 family
+    except Exception as e:  # encoding files are downloaded on first use
+        print(f"⚠️ tiktoken unavailable ({e}); estimating tokens")
+        return None
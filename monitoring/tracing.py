@@ -0,0 +1,90 @@
+"""Small helpers for spans, span attributes and per-stage timings.
+
+OpenTelemetry is optional: without it (or without Phoenix running) the span
+parts are no-ops, so instrumented code never has to guard itself. Stage
+timings always land in the in-process `rag_stage_ms` histogram, so p50/p95/p99
+per stage can be read from `metrics.snapshot()` without Phoenix. A stage
+refuses to start once the request deadline (bot/deadline.py) has passed.
+"""
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+from typing import Any, Iterator
+
+from bot.deadline import check_deadline, remaining_s
+from monitoring import metrics
+
+try:
+    from opentelemetry import trace as otel_trace  # type: ignore
+except Exception:
+    otel_trace = None  # optional
+
+
+def set_attributes(**attrs: Any) -> None:
+    """Set `rag.*` style attributes on the current span; dots are written as `__`."""
+    if otel_trace is None:
+        return
+    try:
+        span = otel_trace.get_current_span()
+        for key, value in attrs.items():
+            if value is not None:
+                span.set_attribute(key.replace("__", "."), value)
+    except Exception:
+        pass
+
+
+STAGE_MS = metrics.histogram("rag_stage_ms", "Latency per pipeline stage (condense, embed, search, bm25, mmr, fuse, prompt, generate)")
+REQUEST_MS = metrics.histogram("rag_request_ms", "End-to-end latency of one chat request")
+REQUESTS = metrics.counter("rag_requests_total", "Chat requests by outcome")
+
+STAGES = ("condense", "embed", "search", "bm25", "mmr", "fuse", "prompt", "generate")
+
+
+def _tracer():
+    return otel_trace.get_tracer("manifesto-chatbot") if otel_trace is not None else None
+
+
+def _span(name: str, attrs: dict):
+    tracer = _tracer()
+    if tracer is None:
+        return nullcontext()
+    attributes = {k.replace("__", "."): v for k, v in attrs.items() if v is not None}
+    return tracer.start_as_current_span(name, attributes=attributes)
+
+
+@contextmanager
+def stage(name: str, **attrs: Any) -> Iterator[None]:
+    """Child span `rag.<name>` plus a `rag_stage_ms{stage=<name>}` observation."""
+    check_deadline(name)
+    remaining = remaining_s()
+    if remaining is not None:
+        attrs = {**attrs, "rag__deadline_remaining_ms": round(remaining * 1000.0, 1)}
+    start = perf_counter()
+    with _span(f"rag.{name}", attrs) as span:
+        try:
+            yield
+        finally:
+            ms = (perf_counter() - start) * 1000.0
+            STAGE_MS.observe(ms, labels={"stage": name})
+            if span is not None:
+                try:
+                    span.set_attribute("rag.stage_ms", round(ms, 3))
+                except Exception:
+                    pass
+
+
+@contextmanager
+def request_span(name: str = "rag.request", **attrs: Any) -> Iterator[Any]:
+    """Root span for one chat request; stage spans opened inside nest under it."""
+    start = perf_counter()
+    outcome = "error"
+    with _span(name, attrs) as span:
+        try:
+            yield span
+            outcome = "ok"
+        finally:
+            REQUEST_MS.observe((perf_counter() - start) * 1000.0)
+            REQUESTS.inc(labels={"outcome": outcome})
+
+
+def stage_summary() -> dict:
+    return {name: STAGE_MS.summary(labels={"stage": name}) for name in STAGES}
@@ -0,0 +1,65 @@
+"""LLM call and token-usage counters, fed by a LangChain callback handler.
+
+Attached to every chat model built in bot/chain.py (and the fakes). Token
+counts come from the provider's usage metadata when the response carries it;
+streamed Azure responses usually don't, so prompt and completion tokens are
+then counted locally with tiktoken and labelled `source="estimated"`.
+"""
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from monitoring import metrics
+from monitoring.tokens import count_tokens
+
+LLM_CALLS = metrics.counter("llm_calls_total", "Chat model calls by model and outcome")
+LLM_TOKENS = metrics.counter("llm_tokens_total", "Chat model tokens by model, kind (prompt/completion) and source")
+EMBEDDING_CALLS = metrics.counter("embedding_calls_total", "Embedding API calls by deployment")
+EMBEDDING_TOKENS = metrics.counter("embedding_tokens_total", "Estimated tokens sent to the embedding API")
+
+
+def record_embedding_call(deployment: str, texts: List[str]) -> None:
+    EMBEDDING_CALLS.inc(labels={"deployment": deployment})
+    EMBEDDING_TOKENS.inc(sum(count_tokens(t, model=deployment) for t in texts), labels={"deployment": deployment})
+
+
+class LLMUsageCallback(BaseCallbackHandler):
+    def __init__(self, model: str):
+        self.model = model
+        self._prompt_tokens: Dict[UUID, int] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        self._prompt_tokens[run_id] = sum(count_tokens(str(m.content)) + 4 for batch in messages for m in batch)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any) -> None:
+        self._prompt_tokens[run_id] = sum(count_tokens(p) for p in prompts)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        estimated_prompt = self._prompt_tokens.pop(run_id, 0)
+        LLM_CALLS.inc(labels={"model": self.model, "outcome": "ok"})
+        usage = _reported_usage(response)
+        if usage is not None:
+            prompt, completion, source = usage[0], usage[1], "reported"
+        else:
+            text = "".join(g.text for gens in response.generations for g in gens)
+            prompt, completion, source = estimated_prompt, count_tokens(text), "estimated"
+        LLM_TOKENS.inc(prompt, labels={"model": self.model, "kind": "prompt", "source": source})
+        LLM_TOKENS.inc(completion, labels={"model": self.model, "kind": "completion", "source": source})
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._prompt_tokens.pop(run_id, None)
+        LLM_CALLS.inc(labels={"model": self.model, "outcome": "error"})
+
+
+def _reported_usage(response: LLMResult) -> Optional[tuple]:
+    for gens in response.generations:
+        for g in gens:
+            meta = getattr(getattr(g, "message", None), "usage_metadata", None)
+            if meta:
+                return meta.get("input_tokens", 0), meta.get("output_tokens", 0)
+    usage = (response.llm_output or {}).get("token_usage")
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    return None
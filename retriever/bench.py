@@ -0,0 +1,471 @@
+"""Retrieval micro-benchmarks, runnable offline.
+
+    python -m retriever.bench backends --chunks 400 --queries 300
+    python -m retriever.bench backends --persist-dir chroma_store   # the real store
+    python -m retriever.bench mmr --fetch-k 20 50 100 200 500
+    python -m retriever.bench graph --chunks 400 2000 8000
+    python -m retriever.bench hybrid --persist-dir chroma_store
+    python -m retriever.bench degraded --slow-p 0.3 --fail-p 0.1 --timeout-ms 200
+
+`backends` compares the Chroma path with the memory-mapped exact index
+(retriever/exact_index.py). Each backend runs in its own process, so its RSS
+is its own. The report gives per-query latency for the candidate search
+alone and for search + MMR, RSS after loading and after the queries, and how
+often the two backends pick the same chunks. Without `--persist-dir`, a
+synthetic corpus of unit vectors (3072-d, like text-embedding-3-large) is
+built in a temp directory.
+
+`mmr` times LangChain's `maximal_marginal_relevance` against retriever/mmr.py
+(one query at a time and batched) on the same candidates and checks that the
+picks are identical. With `--gold` it also checks the picks for the questions
+in monitoring/eval/gold_qa.json against the configured store and embeddings.
+
+`graph` grows a synthetic corpus and compares MMR on the candidates'
+embeddings with MMR on the precomputed similarity graph
+(retriever/sim_graph.py), both the float16 matrix and the top-M neighbour
+lists: graph build time, bytes on disk, search + MMR latency, and how often
+the picks match.
+
+`hybrid` runs the gold_qa.json questions through pure MMR and through
+BM25 + dense with reciprocal-rank fusion on a real store. It reports expected
+keywords found in the retrieved chunks, cited pages retrieved, end-to-end
+latency, and the BM25 and dense branch latencies. With `CHATBOT_FAKE_LLM=1`
+it runs offline on fake embeddings, which only exercises the lexical side.
+
+`degraded` runs the whole chain offline (fake LLM and embeddings,
+`CHATBOT_FAKE_LLM=1`) on a synthetic text store. Some embedding calls are
+made slow or failing, and the report shows how often each retrieval path
+served the answer and its latency.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+from typing import Dict, List
+
+import numpy as np
+
+DIM = 3072
+
+
+def _rss_kb() -> Dict[str, int]:
+    """VmRSS and its anonymous / file-backed parts (file pages are shareable between processes)."""
+    out = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "RssAnon", "RssFile"):
+                    out[key] = int(value.split()[0])
+    except OSError:
+        import resource
+        out["VmRSS"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return out
+
+
+def _pct(values: List[float], p: float) -> float:
+    return round(float(np.percentile(values, p)), 3) if values else 0.0
+
+
+def _synthetic_vectors(chunks: int, dim: int = DIM, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # A few topics so neighbours are meaningful, like pages of one manifesto
+    centers = rng.standard_normal((max(1, chunks // 20), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), chunks)] + 0.8 * rng.standard_normal((chunks, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_synthetic_store(directory: str, chunks: int, dim: int = DIM, seed: int = 0) -> None:
+    """Chroma collection plus exact-index files over `chunks` random unit vectors."""
+    from langchain_community.vectorstores import Chroma
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    from retriever.exact_index import write_exact_index
+
+    vectors = _synthetic_vectors(chunks, dim, seed)
+    ids = [f"chunk-{i}" for i in range(chunks)]
+    texts = [f"Synthetic manifesto chunk {i}" for i in range(chunks)]
+    metas = [{"id": i + 1, "page": i // 4} for i in range(chunks)]
+    store = Chroma(persist_directory=directory, embedding_function=DeterministicFakeEmbedding(size=dim))
+    for start in range(0, chunks, 1000):
+        end = start + 1000
+        store._collection.add(ids=ids[start:end], embeddings=vectors[start:end], documents=texts[start:end], metadatas=metas[start:end])
+    write_exact_index(directory, ids, vectors, texts, metas)
+
+
+def _queries(directory: str, n: int, seed: int = 1) -> np.ndarray:
+    """Corpus rows plus noise: realistic 'near some chunks' queries, same for every backend."""
+    from retriever.exact_index import ExactIndex
+
+    index = ExactIndex(directory)
+    rng = np.random.default_rng(seed)
+    rows = np.asarray(index.vectors[rng.integers(0, len(index), n)])
+    q = rows + 0.5 * rng.standard_normal(rows.shape).astype(np.float32) / np.sqrt(index.dim)
+    return (q / np.linalg.norm(q, axis=1, keepdims=True)).astype(np.float32)
+
+
+def worker(backend: str, directory: str, queries_path: str) -> Dict[str, object]:
+    """One backend in this process: load, then time every query."""
+    os.environ["RETRIEVER_BACKEND"] = backend
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    from retriever.retriever import get_retriever
+
+    queries = np.load(queries_path)
+    rss_start = _rss_kb()
+    start = perf_counter()
+    retriever = get_retriever(embeddings=DeterministicFakeEmbedding(size=queries.shape[1]), persist_directory=directory)
+    retriever._query(queries[0].tolist(), retriever.fetch_k, ["embeddings"])  # first query loads HNSW / faults pages in
+    load_ms = (perf_counter() - start) * 1000.0
+    rss_loaded = _rss_kb()
+    search_ms, total_ms, picks = [], [], []
+    for q in queries:
+        vec = q.tolist()
+        t0 = perf_counter()
+        retriever._query(vec, retriever.fetch_k, ["metadatas", "documents", "distances", "embeddings"])
+        search_ms.append((perf_counter() - t0) * 1000.0)
+        t0 = perf_counter()
+        ids, _ = retriever._vector_search(vec)
+        total_ms.append((perf_counter() - t0) * 1000.0)
+        picks.append(ids)
+    return {
+        "backend": backend,
+        "load_ms": round(load_ms, 1),
+        "search_ms": {"p50": _pct(search_ms, 50), "p95": _pct(search_ms, 95), "mean": round(float(np.mean(search_ms)), 3)},
+        "search_mmr_ms": {"p50": _pct(total_ms, 50), "p95": _pct(total_ms, 95), "mean": round(float(np.mean(total_ms)), 3)},
+        "rss_kb": {"start": rss_start, "loaded": rss_loaded, "end": _rss_kb()},
+        "picks": picks,
+    }
+
+
+def _run_worker(backend: str, directory: str, queries_path: str) -> Dict[str, object]:
+    proc = subprocess.run(
+        [sys.executable, "-m", "retriever.bench", "_worker", backend, directory, queries_path],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{backend} worker failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def bench_backends(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.persist_dir
+        if directory is None:
+            directory = os.path.join(tmp, "store")
+            print(f"Building synthetic store: {args.chunks} chunks x {DIM} dims ...")
+            build_synthetic_store(directory, args.chunks)
+        queries_path = os.path.join(tmp, "queries.npy")
+        np.save(queries_path, _queries(directory, args.queries))
+        results = {b: _run_worker(b, directory, queries_path) for b in ("chroma", "exact")}
+
+    for name, r in results.items():
+        rss = r["rss_kb"]
+        print(
+            f"\n{name}: load {r['load_ms']:.0f} ms | search p50 {r['search_ms']['p50']:.3f} / p95 {r['search_ms']['p95']:.3f} ms"
+            f" | search+mmr p50 {r['search_mmr_ms']['p50']:.3f} / p95 {r['search_mmr_ms']['p95']:.3f} ms"
+        )
+        print(
+            f"  RSS start {rss['start'].get('VmRSS', 0) / 1024:.0f} MB -> loaded {rss['loaded'].get('VmRSS', 0) / 1024:.0f} MB"
+            f" -> end {rss['end'].get('VmRSS', 0) / 1024:.0f} MB (file-backed, shareable: {rss['end'].get('RssFile', 0) / 1024:.0f} MB)"
+        )
+    same = sum(a == b for a, b in zip(results["chroma"]["picks"], results["exact"]["picks"]))
+    print(f"\nSame chunks picked for {same}/{args.queries} queries (HNSW is approximate, the exact index is not)")
+    speedup = results["chroma"]["search_ms"]["p50"] / max(results["exact"]["search_ms"]["p50"], 1e-9)
+    print(f"Exact search p50 speedup over Chroma: {speedup:.1f}x")
+
+
+def _clustered(rng, n: int, dim: int = DIM) -> np.ndarray:
+    centers = rng.standard_normal((max(1, n // 10), dim)).astype(np.float32)
+    return (centers[rng.integers(0, len(centers), n)] + 0.7 * rng.standard_normal((n, dim))).astype(np.float32)
+
+
+def _best_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        fn()
+        times.append((perf_counter() - t0) * 1000.0)
+    return min(times)
+
+
+def bench_mmr(args) -> None:
+    from langchain_community.vectorstores.utils import maximal_marginal_relevance as langchain_mmr
+
+    from retriever.mmr import maximal_marginal_relevance, mmr_batch
+
+    rng = np.random.default_rng(0)
+    print(f"{'fetch_k':>8} {'langchain ms':>13} {'numpy ms':>9} {'batched ms/q':>13} {'speedup':>8} {'identical':>10}")
+    for fetch_k in args.fetch_k:
+        candidates = np.stack([_clustered(rng, fetch_k) for _ in range(args.batch)])
+        queries = candidates[:, 0, :] + rng.standard_normal((args.batch, DIM)).astype(np.float32)
+        expected = [langchain_mmr(q, list(c), lambda_mult=args.lambda_mult, k=args.k) for q, c in zip(queries, candidates)]
+        single = [maximal_marginal_relevance(q, c, args.lambda_mult, args.k) for q, c in zip(queries, candidates)]
+        batched = mmr_batch(queries, candidates, args.lambda_mult, args.k)
+        same = sum(e == s == b for e, s, b in zip(expected, single, batched))
+        # LangChain gets the Chroma-style list of rows, as the retriever used to pass it
+        rows = list(candidates[0])
+        lc_ms = _best_ms(lambda: langchain_mmr(queries[0], rows, lambda_mult=args.lambda_mult, k=args.k), args.repeat)
+        np_ms = _best_ms(lambda: maximal_marginal_relevance(queries[0], candidates[0], args.lambda_mult, args.k), args.repeat)
+        batch_ms = _best_ms(lambda: mmr_batch(queries, candidates, args.lambda_mult, args.k), args.repeat) / args.batch
+        print(f"{fetch_k:>8} {lc_ms:>13.3f} {np_ms:>9.3f} {batch_ms:>13.3f} {lc_ms / np_ms:>7.1f}x {same:>5}/{args.batch}")
+    if args.gold:
+        check_gold_mmr(args)
+
+
+def check_gold_mmr(args) -> None:
+    """Same picks as the old LangChain routine for every gold question on the real store."""
+    from langchain_community.vectorstores.utils import maximal_marginal_relevance as langchain_mmr
+
+    from bot.registry import get_resources
+    from retriever.mmr import maximal_marginal_relevance
+
+    with open(os.path.join("monitoring", "eval", "gold_qa.json")) as f:
+        questions = [item["question"] for item in json.load(f)["items"]]
+    retriever = get_resources().retriever
+    same = 0
+    for question in questions:
+        vec = retriever.embeddings.embed_query(question)
+        candidates = retriever._query(vec, retriever.fetch_k, ["embeddings"])["embeddings"][0]
+        query = np.array(vec, dtype=np.float32)
+        same += langchain_mmr(query, candidates, k=retriever.k, lambda_mult=retriever.lambda_mult) == \
+            maximal_marginal_relevance(query, candidates, retriever.lambda_mult, retriever.k)
+    print(f"\nGold set: identical MMR picks for {same}/{len(questions)} questions")
+
+
+def bench_graph(args) -> None:
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    from retriever.exact_index import ExactIndex, exact_index_path, write_exact_index
+    from retriever.mmr import maximal_marginal_relevance, mmr_select
+    from retriever.retriever import ManifestoRetriever
+    from retriever.sim_graph import SimilarityGraph, write_similarity_graph
+
+    os.environ["SIMILARITY_MATRIX_MAX_CHUNKS"] = str(max(args.chunks))  # so the matrix is measured at every size
+    print(f"{'chunks':>7} {'mode':>10} {'build ms':>9} {'disk MB':>8} {'mmr p50':>8} {'total p50':>10} {'total p95':>10} {'same picks':>11}")
+    for chunks in args.chunks:
+        with tempfile.TemporaryDirectory() as tmp:
+            vectors = _synthetic_vectors(chunks)
+            ids = [f"chunk-{i}" for i in range(chunks)]
+            write_exact_index(tmp, ids, vectors, ids, [{} for _ in ids])
+            directory = exact_index_path(tmp)
+            start = perf_counter()
+            write_similarity_graph(directory, vectors)
+            build_ms = (perf_counter() - start) * 1000.0
+            index = ExactIndex(tmp)
+            queries = _queries(tmp, args.queries)
+            embeddings = DeterministicFakeEmbedding(size=DIM)
+            runs = {"embeddings": (ManifestoRetriever(exact_index=index, embeddings=embeddings), 0.0, index.nbytes())}
+            for use_matrix in (True, False):
+                graph = SimilarityGraph(directory, index.ids, use_matrix=use_matrix)
+                size = graph.nbytes()
+                disk = size["norms"] + size.get("matrix", size["neighbors"])
+                runs[graph.mode] = (ManifestoRetriever(exact_index=index, embeddings=embeddings, similarity_graph=graph), build_ms, disk)
+            picks = {}
+            for mode, (retriever, build, disk) in runs.items():
+                graph = retriever.similarity_graph
+                times, mmr_times, picks[mode] = [], [], []
+                for q in queries:
+                    vec = q.tolist()
+                    t0 = perf_counter()
+                    found, _ = retriever._vector_search(vec)
+                    times.append((perf_counter() - t0) * 1000.0)
+                    picks[mode].append(found)
+                    # The MMR step alone, on the candidates the search just returned
+                    results = index.query(vec, retriever.fetch_k, ["distances", "embeddings"])
+                    t0 = perf_counter()
+                    if graph is None:
+                        maximal_marginal_relevance(q, results["embeddings"][0], retriever.lambda_mult, retriever.k)
+                    else:
+                        sims = graph.similarities(vec, results["ids"][0], results["distances"][0])
+                        mmr_select(sims[0], sims[1], retriever.lambda_mult, retriever.k)
+                    mmr_times.append((perf_counter() - t0) * 1000.0)
+                same = sum(a == b for a, b in zip(picks["embeddings"], picks[mode]))
+                print(f"{chunks:>7} {mode:>10} {build:>9.0f} {disk / 1e6:>8.2f} {_pct(mmr_times, 50):>8.3f} "
+                      f"{_pct(times, 50):>10.3f} {_pct(times, 95):>10.3f} {same:>5}/{len(queries)}")
+    print("\ndisk MB: the vectors for `embeddings`, the float16 matrix or the neighbour lists (+ norms) for the graph")
+
+
+def _gold_items() -> List[dict]:
+    with open(os.path.join("monitoring", "eval", "gold_qa.json"), encoding="utf-8") as f:
+        return json.load(f)["items"]
+
+
+def _retrieval_quality(item: dict, docs) -> Dict[str, float]:
+    """Share of expected keywords in the retrieved text, and whether a cited page was retrieved."""
+    text = " ".join(d.page_content for d in docs).lower()
+    keywords = item.get("expected_keywords", [])
+    pages = {c["id"] for c in item.get("citations", []) if c.get("type") == "page"}
+    return {
+        "keyword_recall": sum(k.lower() in text for k in keywords) / len(keywords) if keywords else 0.0,
+        "page_hit": float(any(d.metadata.get("page") in pages for d in docs)) if pages else 0.0,
+    }
+
+
+def bench_hybrid(args) -> None:
+    from bot.fakes import get_fake_embeddings, use_fakes
+    from retriever.retriever import get_embeddings, get_retriever
+
+    os.environ["RETRIEVAL_CACHE"] = "0"  # time real searches, not cache hits
+    embeddings = get_fake_embeddings() if use_fakes() else get_embeddings()
+    items = _gold_items()
+    retrievers = {}
+    for mode in ("mmr", "hybrid"):
+        os.environ["RETRIEVAL_MODE"] = mode
+        retrievers[mode] = get_retriever(embeddings=embeddings, persist_directory=args.persist_dir)
+    if retrievers["hybrid"].search_type != "hybrid":
+        raise SystemExit(f"No BM25 index in {args.persist_dir}; run `python -m retriever.bm25 {args.persist_dir}`")
+    for item in items:
+        embeddings.embed_query(item["question"])  # both modes then see a warm embedding cache
+
+    print(f"{'mode':>7} {'keyword recall':>15} {'page hit':>9} {'p50 ms':>7} {'p95 ms':>7}")
+    for mode, retriever in retrievers.items():
+        quality = [_retrieval_quality(item, retriever.invoke(item["question"])) for item in items]
+        times = []
+        for _ in range(args.repeat):
+            for item in items:
+                t0 = perf_counter()
+                retriever.invoke(item["question"])
+                times.append((perf_counter() - t0) * 1000.0)
+        print(f"{mode:>7} {np.mean([q['keyword_recall'] for q in quality]):>15.2f} "
+              f"{np.mean([q['page_hit'] for q in quality]):>9.2f} {_pct(times, 50):>7.3f} {_pct(times, 95):>7.3f}")
+
+    hybrid = retrievers["hybrid"]
+    lexical_ms, dense_ms = [], []
+    for _ in range(args.repeat):
+        for item in items:
+            t0 = perf_counter()
+            hybrid._lexical_search(item["question"])
+            lexical_ms.append((perf_counter() - t0) * 1000.0)
+            t0 = perf_counter()
+            hybrid._query(embeddings.embed_query(item["question"]), hybrid.fetch_k, ["metadatas", "documents"])
+            dense_ms.append((perf_counter() - t0) * 1000.0)
+    print(f"\nHybrid branches (p50): BM25 {_pct(lexical_ms, 50):.3f} ms, dense embed+search {_pct(dense_ms, 50):.3f} ms; "
+          f"they run in parallel, so the slower one sets the pace")
+    print(f"Gold set: {len(items)} questions; per-stage timings are in rag_stage_ms{{stage=bm25|search|fuse}}")
+
+
+_TOPICS = {
+    "health": "Health Insurance Act 2017 coverage primary care hospitals doctors medicines districts",
+    "anticorruption": "CIAA commission abuse authority corruption investigation officials accountability",
+    "economy": "Sixteenth Five-Year Plan growth jobs investment industry exports tourism",
+    "education": "schools teachers free meals universities scholarships curriculum literacy",
+}
+
+
+def build_text_store(directory: str, chunks: int, seed: int = 0) -> None:
+    """Exact index plus BM25 index over synthetic manifesto-like chunks (no Chroma needed)."""
+    from bot.fakes import get_fake_embeddings
+    from retriever.bm25 import write_bm25_index
+    from retriever.exact_index import write_exact_index
+
+    rng = np.random.default_rng(seed)
+    names = list(_TOPICS)
+    texts, metas = [], []
+    for i in range(chunks):
+        topic = names[i % len(names)]
+        words = rng.choice(_TOPICS[topic].split(), size=12)
+        texts.append(f"The party commits on {topic}: " + " ".join(words) + ".")
+        metas.append({"id": i + 1, "page": i // 4, "topic": topic})
+    ids = [f"chunk-{i}" for i in range(chunks)]
+    write_exact_index(directory, ids, get_fake_embeddings().embed_documents(texts), texts, metas)
+    write_bm25_index(directory, ids, texts, metas)
+
+
+def bench_degraded(args) -> None:
+    os.environ.update({
+        "CHATBOT_FAKE_LLM": "1",
+        "RETRIEVER_BACKEND": "exact",
+        "FAKE_LLM_TTFT_S": "0",
+        "FAKE_LLM_TOKEN_S": "0",
+        "FAKE_EMBED_SLOW_P": str(args.slow_p),
+        "FAKE_EMBED_SLOW_S": str(args.slow_s),
+        "FAKE_EMBED_FAIL_P": str(args.fail_p),
+        "EMBED_TIMEOUT_MS": str(args.timeout_ms),
+        "SEMANTIC_CACHE": "0",
+        "RETRIEVAL_CACHE": "0",
+        "SESSION_LOG": "0",
+        "WARMUP": "0",
+    })
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # the registry opens ./chroma_store
+        build_text_store("chroma_store", args.chunks)
+        import asyncio
+
+        from bot.sessions import get_session_manager
+        from retriever.retriever import retrieval_path_stats
+
+        manager = get_session_manager()
+        questions = [f"What does the manifesto promise on {topic}?" for topic in _TOPICS] + [
+            "What about the CIAA?", "Health Insurance Act 2017", "Sixteenth Five-Year Plan targets",
+        ]
+        by_path: Dict[str, List[float]] = {}
+        for n in range(args.requests):
+            chain = manager.get(f"bench-{n}").chain  # fresh session: no history, no rewrite call
+            question = questions[n % len(questions)]
+            t0 = perf_counter()
+            if args.use_async:
+                result = asyncio.run(chain.ainvoke({"question": question}))
+            else:
+                result = chain.invoke({"question": question})
+            by_path.setdefault(result.get("retrieval_path") or "none", []).append((perf_counter() - t0) * 1000.0)
+            manager.drop(f"bench-{n}")
+
+    print(f"{'path':>8} {'requests':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for path, times in sorted(by_path.items()):
+        print(f"{path:>8} {len(times):>9} {_pct(times, 50):>8.1f} {_pct(times, 95):>8.1f}")
+    print(f"\nretrieval_path_total / retrieval_ms / retrieval_degraded_total: {json.dumps(retrieval_path_stats())}")
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = p.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("backends", help="Chroma vs memory-mapped exact index")
+    b.add_argument("--chunks", type=int, default=400)
+    b.add_argument("--queries", type=int, default=300)
+    b.add_argument("--persist-dir", help="existing store with an exact/ export (default: synthetic)")
+    m = sub.add_parser("mmr", help="LangChain MMR vs the vectorized retriever/mmr.py")
+    m.add_argument("--fetch-k", type=int, nargs="+", default=[20, 50, 100, 200, 500])
+    m.add_argument("--k", type=int, default=4)
+    m.add_argument("--lambda-mult", type=float, default=0.5)
+    m.add_argument("--batch", type=int, default=32, help="queries per fetch_k (and batch size for mmr_batch)")
+    m.add_argument("--repeat", type=int, default=5)
+    m.add_argument("--gold", action="store_true", help="also compare picks on gold_qa.json (needs the store + embeddings)")
+    g = sub.add_parser("graph", help="MMR on embeddings vs the precomputed similarity graph")
+    g.add_argument("--chunks", type=int, nargs="+", default=[400, 2000, 8000])
+    g.add_argument("--queries", type=int, default=200)
+    h = sub.add_parser("hybrid", help="pure MMR vs BM25 + dense (RRF) on gold_qa.json")
+    h.add_argument("--persist-dir", default="chroma_store")
+    h.add_argument("--repeat", type=int, default=20)
+    d = sub.add_parser("degraded", help="chain with slow/failing fake embeddings: which retrieval path served each answer")
+    d.add_argument("--requests", type=int, default=100)
+    d.add_argument("--chunks", type=int, default=200)
+    d.add_argument("--slow-p", type=float, default=0.3, help="share of embedding calls that are slow")
+    d.add_argument("--slow-s", type=float, default=2.0, help="latency of a slow embedding call")
+    d.add_argument("--fail-p", type=float, default=0.1, help="share of embedding calls that fail")
+    d.add_argument("--timeout-ms", type=float, default=200, help="EMBED_TIMEOUT_MS")
+    d.add_argument("--async", dest="use_async", action="store_true", help="use ainvoke (the API's path)")
+    w = sub.add_parser("_worker")
+    w.add_argument("backend")
+    w.add_argument("directory")
+    w.add_argument("queries_path")
+    args = p.parse_args()
+    if args.cmd == "_worker":
+        print(json.dumps(worker(args.backend, args.directory, args.queries_path)))
+    elif args.cmd == "backends":
+        bench_backends(args)
+    elif args.cmd == "mmr":
+        bench_mmr(args)
+    elif args.cmd == "graph":
+        bench_graph(args)
+    elif args.cmd == "hybrid":
+        bench_hybrid(args)
+    elif args.cmd == "degraded":
+        bench_degraded(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""BM25 inverted index over the chunks, persisted next to the Chroma store.
+
+Dense embeddings blur exact terms such as "CIAA", "Health Insurance Act 2017"
+or "Sixteenth Five-Year Plan". A lexical index matches them literally.
+`ingest/ingest.py` writes it to `<persist_dir>/bm25/`:
+
+- `terms.json`: the vocabulary, sorted; a term's position is its term id,
+- `offsets.i64`: where each term's postings start (one extra entry at the end),
+- `postings_docs.i32` / `postings_tf.u16`: chunk rows and term frequencies for
+  every term, one run per term in vocabulary order,
+- `doc_lengths.i32`: tokens per chunk,
+- `chunks.jsonl`: one `{"id", "text", "metadata"}` line per row,
+- `meta.json`: chunk count, vocabulary size and average chunk length.
+
+Tokens are lowercased runs of letters and digits, so "2017" and "ciaa" match
+exactly. A small English stopword list is dropped. A query reads each term's
+postings with a slice and scatters its BM25 weight into one score vector.
+
+    python -m retriever.bm25 chroma_store   # build it for an existing store
+"""
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+BM25_DIR = "bm25"
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "what which who how does do did about into their they them our we".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def bm25_index_path(persist_directory: str) -> str:
+    return os.path.join(persist_directory, BM25_DIR)
+
+
+def write_bm25_index(
+    persist_directory: str,
+    ids: Sequence[str],
+    texts: Sequence[str],
+    metadatas: Sequence[Optional[Dict[str, Any]]],
+) -> str:
+    """Tokenize every chunk and write the postings; the directory is swapped in only when complete."""
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    lengths = np.zeros(len(ids), dtype=np.int32)
+    for row, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        lengths[row] = sum(counts.values())
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((row, min(tf, 65535)))
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(postings[t]) for t in terms])
+    docs = np.fromiter((row for t in terms for row, _ in postings[t]), dtype=np.int32, count=int(offsets[-1]))
+    tfs = np.fromiter((tf for t in terms for _, tf in postings[t]), dtype=np.uint16, count=int(offsets[-1]))
+
+    final = bm25_index_path(persist_directory)
+    tmp = f"{final}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    with open(os.path.join(tmp, "terms.json"), "w", encoding="utf-8") as f:
+        json.dump(terms, f, ensure_ascii=False)
+    offsets.tofile(os.path.join(tmp, "offsets.i64"))
+    docs.tofile(os.path.join(tmp, "postings_docs.i32"))
+    tfs.tofile(os.path.join(tmp, "postings_tf.u16"))
+    lengths.tofile(os.path.join(tmp, "doc_lengths.i32"))
+    with open(os.path.join(tmp, "chunks.jsonl"), "w", encoding="utf-8") as f:
+        for cid, text, meta in zip(ids, texts, metadatas):
+            f.write(json.dumps({"id": cid, "text": text or "", "metadata": meta or {}}, ensure_ascii=False) + "\n")
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        avgdl = float(lengths.mean()) if len(lengths) else 0.0
+        json.dump({"count": len(ids), "terms": len(terms), "postings": int(offsets[-1]), "avgdl": avgdl}, f)
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+    return final
+
+
+def export_bm25_from_chroma(vectordb, persist_directory: str) -> str:
+    data = vectordb._collection.get(include=["documents", "metadatas"])
+    return write_bm25_index(persist_directory, data["ids"], data["documents"], data["metadatas"])
+
+
+class BM25Index:
+    """Read-only Okapi BM25 over the persisted postings; safe to share between threads."""
+
+    def __init__(self, persist_directory: str, k1: Optional[float] = None, b: Optional[float] = None):
+        self.directory = bm25_index_path(persist_directory)
+        self.k1 = k1 if k1 is not None else float(os.getenv("BM25_K1", "1.5"))
+        self.b = b if b is not None else float(os.getenv("BM25_B", "0.75"))
+        with open(os.path.join(self.directory, "meta.json")) as f:
+            meta = json.load(f)
+        self.count = meta["count"]
+        with open(os.path.join(self.directory, "terms.json"), encoding="utf-8") as f:
+            self._term_ids = {term: i for i, term in enumerate(json.load(f))}
+        self.offsets = np.fromfile(os.path.join(self.directory, "offsets.i64"), dtype=np.int64)
+        self.postings_docs = np.fromfile(os.path.join(self.directory, "postings_docs.i32"), dtype=np.int32)
+        self.postings_tf = np.fromfile(os.path.join(self.directory, "postings_tf.u16"), dtype=np.uint16).astype(np.float32)
+        lengths = np.fromfile(os.path.join(self.directory, "doc_lengths.i32"), dtype=np.int32)
+        if len(lengths) != self.count or len(self.offsets) != len(self._term_ids) + 1:
+            raise ValueError(f"{self.directory}: postings do not match meta.json")
+        # The length-normalisation part of the BM25 denominator, per chunk
+        avgdl = meta["avgdl"] or 1.0
+        self._norm = (self.k1 * (1.0 - self.b + self.b * lengths / avgdl)).astype(np.float32)
+        df = np.diff(self.offsets).astype(np.float64)
+        self.idf = np.log1p((self.count - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        with open(os.path.join(self.directory, "chunks.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                self.ids.append(row["id"])
+                self.texts.append(row["text"])
+                self.metadatas.append(row["metadata"])
+        if len(self.ids) != self.count:
+            raise ValueError(f"{self.directory}: {len(self.ids)} chunks for {self.count} rows")
+        self._rows = {cid: i for i, cid in enumerate(self.ids)}
+        self._docs: Optional[List[Document]] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def nbytes(self) -> int:
+        return int(self.offsets.nbytes + self.postings_docs.nbytes + self.postings_tf.nbytes + self._norm.nbytes)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for `query` (0 for chunks sharing no term)."""
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self._term_ids.get(term)
+            if t is None:
+                continue
+            start, end = self.offsets[t], self.offsets[t + 1]
+            docs, tf = self.postings_docs[start:end], self.postings_tf[start:end]
+            scores[docs] += self.idf[t] * tf * (self.k1 + 1.0) / (tf + self._norm[docs])
+        return scores
+
+    def top(self, query: str, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and scores of the `n` best matching chunks, best first; chunks with no match are left out."""
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > n:
+            matched = matched[np.argpartition(-scores[matched], n - 1)[:n]]
+        rows = matched[np.lexsort((matched, -scores[matched]))]
+        return rows, scores[rows]
+
+    def search(self, query: str, n: int) -> List[str]:
+        rows, _ = self.top(query, n)
+        return [self.ids[i] for i in rows]
+
+    def documents(self) -> List[Document]:
+        with self._lock:
+            if self._docs is None:
+                self._docs = [
+                    Document(id=cid, page_content=text, metadata=meta)
+                    for cid, text, meta in zip(self.ids, self.texts, self.metadatas)
+                ]
+        return self._docs
+
+    def lookup(self, ids: List[str]) -> Optional[List[Document]]:
+        """ChunkTable interface, like ExactIndex."""
+        docs = self.documents()
+        try:
+            return [docs[self._rows[cid]] for cid in ids]
+        except KeyError:
+            return None
+
+
+def load_bm25_index(persist_directory: str) -> Optional[BM25Index]:
+    try:
+        return BM25Index(persist_directory)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ BM25 index not available in {persist_directory} ({e}); run ingest or "
+              f"`python -m retriever.bm25 {persist_directory}`")
+        return None
+
+
+if __name__ == "__main__":
+    from langchain_community.vectorstores import Chroma
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else "chroma_store"
+    path = export_bm25_from_chroma(Chroma(persist_directory=directory), directory)
+    print(f"✅ BM25 index written to {path} ({len(BM25Index(directory))} chunks)")
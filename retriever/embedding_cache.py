@@ -0,0 +1,195 @@
+"""Caching wrapper around the embeddings client.
+
+Every retrieval used to send the query text to Azure before Chroma was even
+searched. `CachedEmbeddings` keeps an in-memory LRU of recent vectors in front
+of a SQLite table keyed by (deployment, hash of the normalized text). Vectors
+are stored as raw float32 (or float16, see `EMBEDDING_CACHE_DTYPE`) buffers,
+so a 3072-d vector costs 12 KB (6 KB) instead of a JSON list.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from monitoring import metrics
+from monitoring.usage import record_embedding_call
+
+EMBED_CACHE = metrics.counter("embedding_cache_total", "Embedding cache lookups by result")
+ROUND_TRIPS_AVOIDED = metrics.counter("embedding_round_trips_avoided_total", "Embedding API calls skipped thanks to the cache")
+
+DEFAULT_PATH = os.path.join("cache", "embeddings.sqlite3")
+
+
+def _text_key(text: str) -> str:
+    normalized = " ".join(unicodedata.normalize("NFC", text or "").split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(
+        self,
+        inner: Embeddings,
+        namespace: str,
+        path: str = DEFAULT_PATH,
+        max_memory_items: Optional[int] = None,
+        dtype: Optional[str] = None,
+    ):
+        self.inner = inner
+        self.namespace = namespace
+        self.path = path
+        self.max_memory_items = max_memory_items or int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "1024"))
+        self.dtype = np.dtype(dtype or os.getenv("EMBEDDING_CACHE_DTYPE", "float32"))
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.stats_counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "round_trips_avoided": 0}
+
+    # -- storage ------------------------------------------------------------
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    " namespace TEXT NOT NULL, key TEXT NOT NULL, dtype TEXT NOT NULL,"
+                    " vec BLOB NOT NULL, PRIMARY KEY (namespace, key))"
+                )
+                self._conn = conn
+            except sqlite3.Error as e:
+                print(f"⚠️ Embedding cache disabled on disk: {e}")
+                self.path = None
+        return self._conn
+
+    def _get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for key in keys:
+                vec = self._memory.get(key)
+                if vec is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vec
+                    self._count("memory_hits")
+            missing = [k for k in keys if k not in found]
+            conn = self._db() if missing and self.path else None
+            if conn is not None:
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    rows = conn.execute(
+                        f"SELECT key, dtype, vec FROM embeddings WHERE namespace = ? AND key IN ({','.join('?' * len(chunk))})",
+                        [self.namespace, *chunk],
+                    ).fetchall()
+                    for key, dtype, blob in rows:
+                        vec = np.frombuffer(blob, dtype=np.dtype(dtype)).astype(np.float32).tolist()
+                        found[key] = vec
+                        self._remember(key, vec)
+                        self._count("disk_hits")
+        return found
+
+    def _put_many(self, items: Dict[str, List[float]]) -> None:
+        with self._lock:
+            for key, vec in items.items():
+                self._remember(key, vec)
+            conn = self._db() if self.path else None
+            if conn is not None:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (namespace, key, dtype, vec) VALUES (?, ?, ?, ?)",
+                        [
+                            (self.namespace, key, self.dtype.name, np.asarray(vec, dtype=self.dtype).tobytes())
+                            for key, vec in items.items()
+                        ],
+                    )
+
+    def _put_query(self, key: str, vec: List[float]) -> None:
+        # A speculative retrieval that ends up discarded must not fill the cache
+        from retriever.retriever import after_retrieval
+        after_retrieval(lambda: self._put_many({key: vec}))
+
+    def _remember(self, key: str, vec: List[float]) -> None:
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _count(self, what: str, n: int = 1) -> None:
+        self.stats_counts[what] += n
+        EMBED_CACHE.inc(n, labels={"result": what})
+        if what == "round_trips_avoided":
+            ROUND_TRIPS_AVOIDED.inc(n)
+
+    # -- Embeddings interface -----------------------------------------------
+
+    def _inner(self, timeout_s: Optional[float]) -> Embeddings:
+        if timeout_s is None:
+            return self.inner
+        from bot.clients import with_request_timeout
+        return with_request_timeout(self.inner, timeout_s)
+
+    def embed_query(self, text: str, timeout_s: Optional[float] = None) -> List[float]:
+        """`timeout_s` caps the API request on a miss (see `bot.clients.with_request_timeout`)."""
+        key = _text_key(text)
+        found = self._get_many([key])
+        if key in found:
+            self._count("round_trips_avoided")
+            return found[key]
+        self._count("misses")
+        record_embedding_call(self.namespace, [text])
+        vec = self._inner(timeout_s).embed_query(text)
+        self._put_query(key, vec)
+        return vec
+
+    async def aembed_query(self, text: str, timeout_s: Optional[float] = None) -> List[float]:
+        key = _text_key(text)
+        found = self._get_many([key])
+        if key in found:
+            self._count("round_trips_avoided")
+            return found[key]
+        self._count("misses")
+        record_embedding_call(self.namespace, [text])
+        vec = await self._inner(timeout_s).aembed_query(text)
+        self._put_query(key, vec)
+        return vec
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, todo = self._plan(texts)
+        if todo:
+            record_embedding_call(self.namespace, [texts[i] for i in todo])
+            fresh = self.inner.embed_documents([texts[i] for i in todo])
+            self._put_many({keys[i]: vec for i, vec in zip(todo, fresh)})
+            found.update({keys[i]: vec for i, vec in zip(todo, fresh)})
+        return [found[k] for k in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, todo = self._plan(texts)
+        if todo:
+            record_embedding_call(self.namespace, [texts[i] for i in todo])
+            fresh = await self.inner.aembed_documents([texts[i] for i in todo])
+            self._put_many({keys[i]: vec for i, vec in zip(todo, fresh)})
+            found.update({keys[i]: vec for i, vec in zip(todo, fresh)})
+        return [found[k] for k in keys]
+
+    def _plan(self, texts: List[str]):
+        keys = [_text_key(t) for t in texts]
+        found = self._get_many(list(dict.fromkeys(keys)))
+        todo, seen = [], set()
+        for i, key in enumerate(keys):
+            if key not in found and key not in seen:
+                seen.add(key)
+                todo.append(i)
+        self._count("misses", len(todo))
+        if texts and not todo:
+            self._count("round_trips_avoided")
+        return keys, found, todo
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.stats_counts, memory_items=len(self._memory))
@@ -0,0 +1,166 @@
+"""Exact in-process vector index over a memory-mapped float32 matrix.
+
+The corpus is a few hundred 3072-d vectors (about 1.2 MB in float32), so
+brute force beats Chroma's client + SQLite + HNSW path. `ingest/ingest.py`
+exports the collection to `<persist_dir>/exact/`:
+
+- `vectors.f32`: the embeddings as one contiguous row-major float32 matrix,
+- `chunks.jsonl`: one `{"id", "text", "metadata"}` line per row, same order,
+- `meta.json`: row count and dimension,
+- the chunk-to-chunk similarity graph for MMR (retriever/sim_graph.py).
+
+`ExactIndex` maps the matrix read-only (`np.memmap`, mode "r"), so worker
+processes on the same host share the page-cache copy instead of each loading
+their own. A query is one BLAS matrix-vector product plus a partial sort.
+Distances are squared L2, like Chroma's default space, so candidates come
+back in the same order. Select it with `RETRIEVER_BACKEND=exact`.
+
+    python -m retriever.exact_index chroma_store   # export an existing store
+"""
+import json
+import os
+import shutil
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from retriever.sim_graph import write_similarity_graph
+
+EXACT_DIR = "exact"
+
+
+def exact_index_path(persist_directory: str) -> str:
+    return os.path.join(persist_directory, EXACT_DIR)
+
+
+def write_exact_index(
+    persist_directory: str,
+    ids: Sequence[str],
+    embeddings: Sequence[Sequence[float]],
+    texts: Sequence[str],
+    metadatas: Sequence[Optional[Dict[str, Any]]],
+) -> str:
+    """Write the matrix and chunk table; the directory is swapped in only when complete."""
+    matrix = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+    if matrix.ndim != 2 or matrix.shape[0] != len(ids):
+        raise ValueError(f"expected {len(ids)} embedding rows, got shape {matrix.shape}")
+    final = exact_index_path(persist_directory)
+    tmp = f"{final}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    matrix.tofile(os.path.join(tmp, "vectors.f32"))
+    with open(os.path.join(tmp, "chunks.jsonl"), "w", encoding="utf-8") as f:
+        for cid, text, meta in zip(ids, texts, metadatas):
+            f.write(json.dumps({"id": cid, "text": text or "", "metadata": meta or {}}, ensure_ascii=False) + "\n")
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"count": int(matrix.shape[0]), "dim": int(matrix.shape[1]), "dtype": "float32"}, f)
+    write_similarity_graph(tmp, matrix)
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+    return final
+
+
+def export_from_chroma(vectordb, persist_directory: str) -> str:
+    """Export a Chroma collection (the one ingest just wrote) to the exact-index files."""
+    data = vectordb._collection.get(include=["embeddings", "documents", "metadatas"])
+    return write_exact_index(persist_directory, data["ids"], data["embeddings"], data["documents"], data["metadatas"])
+
+
+class ExactIndex:
+    """Read-only brute-force index; safe to share between threads."""
+
+    def __init__(self, persist_directory: str):
+        self.directory = exact_index_path(persist_directory)
+        with open(os.path.join(self.directory, "meta.json")) as f:
+            meta = json.load(f)
+        self.count, self.dim = meta["count"], meta["dim"]
+        self.vectors = np.memmap(
+            os.path.join(self.directory, "vectors.f32"), dtype=np.float32, mode="r", shape=(self.count, self.dim)
+        )
+        # ||x||^2 per row, so a query needs only the x.q product
+        self.sq_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        with open(os.path.join(self.directory, "chunks.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                self.ids.append(row["id"])
+                self.texts.append(row["text"])
+                self.metadatas.append(row["metadata"])
+        if len(self.ids) != self.count:
+            raise ValueError(f"{self.directory}: {len(self.ids)} chunks for {self.count} vectors")
+        self._rows = {cid: i for i, cid in enumerate(self.ids)}
+        self._docs: Optional[List[Document]] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def nbytes(self) -> int:
+        return int(self.vectors.nbytes)
+
+    def scores(self, vec: Sequence[float]) -> np.ndarray:
+        """Squared L2 distance from `vec` to every row (smaller is closer)."""
+        q = np.asarray(vec, dtype=np.float32)
+        return self.sq_norms - 2.0 * (self.vectors @ q) + float(q @ q)
+
+    def top(self, vec: Sequence[float], n: int) -> np.ndarray:
+        """Row numbers of the `n` nearest rows, nearest first (ties by row order)."""
+        dist = self.scores(vec)
+        n = min(n, self.count)
+        if n <= 0:
+            return np.empty(0, dtype=np.int64)
+        rows = np.argpartition(dist, n - 1)[:n] if n < self.count else np.arange(self.count)
+        return rows[np.lexsort((rows, dist[rows]))]
+
+    def query(self, vec: Sequence[float], n_results: int, include: Sequence[str] = ()) -> Dict[str, List[list]]:
+        """Same shape as `chromadb.Collection.query` for a single query vector."""
+        rows = self.top(vec, n_results)
+        out: Dict[str, List[list]] = {"ids": [[self.ids[i] for i in rows]]}
+        if "documents" in include:
+            out["documents"] = [[self.texts[i] for i in rows]]
+        if "metadatas" in include:
+            out["metadatas"] = [[self.metadatas[i] for i in rows]]
+        if "distances" in include:
+            out["distances"] = [self.scores(vec)[rows].tolist()]
+        if "embeddings" in include:
+            out["embeddings"] = [np.asarray(self.vectors[rows])]
+        return out
+
+    def documents(self) -> List[Document]:
+        with self._lock:
+            if self._docs is None:
+                self._docs = [
+                    Document(id=cid, page_content=text, metadata=meta)
+                    for cid, text, meta in zip(self.ids, self.texts, self.metadatas)
+                ]
+        return self._docs
+
+    def lookup(self, ids: List[str]) -> Optional[List[Document]]:
+        """ChunkTable interface, so the result cache can rehydrate hits from here."""
+        docs = self.documents()
+        try:
+            return [docs[self._rows[cid]] for cid in ids]
+        except KeyError:
+            return None
+
+
+def load_exact_index(persist_directory: str) -> Optional[ExactIndex]:
+    try:
+        return ExactIndex(persist_directory)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Exact index not available in {persist_directory} ({e}); run ingest or "
+              f"`python -m retriever.exact_index {persist_directory}`")
+        return None
+
+
+if __name__ == "__main__":
+    from langchain_community.vectorstores import Chroma
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else "chroma_store"
+    path = export_from_chroma(Chroma(persist_directory=directory), directory)
+    print(f"✅ Exact index written to {path} ({len(ExactIndex(directory))} chunks)")
@@ -0,0 +1,99 @@
+"""Vectorized maximal marginal relevance (MMR) re-ranking.
+
+Gives the same picks as LangChain's `maximal_marginal_relevance` (which the
+retriever used before), but does less work per query. LangChain recomputes
+cosine similarities to the whole selected set and scans candidates in a
+Python loop at every step. Here:
+
+- the candidate x candidate cosine block comes from one matrix product,
+- the "most similar already-selected chunk" score is a running maximum,
+  updated with one column per pick,
+- each step is an `argmax` over a masked score vector.
+
+The arithmetic follows LangChain's NumPy path: float32 inputs, NaN/inf
+similarities set to 0, and ties going to the lowest candidate index, like
+its strict `>` scan. `mmr_batch` runs the same selection for many queries at
+once over a (batch, fetch_k, dim) stack, and `mmr_select` runs it on
+similarities computed elsewhere.
+"""
+from typing import List, Sequence
+
+import numpy as np
+
+
+def _cosine(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Row-wise cosine similarity, computed like langchain_community.utils.math.cosine_similarity."""
+    x_norm = np.linalg.norm(x, axis=-1)
+    y_norm = np.linalg.norm(y, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sim = np.matmul(x, np.swapaxes(y, -1, -2)) / (x_norm[..., :, None] * y_norm[..., None, :])
+    sim[np.isnan(sim) | np.isinf(sim)] = 0.0
+    return sim
+
+
+def maximal_marginal_relevance(
+    query_embedding: Sequence[float],
+    embedding_list: Sequence[Sequence[float]],
+    lambda_mult: float = 0.5,
+    k: int = 4,
+) -> List[int]:
+    """Indices into `embedding_list` in pick order (drop-in for LangChain's routine)."""
+    candidates = np.asarray(embedding_list, dtype=np.float32)
+    if len(candidates) == 0 or k <= 0:
+        return []
+    query = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+    return mmr_select(_cosine(query, candidates)[0], _cosine(candidates, candidates), lambda_mult, k)
+
+
+def mmr_select(to_query: np.ndarray, pairwise: np.ndarray, lambda_mult: float = 0.5, k: int = 4) -> List[int]:
+    """Greedy MMR over similarities that are already known (e.g. from retriever/sim_graph.py)."""
+    n = min(k, len(to_query))
+    if n <= 0:
+        return []
+    picks = [int(np.argmax(to_query))]
+    redundancy = np.array(pairwise[:, picks[0]], dtype=np.float32)
+    relevance = lambda_mult * to_query
+    chosen = np.zeros(len(to_query), dtype=bool)
+    chosen[picks[0]] = True
+    while len(picks) < n:
+        scores = relevance - (1 - lambda_mult) * redundancy
+        scores[chosen] = -np.inf
+        best = int(np.argmax(scores))
+        picks.append(best)
+        chosen[best] = True
+        np.maximum(redundancy, pairwise[:, best], out=redundancy)
+    return picks
+
+
+def mmr_batch(
+    query_embeddings: Sequence[Sequence[float]],
+    embedding_lists: Sequence[Sequence[Sequence[float]]],
+    lambda_mult: float = 0.5,
+    k: int = 4,
+) -> List[List[int]]:
+    """`maximal_marginal_relevance` for many queries; every query needs the same number of candidates."""
+    candidates = np.asarray(embedding_lists, dtype=np.float32)  # (batch, n, dim)
+    if candidates.ndim != 3:
+        return [maximal_marginal_relevance(q, e, lambda_mult, k) for q, e in zip(query_embeddings, embedding_lists)]
+    batch, count = candidates.shape[0], candidates.shape[1]
+    n = min(k, count)
+    if n <= 0 or batch == 0:
+        return [[] for _ in range(batch)]
+    queries = np.asarray(query_embeddings, dtype=np.float32)[:, None, :]  # (batch, 1, dim)
+    to_query = _cosine(queries, candidates)[:, 0, :]  # (batch, n)
+    pairwise = _cosine(candidates, candidates)  # (batch, n, n)
+    rows = np.arange(batch)
+    first = np.argmax(to_query, axis=1)
+    picks = [first]
+    redundancy = pairwise[rows, :, first].copy()
+    relevance = lambda_mult * to_query
+    chosen = np.zeros((batch, count), dtype=bool)
+    chosen[rows, first] = True
+    for _ in range(1, n):
+        scores = relevance - (1 - lambda_mult) * redundancy
+        scores[chosen] = -np.inf
+        best = np.argmax(scores, axis=1)
+        picks.append(best)
+        chosen[rows, best] = True
+        np.maximum(redundancy, pairwise[rows, :, best], out=redundancy)
+    return np.stack(picks, axis=1).tolist()
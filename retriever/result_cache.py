@@ -0,0 +1,88 @@
+"""Retrieval-result cache and in-memory chunk table.
+
+The MMR retriever re-ran the `fetch_k` candidate search and the re-ranking for
+every call, even for a question retrieved seconds earlier. `ResultCache` maps
+(query-vector hash, search_type, k, fetch_k, lambda_mult, index version) to the
+final chunk ids; on a hit the documents are rehydrated from `ChunkTable`, which
+holds every chunk of the (small, static) corpus in memory.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from monitoring import metrics
+
+RESULT_CACHE = metrics.counter("retrieval_cache_total", "Retrieval result cache lookups by result (hit/miss)")
+
+
+def vector_key(vec: Sequence[float]) -> str:
+    return hashlib.sha1(np.asarray(vec, dtype=np.float32).tobytes()).hexdigest()
+
+
+class ChunkTable:
+    """All chunks of one Chroma collection, keyed by Chroma id. Loaded lazily, once."""
+
+    def __init__(self, vectorstore):
+        self.vectorstore = vectorstore
+        self._docs: Optional[Dict[str, Document]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Document]:
+        with self._lock:
+            if self._docs is None:
+                data = self.vectorstore.get(include=["documents", "metadatas"])
+                self._docs = {
+                    cid: Document(id=cid, page_content=text or "", metadata=meta or {})
+                    for cid, text, meta in zip(data["ids"], data["documents"], data["metadatas"])
+                }
+        return self._docs
+
+    def lookup(self, ids: List[str]) -> Optional[List[Document]]:
+        docs = self._load()
+        try:
+            return [docs[cid] for cid in ids]
+        except KeyError:
+            return None  # table out of date; caller falls back to a real search
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+
+class ResultCache:
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "4096"))
+        self._entries: "OrderedDict[Tuple, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[List[str]]:
+        with self._lock:
+            ids = self._entries.get(key)
+            if ids is None:
+                self.misses += 1
+                RESULT_CACHE.inc(labels={"result": "miss"})
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            RESULT_CACHE.inc(labels={"result": "hit"})
+            return ids
+
+    def put(self, key: Tuple, ids: List[str]) -> None:
+        with self._lock:
+            self._entries[key] = list(ids)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def result_cache_enabled() -> bool:
+    return os.getenv("RETRIEVAL_CACHE", "1").lower() not in ("0", "false", "no")
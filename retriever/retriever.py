@@ -1,40 +1,486 @@
 from langchain_community.vectorstores import Chroma
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables.config import run_in_executor
 from langchain_openai import AzureOpenAIEmbeddings
 
+from bot.clients import get_http_clients, with_request_timeout
+from bot.deadline import DeadlineExceeded, remaining_s
+from monitoring import metrics
+from monitoring.tracing import set_attributes, stage
+from retriever.embedding_cache import CachedEmbeddings
+from retriever.mmr import maximal_marginal_relevance, mmr_select
+from retriever.result_cache import ChunkTable, ResultCache, result_cache_enabled, vector_key
+from retriever.sim_graph import load_similarity_graph, similarity_graph_mode
 
+import asyncio
+import contextvars
+import hashlib
 import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
-def get_retriever():
+import httpx
+import numpy as np
+from openai import APITimeoutError
+
+CHROMA_DIR = "chroma_store"
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+RETRIEVALS = metrics.counter("retrieval_path_total", "Retrievals by path (dense, hybrid, lexical)")
+RETRIEVAL_MS = metrics.histogram("retrieval_ms", "Retrieval latency (embed + search) by path")
+DEGRADED = metrics.counter("retrieval_degraded_total", "Lexical-only retrievals by reason (timeout, error)")
+
+# Per-request holder, set by the chain; a dict so worker threads with a copied context write to the same one
+_RETRIEVAL_INFO: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("retrieval_info", default=None)
+
+
+def embedding_cache_enabled():
+    return os.getenv("EMBEDDING_CACHE", "1").lower() not in ("0", "false", "no")
+
+
+def get_embeddings(deployment="text-embedding-3-large", azure_endpoint=None, priority="interactive"):
+    http_client, http_async_client = get_http_clients(priority)
     embeddings = AzureOpenAIEmbeddings(
-        deployment="text-embedding-3-large",
-        azure_endpoint=os.getenv("AZURE_ENDPOINT"),
+        deployment=deployment,
+        azure_endpoint=azure_endpoint or os.getenv("AZURE_ENDPOINT"),
+        http_client=http_client,
+        http_async_client=http_async_client,
     )
+    if embedding_cache_enabled():
+        # Repeated queries (and re-ingests of unchanged chunks) skip the Azure round-trip
+        return CachedEmbeddings(embeddings, namespace=deployment)
+    return embeddings
+
+
+def retriever_backend():
+    """`chroma` (default) or `exact` (memory-mapped brute force, retriever/exact_index.py)."""
+    return os.getenv("RETRIEVER_BACKEND", "chroma").lower()
+
+
+def embed_timeout_s() -> Optional[float]:
+    """Budget for one embedding call: `EMBED_TIMEOUT_MS` (default 2000, 0 = none), capped by the request deadline."""
+    ms = float(os.getenv("EMBED_TIMEOUT_MS", "2000"))
+    budgets = [b for b in (ms / 1000.0 if ms > 0 else None, remaining_s()) if b is not None]
+    return max(0.0, min(budgets)) if budgets else None
+
+
+def embed_query_within(embeddings, text: str, timeout_s: Optional[float]):
+    """`embed_query` whose HTTP request is aborted after `timeout_s`, freeing its connection and admission slot."""
+    if timeout_s is None:
+        return embeddings.embed_query(text)
+    if isinstance(embeddings, CachedEmbeddings):
+        return embeddings.embed_query(text, timeout_s=timeout_s)
+    return with_request_timeout(embeddings, timeout_s).embed_query(text)
+
+
+async def aembed_query_within(embeddings, text: str, timeout_s: Optional[float]):
+    if timeout_s is None:
+        return await embeddings.aembed_query(text)
+    if isinstance(embeddings, CachedEmbeddings):
+        return await embeddings.aembed_query(text, timeout_s=timeout_s)
+    return await with_request_timeout(embeddings, timeout_s).aembed_query(text)
+
+
+def embed_failure_reason(error: BaseException) -> str:
+    """`timeout` for a request that ran out of budget (the SDK wraps httpx's timeout), else `error`."""
+    return "timeout" if isinstance(error, (TimeoutError, APITimeoutError, httpx.TimeoutException)) else "error"
+
+
+@contextmanager
+def record_retrieval(speculative: bool = False) -> Iterator[Dict[str, Any]]:
+    """Collect which path served the retrievals inside this block (see `retrieval_path`).
+
+    A speculative block gets its own holder and keeps its side effects (path
+    metrics, result- and embedding-cache fills) in `info["deferred"]`. They
+    only happen if the chain uses its documents (`adopt_retrieval`).
+    """
+    info: Dict[str, Any] = {"deferred": []} if speculative else {}
+    token = _RETRIEVAL_INFO.set(info)
+    try:
+        yield info
+    finally:
+        _RETRIEVAL_INFO.reset(token)
+
+
+def after_retrieval(fn) -> None:
+    """Run the side effect `fn` now, or hold it back while inside a speculative retrieval."""
+    info = _RETRIEVAL_INFO.get()
+    if info is not None and "deferred" in info:
+        info["deferred"].append(fn)
+    else:
+        fn()
+
+
+def adopt_retrieval(info: Dict[str, Any]) -> None:
+    """The chain uses a speculative retrieval: apply its held-back side effects and report its path."""
+    deferred, info["deferred"] = info.get("deferred", []), []
+    for fn in deferred:
+        fn()
+    current = _RETRIEVAL_INFO.get()
+    if current is not None and "path" in info:
+        current["path"] = info["path"]
+
+
+def note_query_vector(vec) -> None:
+    """Keep a speculative retrieval's query vector, so the chain can compare it with the rewrite."""
+    info = _RETRIEVAL_INFO.get()
+    if info is not None and "deferred" in info:
+        info["vector"] = vec
+
+
+def retrieval_path() -> Optional[str]:
+    info = _RETRIEVAL_INFO.get()
+    return info.get("path") if info is not None else None
+
+
+def note_embedding_failure(error: BaseException) -> None:
+    """An earlier embedding of this request failed; the retriever then goes straight to the lexical index."""
+    info = _RETRIEVAL_INFO.get()
+    if info is not None and not isinstance(error, DeadlineExceeded):
+        info["embed_failed"] = embed_failure_reason(error)
+
+
+def lexical_fallback_enabled():
+    """`LEXICAL_FALLBACK` (default 1): load the BM25 index so retrieval survives a slow or failed embedding."""
+    return os.getenv("LEXICAL_FALLBACK", "1").lower() not in ("0", "false", "no")
+
 
-    vectordb = Chroma(
-        persist_directory="chroma_store",
+def retrieval_path_stats() -> Dict[str, Dict[str, float]]:
+    """Count and latency per retrieval path, plus the degraded share, for the sidebar and the API's /metrics."""
+    out: Dict[str, Dict[str, float]] = {}
+    for path in ("dense", "hybrid", "lexical"):
+        count = RETRIEVALS.value(labels={"path": path})
+        if count:
+            summary = RETRIEVAL_MS.summary(labels={"path": path})
+            out[path] = {"count": int(count), "p50_ms": summary.get("p50"), "p95_ms": summary.get("p95")}
+    total = sum(s["count"] for s in out.values())
+    if total:
+        out["degraded"] = {
+            "rate": round(out.get("lexical", {}).get("count", 0) / total, 4),
+            "timeout": int(DEGRADED.value(labels={"reason": "timeout"})),
+            "error": int(DEGRADED.value(labels={"reason": "error"})),
+        }
+    return out
+
+
+def retrieval_mode():
+    """`mmr` (default) or `hybrid` (BM25 + dense, fused with reciprocal-rank fusion)."""
+    return os.getenv("RETRIEVAL_MODE", "mmr").lower()
+
+
+def _submit(fn, *args) -> Future:
+    """Run `fn` on the retriever's pool, keeping the caller's context (trace span, deadline)."""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("RETRIEVER_WORKERS", "8")), thread_name_prefix="retriever")
+    ctx = contextvars.copy_context()
+    return _EXECUTOR.submit(ctx.run, fn, *args)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """Ids ordered by sum(1 / (k + rank)) over the rankings (rank from 1); ties keep first-seen order."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, cid in enumerate(ranking, start=1):
+            scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda cid: -scores[cid])
+
+
+def get_vectorstore(embeddings=None, persist_directory=CHROMA_DIR):
+    if embeddings is None:
+        embeddings = get_embeddings()
+    return Chroma(
+        persist_directory=persist_directory,
         embedding_function=embeddings
     )
+
+
+class ManifestoRetriever(BaseRetriever):
+    """Chroma retrieval split into explicit steps: embed, candidate search, MMR.
+
+    Equivalent to `vectordb.as_retriever(search_type="mmr", ...)` (same query,
+    same MMR picks via the vectorized retriever/mmr.py, same candidate
+    ordering), but it keeps the Chroma ids of
+    the selected chunks so repeat queries can be served from `ResultCache`
+    without touching the vector index. With an `exact_index` the candidate
+    search runs on the memory-mapped matrix instead of Chroma.
+
+    With `search_type="hybrid"` and a `bm25_index`, the BM25 search runs on a
+    worker thread while the query is embedded and searched densely. The top
+    `fetch_k` of both lists are fused with reciprocal-rank fusion, and the
+    best `k` are kept (no MMR step).
+
+    Whenever a `bm25_index` is loaded, the query embedding gets
+    `embed_timeout_s()`. If it times out or fails, the top `k` BM25 chunks are
+    returned instead (the degraded "lexical" path). The path taken is counted
+    in `retrieval_path_total`, timed in `retrieval_ms`, set as
+    `rag.retrieval_path` on the span, and reported via `record_retrieval`.
+    """
+
+    vectorstore: Any = None
+    embeddings: Any
+    exact_index: Any = None
+    similarity_graph: Any = None
+    search_type: str = "mmr"
+    k: int = 4
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+    index_version: str = ""
+    result_cache: Any = None
+    chunk_table: Any = None
+    bm25_index: Any = None
+    rrf_k: int = 60
+
+    def _hybrid(self) -> bool:
+        return self.search_type == "hybrid" and self.bm25_index is not None
+
+    def embed_timeout_s(self) -> Optional[float]:
+        """Embedding budget, only when there is a lexical index to fall back to."""
+        return embed_timeout_s() if self.bm25_index is not None else None
+
+    def _prior_embed_failure(self) -> Optional[str]:
+        info = _RETRIEVAL_INFO.get()
+        return info.get("embed_failed") if info is not None and self.bm25_index is not None else None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        start = perf_counter()
+        lexical = _submit(self._lexical_search, query) if self._hybrid() else None
+        reason = self._prior_embed_failure()
+        if reason is None:
+            try:
+                with stage("embed"):
+                    vec = embed_query_within(self.embeddings, query, self.embed_timeout_s())
+                note_query_vector(vec)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                if self.bm25_index is None:
+                    raise
+                reason = embed_failure_reason(e)
+        if reason is not None:
+            return self._degraded(query, reason, start, lexical)
+        docs = self._search(vec, lexical)
+        self._record_path("hybrid" if lexical is not None else "dense", start)
+        return docs
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        start = perf_counter()
+        lexical = _submit(self._lexical_search, query) if self._hybrid() else None
+        reason = self._prior_embed_failure()
+        if reason is None:
+            try:
+                with stage("embed"):
+                    vec = await aembed_query_within(self.embeddings, query, self.embed_timeout_s())
+                note_query_vector(vec)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                if self.bm25_index is None:
+                    raise
+                reason = embed_failure_reason(e)
+        if lexical is not None:
+            await asyncio.wrap_future(lexical)
+        if reason is not None:
+            return self._degraded(query, reason, start, lexical)
+        docs = await run_in_executor(None, self._search, vec, lexical)
+        self._record_path("hybrid" if lexical is not None else "dense", start)
+        return docs
+
+    def _record_path(self, path: str, start: float) -> None:
+        elapsed_ms = (perf_counter() - start) * 1000.0
+
+        def count() -> None:
+            RETRIEVALS.inc(labels={"path": path})
+            RETRIEVAL_MS.observe(elapsed_ms, labels={"path": path})
+        after_retrieval(count)
+        set_attributes(rag__retrieval_path=path)
+        info = _RETRIEVAL_INFO.get()
+        if info is not None:
+            info["path"] = path
+
+    def _degraded(self, query: str, reason: str, start: float, lexical: Optional[Future] = None) -> List[Document]:
+        """Lexical-only answer when the embedding is too slow or failed."""
+        with stage("bm25", rag__fetch_k=self.k, rag__degraded=True):
+            ids = lexical.result() if lexical is not None else self.bm25_index.search(query, self.k)
+        docs = self.bm25_index.lookup(ids[:self.k]) or []
+        after_retrieval(lambda: DEGRADED.inc(labels={"reason": reason}))
+        set_attributes(rag__degraded_reason=reason)
+        self._record_path("lexical", start)
+        return docs
+
+    def _cache_key(self, vec) -> Tuple:
+        graph = self.similarity_graph.mode if self.similarity_graph is not None else ""
+        rrf_k = self.rrf_k if self._hybrid() else 0
+        return (vector_key(vec), self.search_type, self.k, self.fetch_k, self.lambda_mult, self.index_version, graph, rrf_k)
+
+    def _search(self, vec, lexical: Optional[Future] = None) -> List[Document]:
+        key = self._cache_key(vec) if self.result_cache is not None else None
+        if key is not None:
+            ids = self.result_cache.get(key)
+            if ids is not None:
+                docs = self.chunk_table.lookup(ids)
+                if docs is not None:
+                    set_attributes(rag__retrieval_cache_hit=True)
+                    return docs
+        if lexical is not None:
+            ids, docs = self._hybrid_search(vec, lexical.result())
+        else:
+            ids, docs = self._vector_search(vec)
+        if key is not None:
+            after_retrieval(lambda: self.result_cache.put(key, ids))
+        return docs
+
+    def _query(self, vec, n_results: int, include: List[str]):
+        if self.exact_index is not None:
+            return self.exact_index.query(vec, n_results, include)
+        return self.vectorstore._collection.query(query_embeddings=[vec], n_results=n_results, include=include)
+
+    def _vector_search(self, vec) -> Tuple[List[str], List[Document]]:
+        backend = "exact" if self.exact_index is not None else "chroma"
+        if self.search_type == "mmr" and self.similarity_graph is not None:
+            with stage("search", rag__fetch_k=self.fetch_k, rag__backend=backend):
+                results = self._query(vec, self.fetch_k, ["metadatas", "documents", "distances"])
+            with stage("mmr", rag__k=self.k, rag__lambda_mult=self.lambda_mult, rag__diversify=self.similarity_graph.mode):
+                sims = self.similarity_graph.similarities(vec, results["ids"][0], results["distances"][0])
+                if sims is None:
+                    # Store changed since the graph was written: fall back to the embeddings
+                    embeddings = self._query(vec, self.fetch_k, ["embeddings"])["embeddings"][0]
+                    picks = maximal_marginal_relevance(np.array(vec, dtype=np.float32), embeddings, k=self.k, lambda_mult=self.lambda_mult)
+                else:
+                    picks = mmr_select(sims[0], sims[1], lambda_mult=self.lambda_mult, k=self.k)
+                selected = set(picks)
+            chosen = [i for i in range(len(results["ids"][0])) if i in selected]
+        elif self.search_type == "mmr":
+            with stage("search", rag__fetch_k=self.fetch_k, rag__backend=backend):
+                results = self._query(vec, self.fetch_k, ["metadatas", "documents", "distances", "embeddings"])
+            with stage("mmr", rag__k=self.k, rag__lambda_mult=self.lambda_mult, rag__diversify="embeddings"):
+                selected = set(maximal_marginal_relevance(
+                    np.array(vec, dtype=np.float32),
+                    results["embeddings"][0],
+                    k=self.k,
+                    lambda_mult=self.lambda_mult,
+                ))
+            # Chroma keeps candidate (relevance) order, not MMR pick order
+            chosen = [i for i in range(len(results["ids"][0])) if i in selected]
+        else:
+            with stage("search", rag__fetch_k=self.k, rag__backend=backend):
+                results = self._query(vec, self.k, ["metadatas", "documents", "distances"])
+            chosen = list(range(len(results["ids"][0])))
+        ids = [results["ids"][0][i] for i in chosen]
+        docs = [
+            Document(id=results["ids"][0][i], page_content=results["documents"][0][i], metadata=results["metadatas"][0][i] or {})
+            for i in chosen
+        ]
+        return ids, docs
+
+
+    def _lexical_search(self, query: str) -> List[str]:
+        with stage("bm25", rag__fetch_k=self.fetch_k):
+            return self.bm25_index.search(query, self.fetch_k)
+
+    def _hybrid_search(self, vec, lexical_ids: List[str]) -> Tuple[List[str], List[Document]]:
+        backend = "exact" if self.exact_index is not None else "chroma"
+        with stage("search", rag__fetch_k=self.fetch_k, rag__backend=backend):
+            results = self._query(vec, self.fetch_k, ["metadatas", "documents"])
+        with stage("fuse", rag__k=self.k, rag__rrf_k=self.rrf_k):
+            dense_ids = results["ids"][0]
+            ids = reciprocal_rank_fusion([dense_ids, lexical_ids], self.rrf_k)[:self.k]
+            dense = {
+                cid: Document(id=cid, page_content=text, metadata=meta or {})
+                for cid, text, meta in zip(dense_ids, results["documents"][0], results["metadatas"][0])
+            }
+            lexical = self.bm25_index.lookup([cid for cid in ids if cid not in dense]) or []
+            docs_by_id = {**dense, **{doc.id: doc for doc in lexical}}
+            ids = [cid for cid in ids if cid in docs_by_id]
+            set_attributes(
+                rag__dense_hits=sum(cid in dense for cid in ids),
+                rag__lexical_hits=sum(cid in lexical_ids for cid in ids),
+            )
+        return ids, [docs_by_id[cid] for cid in ids]
+
+
+def get_retriever(vectordb=None, index_version=None, embeddings=None, persist_directory=CHROMA_DIR):
+    exact_index = None
+    if retriever_backend() == "exact":
+        from retriever.exact_index import load_exact_index
+        exact_index = load_exact_index(persist_directory)
+    if vectordb is None and exact_index is None:
+        vectordb = get_vectorstore(embeddings, persist_directory=persist_directory)
+    similarity_graph = load_similarity_graph(persist_directory, exact_index.ids if exact_index is not None else None)
     #general working
     # return vectordb.as_retriever(search_kwargs={"k": 4})
 
     #at ret
 
     # Use MMR (Maximal Marginal Relevance) to reduce duplicate/near-duplicate chunks
-    return vectordb.as_retriever(
-        search_type="mmr",
-        search_kwargs={
-            "k": 4,          # maximum results
-            "fetch_k": 20,   # candidate pool size for diversification
-            "lambda_mult": 0.5,  # balance relevance vs. diversity
-        },
+    cfg = get_retriever_config()
+    bm25_index = None
+    if cfg["search_type"] == "hybrid" or lexical_fallback_enabled():
+        from retriever.bm25 import load_bm25_index
+        bm25_index = load_bm25_index(persist_directory)
+    use_cache = result_cache_enabled()
+    if exact_index is not None:
+        chunk_table = exact_index  # same lookup() interface, already in memory
+    else:
+        chunk_table = ChunkTable(vectordb) if use_cache else None
+    return ManifestoRetriever(
+        vectorstore=vectordb,
+        embeddings=embeddings if embeddings is not None else vectordb.embeddings,
+        exact_index=exact_index,
+        similarity_graph=similarity_graph,
+        search_type=cfg["search_type"] if bm25_index is not None else "mmr",
+        k=cfg["k"],                      # maximum results
+        fetch_k=cfg["fetch_k"],          # candidate pool size for diversification
+        lambda_mult=cfg["lambda_mult"],  # balance relevance vs. diversity
+        index_version=index_version or get_index_version(persist_directory),
+        result_cache=ResultCache() if use_cache else None,
+        chunk_table=chunk_table if use_cache else None,
+        bm25_index=bm25_index,
+        rrf_k=cfg["rrf_k"],
     )
 
 
 def get_retriever_config():
     return {
-        "search_type": "mmr",
+        "search_type": retrieval_mode(),
         "k": 4,
         "fetch_k": 20,
         "lambda_mult": 0.5,
+        "backend": retriever_backend(),
+        "similarity_graph": similarity_graph_mode(),
+        "rrf_k": int(os.getenv("RRF_K", "60")),
     }
 
+
+def get_index_version(persist_directory=CHROMA_DIR):
+    """Cheap fingerprint of the on-disk index (file names, sizes, mtimes).
+
+    Changes whenever ingestion rewrites the store, so callers can tell when
+    cached clients/results are stale without opening Chroma.
+    """
+    if not os.path.isdir(persist_directory):
+        return "missing"
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(persist_directory):
+        dirs.sort()
+        for name in sorted(files):
+            # sqlite side files churn on plain reads; they are not index content
+            if name.endswith(("-wal", "-shm", "-journal", ".lock")):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            rel = os.path.relpath(path, persist_directory)
+            digest.update(f"{rel}:{st.st_size}:{st.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
@@ -0,0 +1,174 @@
+"""Chunk-to-chunk similarities computed at ingest, so MMR needs no embeddings at query time.
+
+The corpus only changes when ingest runs, so the candidate x candidate cosine
+block that MMR needs can be looked up instead of computed per query.
+`write_exact_index` (retriever/exact_index.py) stores these files next to the
+exact index in `<persist_dir>/exact/`:
+
+- `norms.f32`: the L2 norm of every chunk vector,
+- `neighbors.i32` / `neighbor_sims.f16`: for every chunk, its
+  `SIMILARITY_GRAPH_M` most similar chunks (default 32) and their cosine
+  similarities, most similar first,
+- `similarity.f16`: the full N x N cosine matrix in float16. It is written
+  only while N <= `SIMILARITY_MATRIX_MAX_CHUNKS` (default 4096, ~32 MB),
+- `graph.json`: row count, M, and whether the matrix was written.
+
+At query time the candidate search returns squared L2 distances. Together
+with the stored norms, they give the query-to-chunk cosines. The pairwise
+block is read from the matrix when it exists. Otherwise it is read from the
+neighbour lists. A pair that is in neither chunk's top-M counts as
+similarity 0, so at large N the picks can differ slightly from exact MMR.
+`python -m retriever.bench graph` reports how often they agree.
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+GRAPH_META = "graph.json"
+
+
+def similarity_graph_mode() -> str:
+    """`SIMILARITY_GRAPH`: `0` (default, MMR on embeddings), `1` (matrix if present) or `neighbors`."""
+    mode = os.getenv("SIMILARITY_GRAPH", "0").lower()
+    if mode in ("0", "false", "no", "off", ""):
+        return "off"
+    return "neighbors" if mode == "neighbors" else "auto"
+
+
+def write_similarity_graph(directory: str, vectors: np.ndarray, m: Optional[int] = None,
+                           matrix_max_chunks: Optional[int] = None, block_rows: int = 1024) -> Dict[str, Any]:
+    """Write the graph files for `vectors` into `directory` (the exact-index directory)."""
+    m = m if m is not None else int(os.getenv("SIMILARITY_GRAPH_M", "32"))
+    if matrix_max_chunks is None:
+        matrix_max_chunks = int(os.getenv("SIMILARITY_MATRIX_MAX_CHUNKS", "4096"))
+    count = len(vectors)
+    m = max(0, min(m, count - 1))
+    norms = np.linalg.norm(vectors, axis=1).astype(np.float32)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        unit = np.nan_to_num(vectors / norms[:, None], nan=0.0, posinf=0.0, neginf=0.0).astype(np.float32)
+    write_matrix = count <= matrix_max_chunks
+    matrix = np.memmap(os.path.join(directory, "similarity.f16"), dtype=np.float16, mode="w+",
+                       shape=(count, count)) if write_matrix and count else None
+    neighbors = np.empty((count, m), dtype=np.int32)
+    neighbor_sims = np.empty((count, m), dtype=np.float16)
+    # Row blocks keep the working set at block_rows x N floats however big the corpus gets
+    for start in range(0, count, block_rows):
+        sims = unit[start:start + block_rows] @ unit.T
+        if matrix is not None:
+            matrix[start:start + len(sims)] = sims
+        rows = np.arange(len(sims))
+        sims[rows, start + rows] = -np.inf  # a chunk is not its own neighbour
+        if m:
+            top = np.argpartition(-sims, m - 1, axis=1)[:, :m]
+            order = np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            neighbors[start:start + len(sims)] = top
+            neighbor_sims[start:start + len(sims)] = np.take_along_axis(sims, top, axis=1)
+    if matrix is not None:
+        matrix.flush()
+        del matrix
+    norms.tofile(os.path.join(directory, "norms.f32"))
+    neighbors.tofile(os.path.join(directory, "neighbors.i32"))
+    neighbor_sims.tofile(os.path.join(directory, "neighbor_sims.f16"))
+    meta = {"count": count, "m": m, "matrix": write_matrix and count > 0}
+    with open(os.path.join(directory, GRAPH_META), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+class SimilarityGraph:
+    """Read-only view of the graph files; `use_matrix=False` forces the neighbour lists."""
+
+    def __init__(self, directory: str, ids: Sequence[str], use_matrix: bool = True):
+        with open(os.path.join(directory, GRAPH_META)) as f:
+            meta = json.load(f)
+        self.count, self.m = meta["count"], meta["m"]
+        if self.count != len(ids):
+            raise ValueError(f"{directory}: graph has {self.count} rows for {len(ids)} chunks")
+        self.norms = np.fromfile(os.path.join(directory, "norms.f32"), dtype=np.float32)
+        shape = (self.count, self.m)
+        self.neighbors = np.memmap(os.path.join(directory, "neighbors.i32"), dtype=np.int32, mode="r", shape=shape)
+        self.neighbor_sims = np.memmap(os.path.join(directory, "neighbor_sims.f16"), dtype=np.float16, mode="r", shape=shape)
+        self.matrix = None
+        if use_matrix and meta["matrix"]:
+            self.matrix = np.memmap(os.path.join(directory, "similarity.f16"), dtype=np.float16, mode="r",
+                                    shape=(self.count, self.count))
+        self._rows = {cid: i for i, cid in enumerate(ids)}
+
+    @property
+    def mode(self) -> str:
+        return "matrix" if self.matrix is not None else "neighbors"
+
+    def nbytes(self) -> Dict[str, int]:
+        out = {"norms": int(self.norms.nbytes), "neighbors": int(self.neighbors.nbytes + self.neighbor_sims.nbytes)}
+        if self.matrix is not None:
+            out["matrix"] = int(self.matrix.nbytes)
+        return out
+
+    def rows(self, ids: Sequence[str]) -> Optional[np.ndarray]:
+        try:
+            return np.fromiter((self._rows[cid] for cid in ids), dtype=np.int64, count=len(ids))
+        except KeyError:
+            return None
+
+    def query_similarities(self, vec: Sequence[float], rows: np.ndarray, sq_distances: Sequence[float]) -> np.ndarray:
+        """Query-to-candidate cosines from squared L2 distances: (|q|^2 + |x|^2 - d) / (2 |q| |x|)."""
+        q = np.asarray(vec, dtype=np.float32)
+        q_sq = float(q @ q)
+        norms = self.norms[rows]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sims = (q_sq + norms * norms - np.asarray(sq_distances, dtype=np.float32)) / (2.0 * np.sqrt(q_sq) * norms)
+        sims[~np.isfinite(sims)] = 0.0
+        return sims.astype(np.float32)
+
+    def pairwise(self, rows: np.ndarray) -> np.ndarray:
+        """Candidate x candidate cosine block for the given chunk rows."""
+        if self.matrix is not None:
+            return np.asarray(self.matrix[np.ix_(rows, rows)], dtype=np.float32)
+        n = len(rows)
+        block = np.zeros((n, n), dtype=np.float32)
+        if n == 0:
+            return block
+        order = np.argsort(rows, kind="stable")
+        sorted_rows = rows[order]
+        nb = np.asarray(self.neighbors[rows], dtype=np.int64)  # (n, m)
+        pos = np.minimum(np.searchsorted(sorted_rows, nb), n - 1)
+        hit = sorted_rows[pos] == nb
+        i, j = np.nonzero(hit)
+        block[i, order[pos[i, j]]] = self.neighbor_sims[rows][i, j]
+        # j may be in i's top-M without i being in j's
+        block = np.maximum(block, block.T)
+        np.fill_diagonal(block, 1.0)
+        return block
+
+    def similarities(self, vec: Sequence[float], ids: Sequence[str],
+                     sq_distances: Sequence[float]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(query-to-candidate, candidate x candidate) cosines, or None if an id is not in the graph."""
+        rows = self.rows(ids)
+        if rows is None:
+            return None
+        return self.query_similarities(vec, rows, sq_distances), self.pairwise(rows)
+
+
+def read_chunk_ids(exact_directory: str) -> List[str]:
+    with open(os.path.join(exact_directory, "chunks.jsonl"), encoding="utf-8") as f:
+        return [json.loads(line)["id"] for line in f]
+
+
+def load_similarity_graph(persist_directory: str, ids: Optional[Sequence[str]] = None) -> Optional[SimilarityGraph]:
+    """Graph for the store, per `SIMILARITY_GRAPH`; None when off or not built."""
+    from retriever.exact_index import exact_index_path
+
+    mode = similarity_graph_mode()
+    if mode == "off":
+        return None
+    directory = exact_index_path(persist_directory)
+    try:
+        return SimilarityGraph(directory, ids if ids is not None else read_chunk_ids(directory),
+                               use_matrix=mode != "neighbors")
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Similarity graph not available in {directory} ({e}); MMR uses the embeddings. "
+              f"Re-run ingest or `python -m retriever.exact_index {persist_directory}`")
+        return None
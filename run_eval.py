@@ -6,13 +6,13 @@ import os
 from time import perf_counter
 from pathlib import Path
 import csv
+# Score fresh answers: a cached answer says nothing about the current prompts or model
+os.environ.setdefault("SEMANTIC_CACHE", "0")
 from bot.chain import get_chain
 from opentelemetry.trace import StatusCode
 from datetime import datetime
 from monitoring.arize_integration import init_arize_tracing
 
-from phoenix.experiments import Task
-
 from monitoring.eval.eval_func import (
     evaluate_retrieval_relevance,
     evaluate_retrieval_correctness,
@@ -4,10 +4,12 @@ import logging
 from time import perf_counter  
 from pathlib import Path  
 from datetime import datetime  
-from typing import Dict, List  
-import pandas as pd  
-import phoenix as px  
-from phoenix.experiments import run_experiment, evaluate_experiment  
+from typing import TYPE_CHECKING, Dict, List  
+# pandas and phoenix are imported where they are used (slow to import)
+if TYPE_CHECKING:
+    import pandas as pd
+# Score fresh answers: a cached answer says nothing about the current prompts or model
+os.environ.setdefault("SEMANTIC_CACHE", "0")
 from bot.chain import get_chain
  
 #list of function call and each folder have . use 
@@ -173,12 +175,14 @@ def process_qa_item(item: Dict, chain) -> Dict:
     )
     return record  
   
-def run_evaluation() -> pd.DataFrame:
+def run_evaluation() -> "pd.DataFrame":
     """Main evaluation workflow.
 
     Loads gold questions, runs the chain per item, computes metrics, and
     returns a DataFrame ready for CSV and Phoenix upload.
     """
+    import pandas as pd
+
     # Load gold data
     with open(Path("monitoring/eval/gold_qa.json")) as f:  
         gold_data = json.load(f)["items"]  
@@ -192,7 +196,7 @@ def run_evaluation() -> pd.DataFrame:
 
     return pd.DataFrame(results)  
   
-def upload_to_phoenix(df: pd.DataFrame, experiment_name: str, candidate_csv_path: Path) -> None:
+def upload_to_phoenix(df: "pd.DataFrame", experiment_name: str, candidate_csv_path: Path) -> None:
     """Upload results as a Phoenix dataset and run an experiment.
 
     - Creates a unique dataset name using experiment_name + timestamp
@@ -200,6 +204,9 @@ def upload_to_phoenix(df: pd.DataFrame, experiment_name: str, candidate_csv_path
     - Runs a Phoenix experiment that recomputes the five metrics plus overall_score
     - Marks overall_score as the primary metric
     """
+    import phoenix as px
+    from phoenix.experiments import run_experiment, evaluate_experiment
+
     endpoint = os.getenv("PHOENIX_ENDPOINT", "http://127.0.0.1:6006")  
     px_client = px.Client(endpoint=endpoint)  
       
@@ -8,6 +8,8 @@ from typing import Dict, List
 import pandas as pd  
 import phoenix as px  
 from phoenix.experiments import run_experiment, evaluate_experiment  
+# Score fresh answers: a cached answer says nothing about the current prompts or model
+os.environ.setdefault("SEMANTIC_CACHE", "0")
 from bot.chain import get_chain
  
 #list of function call and each folder have . use 
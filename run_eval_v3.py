@@ -4,11 +4,16 @@ import logging
 from time import perf_counter  
 from pathlib import Path  
 from datetime import datetime  
-from typing import Dict, List  
-import pandas as pd  
-import phoenix as px  
-from phoenix.experiments import run_experiment, evaluate_experiment  
+from typing import TYPE_CHECKING, Dict, List  
+# pandas and phoenix are imported where they are used: together they cost
+# seconds at startup (python -m monitoring.import_bench run_eval_v3)
+if TYPE_CHECKING:
+    import pandas as pd
+# Score fresh answers: a cached answer says nothing about the current prompts or model
+os.environ.setdefault("SEMANTIC_CACHE", "0")
 from bot.chain import get_chain
+from bot.memory import get_memory
+from bot.rate_limit import admission_context
  
 #list of function call and each folder have . use 
 from monitoring.eval.eval_func import (  
@@ -107,15 +112,17 @@ def process_qa_item(item: Dict, chain) -> Dict:
         **metrics  
     }  
   
-def run_evaluation() -> pd.DataFrame:  
+def run_evaluation() -> "pd.DataFrame":  
     """Main evaluation workflow"""  
+    import pandas as pd
     # Load gold data  
     with open(Path("monitoring/eval/gold_qa.json")) as f:  
         gold_data = json.load(f)["items"]  
       
     # Process all items  
     chain = get_chain()  
-    results = [process_qa_item(item, chain) for item in gold_data]    
+    with admission_context(priority="eval"):
+        results = [process_qa_item(item, chain) for item in gold_data]    
 
     results=pd.DataFrame(results)
     avg = {
@@ -129,10 +136,18 @@ def run_evaluation() -> pd.DataFrame:
     #print(avg)
     return results,avg
 
+_TASK_CHAIN = None
+
 # Per-example task: runs once per dataset row
 def task(input: str, expected=None, metadata=None) -> dict:
-    chain = get_chain()
-    result = process_qa_item(input, chain)  
+    global _TASK_CHAIN
+    # One chain (and its shared, pooled clients) for the whole experiment;
+    # only the memory is fresh per row so rows stay independent
+    if _TASK_CHAIN is None:
+        _TASK_CHAIN = get_chain()
+    _TASK_CHAIN.memory = get_memory()
+    with admission_context(priority="eval"):
+        result = process_qa_item(input, _TASK_CHAIN)  
 
     
     # Ensure JSON-serializable output
@@ -151,8 +166,10 @@ def task(input: str, expected=None, metadata=None) -> dict:
 
 ###################
 
-def upload_to_phoenix(df: pd.DataFrame, experiment_name: str) -> None:
+def upload_to_phoenix(df: "pd.DataFrame", experiment_name: str) -> None:
     """Handle Phoenix dataset and experiment creation"""
+    import phoenix as px
+    from phoenix.experiments import run_experiment, evaluate_experiment
     px_client = px.Client()
     timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
     dataset_name = f"{experiment_name}-{timestamp}"
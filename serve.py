@@ -0,0 +1,32 @@
+"""Container entrypoint: warm up in-process, then run the Streamlit app.
+
+Streamlit runs `app.py` in this same process, so the resources built by the
+warm-up (bot/warmup.py) are the ones the first user gets. The metrics sidecar
+starts first, so `GET /ready` reports the warm-up while it runs. Streamlit
+flags are passed through:
+
+    python serve.py --server.port 8501 --server.address 0.0.0.0
+"""
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from bot.warmup import start_warmup
+from monitoring.metrics_server import start_metrics_server
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+
+def main(argv=None):
+    load_dotenv()
+    start_metrics_server()
+    # In the background: Streamlit's own health endpoint comes up meanwhile,
+    # and /ready tells the orchestrator when to send traffic
+    start_warmup()
+    from streamlit.web import cli
+    cli.main(["run", APP, *(sys.argv[1:] if argv is None else argv)], prog_name="streamlit")
+
+
+if __name__ == "__main__":
+    main()
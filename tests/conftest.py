@@ -0,0 +1,35 @@
+"""Offline test setup: fake LLM/embeddings, exact backend, no on-disk caches in the working directory.
+
+    CHATBOT_FAKE_LLM=1 python -m pytest -q tests
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.setdefault("CHATBOT_FAKE_LLM", "1")
+os.environ.update({
+    "RETRIEVER_BACKEND": "exact",
+    "FAKE_EMBEDDING_DIM": "64",
+    "FAKE_LLM_TTFT_S": "0",
+    "FAKE_LLM_TOKEN_S": "0",
+    "SEMANTIC_CACHE": "0",
+    "RETRIEVAL_CACHE": "0",
+    "EMBEDDING_CACHE": "0",
+    "CHAT_HISTORY_BACKEND": "memory",
+})
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def text_store(tmp_path):
+    """A small exact + BM25 store (retriever/bench.py) in a temp directory."""
+    from retriever.bench import build_text_store
+
+    directory = str(tmp_path / "store")
+    os.makedirs(directory)
+    build_text_store(directory, 40)
+    return directory
@@ -0,0 +1,172 @@
+"""Admission control (bot/rate_limit.py): priority queue, token buckets, per-session caps."""
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+from bot.rate_limit import (
+    AdmissionController,
+    AdmissionTransport,
+    AsyncAdmissionTransport,
+    Rejected,
+    TokenBucket,
+    admission_context,
+    estimate_tokens,
+)
+
+URL = "https://example.openai.azure.com/openai/deployments/gpt-4o/chat/completions"
+
+
+def _ok(request):
+    return httpx.Response(200, json={"ok": True})
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_bucket_bursts_then_refills(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("bot.rate_limit.monotonic", lambda: now[0])
+    bucket = TokenBucket(rate_per_min=60)  # 1 per second, burst of 60
+    assert bucket.wait_s(60) == 0.0
+    bucket.take(60)
+    assert bucket.wait_s(1) == pytest.approx(1.0)
+    now[0] += 0.5
+    assert bucket.wait_s(1) == pytest.approx(0.5)
+    now[0] += 0.5
+    assert bucket.wait_s(1) == 0.0
+    # Oversized requests wait for a full bucket instead of forever
+    assert bucket.wait_s(1000) == pytest.approx(59.0)
+
+
+def test_zero_rate_means_unlimited():
+    bucket = TokenBucket(0)
+    bucket.take(10 ** 6)
+    assert bucket.wait_s(10 ** 6) == 0.0
+
+
+def test_estimate_tokens_reads_deployment_and_max_tokens():
+    body = json.dumps({"messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 100}).encode()
+    deployment, tokens = estimate_tokens(httpx.Request("POST", URL, content=body))
+    assert deployment == "gpt-4o"
+    assert tokens == pytest.approx(len(body) / 4.0 + 100)
+
+
+def test_waiters_are_admitted_in_priority_order():
+    controller = AdmissionController(max_concurrency=1, per_session_concurrency=10, timeout_s=5)
+    controller.acquire("d", 1, "interactive", None)  # hold the only slot
+    order = []
+
+    def call(priority):
+        controller.acquire("d", 1, priority, None)
+        order.append(priority)
+        controller.release(None)
+
+    threads = []
+    for priority in ("batch", "eval", "interactive"):  # arrive lowest priority first
+        threads.append(threading.Thread(target=call, args=(priority,)))
+        threads[-1].start()
+        _wait_for(lambda: len(controller._waiting) == len(threads))
+    controller.release(None)
+    for t in threads:
+        t.join(5)
+    assert order == ["interactive", "eval", "batch"]
+    assert controller.in_flight == 0 and controller._waiting == []
+
+
+def test_same_priority_is_first_come_first_served():
+    controller = AdmissionController(max_concurrency=1, per_session_concurrency=10, timeout_s=5)
+    controller.acquire("d", 1, "interactive", None)
+    order = []
+
+    def call(n):
+        controller.acquire("d", 1, "eval", None)
+        order.append(n)
+        controller.release(None)
+
+    threads = []
+    for n in range(4):
+        threads.append(threading.Thread(target=call, args=(n,)))
+        threads[-1].start()
+        _wait_for(lambda: len(controller._waiting) == len(threads))
+    controller.release(None)
+    for t in threads:
+        t.join(5)
+    assert order == [0, 1, 2, 3]
+
+
+def test_rpm_bucket_rejects_after_timeout():
+    controller = AdmissionController(rpm=2, max_concurrency=10, per_session_concurrency=10, timeout_s=0.2)
+    for _ in range(2):
+        controller.acquire("d", 1, "interactive", None)
+        controller.release(None)
+    start = time.monotonic()
+    with pytest.raises(Rejected) as raised:
+        controller.acquire("d", 1, "interactive", None)
+    assert time.monotonic() - start == pytest.approx(0.2, abs=0.15)
+    assert raised.value.retry_after_s == pytest.approx(30.0)
+    assert controller._waiting == []  # the dead ticket does not block the line
+    # Buckets are per deployment
+    controller.acquire("other", 1, "interactive", None)
+
+
+def test_tpm_bucket_limits_by_estimated_tokens():
+    controller = AdmissionController(tpm=1000, max_concurrency=10, per_session_concurrency=10, timeout_s=0.1)
+    controller.acquire("d", 900, "batch", None)
+    with pytest.raises(Rejected):
+        controller.acquire("d", 200, "batch", None)
+    controller.acquire("d", 50, "batch", None)
+
+
+def test_call_timeout_caps_the_admission_wait():
+    controller = AdmissionController(max_concurrency=1, per_session_concurrency=10, timeout_s=30)
+    controller.acquire("d", 1, "interactive", None)
+    start = time.monotonic()
+    with pytest.raises(Rejected):
+        controller.acquire("d", 1, "interactive", None, timeout_s=0.1)
+    assert time.monotonic() - start < 1.0
+
+
+def test_session_cap_does_not_block_other_sessions():
+    controller = AdmissionController(max_concurrency=10, per_session_concurrency=1, timeout_s=0.1)
+    controller.acquire("d", 1, "interactive", "s1")
+    with pytest.raises(Rejected):
+        controller.acquire("d", 1, "interactive", "s1")
+    controller.acquire("d", 1, "interactive", "s2")
+    assert controller._session_in_flight == {"s1": 1, "s2": 1}
+    controller.release("s1")
+    controller.release("s2")
+    assert controller._session_in_flight == {}
+
+
+def test_transport_returns_429_and_frees_the_slot():
+    controller = AdmissionController(rpm=1, max_concurrency=10, per_session_concurrency=10, timeout_s=0.1)
+    client = httpx.Client(transport=AdmissionTransport(httpx.MockTransport(_ok), controller))
+    with admission_context(priority="eval", session_id="s1"):
+        assert client.post(URL, json={}).status_code == 200
+        rejected = client.post(URL, json={})
+    assert rejected.status_code == 429
+    assert rejected.headers["retry-after"] == "60"
+    assert controller.in_flight == 0
+    assert controller._session_in_flight == {}
+
+
+def test_async_transport_releases_after_the_response():
+    controller = AdmissionController(max_concurrency=1, per_session_concurrency=1, timeout_s=1)
+
+    async def run():
+        async with httpx.AsyncClient(transport=AsyncAdmissionTransport(httpx.MockTransport(_ok), controller)) as client:
+            with admission_context(session_id="s1"):
+                responses = await asyncio.gather(*(client.post(URL, json={}) for _ in range(3)))
+        return [r.status_code for r in responses]
+
+    assert asyncio.run(run()) == [200, 200, 200]
+    assert controller.in_flight == 0
+    assert controller._session_in_flight == {}
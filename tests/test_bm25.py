@@ -0,0 +1,89 @@
+"""BM25 scoring (retriever/bm25.py) and reciprocal rank fusion."""
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from retriever.bm25 import BM25Index, tokenize, write_bm25_index
+from retriever.retriever import reciprocal_rank_fusion
+
+TEXTS = [
+    "The party will extend the Health Insurance Act 2017 to every district.",
+    "Free health checkups in rural health posts; health insurance for farmers.",
+    "CIAA will investigate corruption in road contracts.",
+    "Rural roads and irrigation for farmers in every province.",
+    "",
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    ids = [f"c{i}" for i in range(len(TEXTS))]
+    write_bm25_index(str(tmp_path), ids, TEXTS, [{"page": i} for i in range(len(TEXTS))])
+    return BM25Index(str(tmp_path), k1=1.5, b=0.75)
+
+
+def _reference_scores(query, k1=1.5, b=0.75):
+    docs = [Counter(tokenize(t)) for t in TEXTS]
+    lengths = [sum(d.values()) for d in docs]
+    avgdl = sum(lengths) / len(lengths)
+    out = []
+    for doc, dl in zip(docs, lengths):
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(1 for d in docs if term in d)
+            if not df or term not in doc:
+                continue
+            idf = math.log1p((len(docs) - df + 0.5) / (df + 0.5))
+            tf = doc[term]
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+        out.append(score)
+    return out
+
+
+def test_tokenize_keeps_numbers_and_drops_stopwords():
+    assert tokenize("What is the Health Insurance Act 2017?") == ["health", "insurance", "act", "2017"]
+    assert tokenize(None) == []
+
+
+@pytest.mark.parametrize("query", ["health insurance", "CIAA corruption", "rural farmers 2017", "health health"])
+def test_scores_match_okapi_bm25(index, query):
+    assert index.scores(query) == pytest.approx(_reference_scores(query), rel=1e-5)
+
+
+def test_top_is_best_first_and_skips_non_matching(index):
+    rows, scores = index.top("health insurance farmers", 10)
+    assert list(scores) == sorted(scores, reverse=True)
+    assert (scores > 0).all()
+    assert set(rows) == {0, 1, 3}
+    assert index.search("health insurance", 1) == ["c1"]  # three mentions of "health"
+    assert index.search("nothing matches here", 5) == []
+
+
+def test_lookup_returns_documents_by_id(index):
+    docs = index.lookup(["c2", "c0"])
+    assert [d.id for d in docs] == ["c2", "c0"]
+    assert docs[0].page_content.startswith("CIAA")
+    assert docs[1].metadata == {"page": 0}
+    assert index.lookup(["missing"]) is None
+
+
+def test_rrf_orders_by_summed_reciprocal_rank():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "d"]], k=60)
+    # c: 1/61 + 1/63 just beats b: 2/62; a: 1/61 beats d: 1/63
+    assert fused == ["c", "b", "a", "d"]
+    scores = {cid: sum(1 / (60 + r.index(cid) + 1) for r in (["a", "b", "c"], ["c", "b", "d"]) if cid in r)
+              for cid in "abcd"}
+    assert fused == sorted(scores, key=lambda cid: -scores[cid])
+
+
+def test_rrf_ties_keep_first_seen_order():
+    assert reciprocal_rank_fusion([["a", "b"], ["b", "a"]]) == ["a", "b"]
+    assert reciprocal_rank_fusion([["x"], [], ["y"]]) == ["x", "y"]
+    assert reciprocal_rank_fusion([]) == []
+
+
+def test_rrf_single_ranking_is_unchanged():
+    ranking = [f"c{i}" for i in np.random.default_rng(0).permutation(20)]
+    assert reciprocal_rank_fusion([ranking]) == ranking
@@ -0,0 +1,27 @@
+"""Request deadline scopes (bot/deadline.py)."""
+import pytest
+
+from bot.deadline import DeadlineExceeded, check_deadline, deadline_scope, remaining_s
+
+
+def test_no_deadline_without_a_scope():
+    with deadline_scope(None):
+        assert remaining_s() is None
+        check_deadline("generate")
+
+
+@pytest.mark.parametrize("seconds", [0, -0.5])
+def test_exhausted_budget_is_already_expired(seconds):
+    with deadline_scope(seconds), pytest.raises(DeadlineExceeded) as raised:
+        check_deadline("retrieve")
+    assert raised.value.stage == "retrieve"
+
+
+def test_nested_scope_only_shortens():
+    with deadline_scope(0.05):
+        with deadline_scope(60):
+            assert remaining_s() <= 0.05
+        with deadline_scope(-1):
+            with pytest.raises(DeadlineExceeded):
+                check_deadline("generate")
+        assert remaining_s() > 0
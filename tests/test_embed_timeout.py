@@ -0,0 +1,130 @@
+"""The embedding budget is enforced on the HTTP request itself, through the real admission transport."""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from langchain_openai import AzureOpenAIEmbeddings
+from openai import APITimeoutError
+
+from bot.rate_limit import AdmissionController, AdmissionTransport, AsyncAdmissionTransport, admission_context
+from retriever.embedding_cache import CachedEmbeddings
+from retriever.retriever import aembed_query_within, embed_failure_reason, embed_query_within
+
+
+class _SlowEmbeddings(BaseHTTPRequestHandler):
+    delay_s = 0.0
+    hits = 0
+
+    def do_POST(self):
+        type(self).hits += 1
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        time.sleep(self.delay_s)
+        body = json.dumps({
+            "object": "list",
+            "data": [{"object": "embedding", "index": 0, "embedding": [0.1, 0.2, 0.3]}],
+            "model": "emb",
+            "usage": {"prompt_tokens": 1, "total_tokens": 1},
+        }).encode()
+        try:
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up, which is the point
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    handler = type("Handler", (_SlowEmbeddings,), {"delay_s": 0.0, "hits": 0})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd, handler
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def controller():
+    return AdmissionController(max_concurrency=4, per_session_concurrency=1, timeout_s=30)
+
+
+def _embeddings(httpd, controller):
+    # Same wiring as bot/clients.py: pooled transport wrapped by admission control, 60 s read timeout
+    timeout = httpx.Timeout(60.0, connect=5.0)
+    return AzureOpenAIEmbeddings(
+        deployment="emb",
+        azure_endpoint=f"http://127.0.0.1:{httpd.server_address[1]}",
+        api_key="test",
+        api_version="2024-02-01",
+        check_embedding_ctx_length=False,
+        http_client=httpx.Client(transport=AdmissionTransport(httpx.HTTPTransport(), controller), timeout=timeout),
+        http_async_client=httpx.AsyncClient(
+            transport=AsyncAdmissionTransport(httpx.AsyncHTTPTransport(), controller), timeout=timeout
+        ),
+    )
+
+
+def test_slow_request_is_aborted_and_frees_its_slot(server, controller):
+    httpd, handler = server
+    handler.delay_s = 3.0
+    embeddings = _embeddings(httpd, controller)
+    start = time.monotonic()
+    with admission_context(session_id="s1"), pytest.raises(APITimeoutError) as raised:
+        embed_query_within(embeddings, "health insurance", 0.3)
+    assert time.monotonic() - start < 1.5
+    assert handler.hits == 1  # no SDK retries on top of the budget
+    assert embed_failure_reason(raised.value) == "timeout"
+    assert controller.in_flight == 0
+    assert controller._session_in_flight == {}
+
+
+def test_async_slow_request_is_aborted_and_frees_its_slot(server, controller):
+    httpd, handler = server
+    handler.delay_s = 3.0
+    embeddings = _embeddings(httpd, controller)
+
+    async def run():
+        with admission_context(session_id="s1"):
+            await aembed_query_within(embeddings, "health insurance", 0.3)
+
+    start = time.monotonic()
+    with pytest.raises(APITimeoutError):
+        asyncio.run(run())
+    assert time.monotonic() - start < 1.5
+    assert controller.in_flight == 0
+    assert controller._session_in_flight == {}
+
+
+def test_session_slot_is_free_for_the_next_call(server, controller):
+    # per_session_concurrency=1: a leaked slot would make this call queue, then get a 429
+    httpd, handler = server
+    handler.delay_s = 3.0
+    embeddings = _embeddings(httpd, controller)
+    with admission_context(session_id="s1"):
+        with pytest.raises(APITimeoutError):
+            embed_query_within(embeddings, "first", 0.3)
+        handler.delay_s = 0.0
+        assert embed_query_within(embeddings, "second", 0.3) == pytest.approx([0.1, 0.2, 0.3])
+
+
+def test_cached_embeddings_pass_the_budget_to_the_request(server, controller, tmp_path):
+    httpd, handler = server
+    handler.delay_s = 3.0
+    cached = CachedEmbeddings(_embeddings(httpd, controller), namespace="emb", path=str(tmp_path / "e.sqlite3"))
+    with pytest.raises(APITimeoutError):
+        embed_query_within(cached, "budget", 0.3)
+    handler.delay_s = 0.0
+    assert embed_query_within(cached, "budget", 0.3) == pytest.approx([0.1, 0.2, 0.3])
+    assert embed_query_within(cached, "budget", 0.3) == pytest.approx([0.1, 0.2, 0.3])
+    assert handler.hits == 2  # the third call was a cache hit
+    assert controller.in_flight == 0
@@ -0,0 +1,44 @@
+"""Resume tokens for the SQLite chat history (bot/history_store.py)."""
+import os
+import uuid
+
+import pytest
+
+import bot.history_store as history_store
+from bot.history_store import session_from_token, session_token
+
+
+@pytest.fixture
+def secret(monkeypatch):
+    monkeypatch.setattr(history_store, "_SECRET", None)
+    monkeypatch.setenv("SESSION_TOKEN_SECRET", "test-secret")
+    yield
+    history_store._SECRET = None
+
+
+def test_token_round_trip(secret):
+    sid = str(uuid.uuid4())
+    assert session_from_token(session_token(sid)) == sid
+
+
+@pytest.mark.parametrize("token", [None, "", "not-a-token", ".abc", "victim-session", "victim-session.0123456789abcdef"])
+def test_unsigned_ids_are_rejected(secret, token):
+    assert session_from_token(token) is None
+
+
+def test_token_from_another_secret_is_rejected(secret, monkeypatch):
+    token = session_token("s1")
+    monkeypatch.setattr(history_store, "_SECRET", None)
+    monkeypatch.setenv("SESSION_TOKEN_SECRET", "other-secret")
+    assert session_from_token(token) is None
+
+
+def test_generated_secret_is_kept_next_to_the_database(monkeypatch, tmp_path):
+    monkeypatch.setattr(history_store, "_SECRET", None)
+    monkeypatch.delenv("SESSION_TOKEN_SECRET", raising=False)
+    monkeypatch.setenv("CHAT_HISTORY_PATH", str(tmp_path / "chat_history.sqlite3"))
+    token = session_token("s1")
+    path = tmp_path / "session_secret"
+    assert oct(os.stat(path).st_mode & 0o777) == "0o600"
+    monkeypatch.setattr(history_store, "_SECRET", None)  # a restart reads the same key back
+    assert session_from_token(token) == "s1"
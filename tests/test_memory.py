@@ -0,0 +1,100 @@
+"""TokenBudgetMemory (bot/memory.py): verbatim window, token budget and background summary."""
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from bot.memory import TURN_TOKENS_KEPT, TokenBudgetMemory, get_memory, messages_tokens
+
+
+def _memory(**kwargs) -> TokenBudgetMemory:
+    memory = get_memory(mode="summary")
+    for name, value in kwargs.items():
+        setattr(memory, name, value)
+    return memory
+
+
+def _chat(memory, turns, words=5):
+    for n in range(turns):
+        memory.save_context({"question": f"question {n}" + " word" * words}, {"answer": f"answer {n}" + " word" * words})
+        memory.wait_for_summary(5)
+
+
+def _contents(messages):
+    return [str(m.content) for m in messages]
+
+
+def test_prompt_keeps_system_and_last_turns():
+    memory = _memory(keep_turns=2, max_tokens=10_000, summary_llm=FakeListChatModel(responses=["S"]))
+    memory.chat_memory.add_user_message("question 0")
+    memory.chat_memory.add_ai_message("answer 0")
+    memory.chat_memory.add_user_message("question 1")
+    memory.chat_memory.add_ai_message("answer 1")
+    memory.chat_memory.add_user_message("question 2")
+    memory.chat_memory.add_ai_message("answer 2")
+    messages = memory.load_memory_variables({})["chat_history"]
+    assert messages[0].type == "system"
+    assert _contents(messages[1:]) == ["question 1", "answer 1", "question 2", "answer 2"]
+
+
+def test_oldest_turns_are_dropped_to_fit_the_budget():
+    memory = _memory(keep_turns=5, summary_llm=None)
+    for n in range(3):
+        memory.chat_memory.add_user_message(f"question {n} " + "word " * 50)
+        memory.chat_memory.add_ai_message(f"answer {n} " + "word " * 50)
+    system = memory.chat_memory.messages[:1]
+    pair = memory.chat_memory.messages[-2:]
+    memory.max_tokens = messages_tokens(system) + 2 * messages_tokens(pair) + 1
+    messages = memory.load_memory_variables({})["chat_history"]
+    assert [m.type for m in messages] == ["system", "human", "ai", "human", "ai"]
+    assert str(messages[1].content).startswith("question 1")
+    assert memory.turn_tokens[-1] == messages_tokens(messages) <= memory.max_tokens
+    # Whole exchanges only: never a dangling answer without its question
+    memory.max_tokens = messages_tokens(system) + messages_tokens(pair) + 1
+    assert [m.type for m in memory.load_memory_variables({})["chat_history"]] == ["system", "human", "ai"]
+
+
+def test_overflow_is_folded_into_the_summary():
+    llm = FakeListChatModel(responses=["The user asked about health and roads."])
+    memory = _memory(keep_turns=2, max_tokens=10_000, summary_llm=llm)
+    _chat(memory, 4)
+    assert memory.summary == "The user asked about health and roads."
+    # Folded turns leave the buffer; the last keep_turns stay verbatim
+    turns = [m for m in memory.chat_memory.messages if m.type != "system"]
+    assert _contents(turns)[0].startswith("question 2")
+    assert len(turns) == 4
+    messages = memory.load_memory_variables({})["chat_history"]
+    assert [m.type for m in messages[:2]] == ["system", "system"]
+    assert "Summary of the earlier conversation: The user asked about health" in messages[1].content
+
+
+def test_summary_without_llm_keeps_the_questions_and_is_truncated():
+    memory = _memory(keep_turns=1, max_tokens=10_000, summary_llm=None, summary_max_words=12)
+    _chat(memory, 3, words=0)
+    assert memory.summary.split()[-1] == "1."
+    assert len(memory.summary.split()) <= 12
+    assert "question" in memory.summary
+
+
+def test_failed_summary_keeps_the_verbatim_turns():
+    class Broken:
+        def invoke(self, prompt):
+            raise RuntimeError("LLM down")
+
+    memory = _memory(keep_turns=1, max_tokens=10_000, summary_llm=Broken())
+    _chat(memory, 3)
+    assert memory.summary == ""
+    assert len([m for m in memory.chat_memory.messages if m.type != "system"]) == 6
+
+
+def test_turn_tokens_is_bounded():
+    memory = _memory(keep_turns=2, max_tokens=10_000, summary_llm=None)
+    for _ in range(TURN_TOKENS_KEPT + 10):
+        memory.load_memory_variables({})
+    assert len(memory.turn_tokens) == TURN_TOKENS_KEPT
+
+
+def test_clear_drops_summary_and_turns():
+    memory = _memory(keep_turns=1, max_tokens=10_000, summary_llm=FakeListChatModel(responses=["S"]))
+    _chat(memory, 3)
+    assert memory.summary == "S"
+    memory.clear()
+    assert memory.summary == ""
+    assert memory.load_memory_variables({})["chat_history"] == []
@@ -0,0 +1,49 @@
+"""Vectorized MMR (retriever/mmr.py) picks what LangChain's routine picks."""
+import numpy as np
+import pytest
+from langchain_community.vectorstores.utils import maximal_marginal_relevance as langchain_mmr
+
+from retriever.mmr import _cosine, maximal_marginal_relevance, mmr_batch, mmr_select
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("lambda_mult", [0.0, 0.25, 0.5, 1.0])
+def test_same_picks_as_langchain(seed, lambda_mult):
+    rng = np.random.default_rng(seed)
+    candidates = rng.normal(size=(20, 16)).astype(np.float32)
+    query = rng.normal(size=16).astype(np.float32)
+    expected = langchain_mmr(query, candidates, lambda_mult=lambda_mult, k=6)
+    assert maximal_marginal_relevance(query, candidates, lambda_mult=lambda_mult, k=6) == expected
+
+
+def test_duplicates_and_zero_vectors_match_langchain():
+    rng = np.random.default_rng(7)
+    base = rng.normal(size=(6, 8)).astype(np.float32)
+    # Exact duplicates give ties; a zero vector gives NaN cosines that both set to 0
+    candidates = np.vstack([base, base[:3], np.zeros((1, 8), dtype=np.float32)])
+    query = base[0] + 0.01
+    for k in (1, 4, len(candidates), len(candidates) + 3):
+        assert maximal_marginal_relevance(query, candidates, 0.5, k) == langchain_mmr(query, candidates, 0.5, k)
+
+
+def test_empty_inputs():
+    assert maximal_marginal_relevance([1.0, 0.0], [], k=4) == []
+    assert maximal_marginal_relevance([1.0, 0.0], [[1.0, 0.0]], k=0) == []
+    assert mmr_select(np.zeros(0, dtype=np.float32), np.zeros((0, 0), dtype=np.float32), k=3) == []
+
+
+def test_select_on_precomputed_similarities():
+    rng = np.random.default_rng(3)
+    candidates = rng.normal(size=(12, 8)).astype(np.float32)
+    query = rng.normal(size=8).astype(np.float32)
+    to_query = _cosine(query[None, :], candidates)[0]
+    pairwise = _cosine(candidates, candidates)
+    assert mmr_select(to_query, pairwise, 0.5, 5) == langchain_mmr(query, candidates, 0.5, 5)
+
+
+def test_batch_matches_one_query_at_a_time():
+    rng = np.random.default_rng(11)
+    candidates = rng.normal(size=(5, 15, 8)).astype(np.float32)
+    queries = rng.normal(size=(5, 8)).astype(np.float32)
+    expected = [langchain_mmr(q, c, lambda_mult=0.3, k=4) for q, c in zip(queries, candidates)]
+    assert mmr_batch(queries, candidates, lambda_mult=0.3, k=4) == expected
@@ -0,0 +1,53 @@
+"""Condense-question policy (bot/rewrite.py)."""
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from bot.rewrite import get_rewrite_policy, looks_standalone, should_rewrite
+
+SEEDED = [SystemMessage(content="You are a helpful RAG assistant.")]
+ONE_TURN = SEEDED + [HumanMessage(content="What does the party say about health?"), AIMessage(content="...")]
+
+
+@pytest.mark.parametrize("policy", ["after_first_turn", "heuristic"])
+def test_seeded_system_prompt_is_not_a_prior_turn(policy):
+    assert should_rewrite(policy, "What about education?", SEEDED) == (False, "first_turn")
+    assert should_rewrite(policy, "What about education?", []) == (False, "first_turn")
+
+
+def test_fixed_policies_ignore_the_history():
+    assert should_rewrite("always", "health policy of the party", SEEDED) == (True, "policy_always")
+    assert should_rewrite("never", "and them?", ONE_TURN) == (False, "policy_never")
+
+
+def test_after_first_turn_rewrites_every_follow_up():
+    assert should_rewrite("after_first_turn", "What is the education policy of the party?", ONE_TURN) == (True, "follow_up")
+    # (human, ai) tuples count as turns too
+    assert should_rewrite("after_first_turn", "why?", [("q", "a")]) == (True, "follow_up")
+
+
+@pytest.mark.parametrize("question", [
+    "What is the education policy of the party?",
+    "How will the health insurance scheme be funded?",
+])
+def test_heuristic_skips_standalone_questions(question):
+    assert looks_standalone(question)
+    assert should_rewrite("heuristic", question, ONE_TURN) == (False, "standalone")
+
+
+@pytest.mark.parametrize("question", [
+    "why?",                                   # too short
+    "what about education",                   # continuation
+    "And how will they fund the scheme",      # continuation + pronoun
+    "How will that be funded by the party",   # pronoun
+    "Tell me more on the agriculture plan",   # continuation
+])
+def test_heuristic_rewrites_context_dependent_questions(question):
+    assert not looks_standalone(question)
+    assert should_rewrite("heuristic", question, ONE_TURN) == (True, "follow_up")
+
+
+def test_unknown_policy_falls_back_to_default(monkeypatch):
+    monkeypatch.setenv("REWRITE_POLICY", " Heuristic ")
+    assert get_rewrite_policy() == "heuristic"
+    monkeypatch.setenv("REWRITE_POLICY", "sometimes")
+    assert get_rewrite_policy() == "after_first_turn"
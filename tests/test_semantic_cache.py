@@ -0,0 +1,152 @@
+"""Semantic answer cache (bot/semantic_cache.py): hits, TTL, LRU and key invalidation."""
+import pytest
+from langchain_core.documents import Document
+
+import bot.semantic_cache as semantic_cache
+from bot.fakes import get_fake_embeddings
+from bot.semantic_cache import SemanticCache, cache_key
+
+DOCS = [Document(id="chunk-1", page_content="Health insurance for all.", metadata={"page": 3})]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(semantic_cache, "time", lambda: now[0])
+    return now
+
+
+def _cache(path, key="v1-abc", **kwargs) -> SemanticCache:
+    kwargs.setdefault("threshold", 0.95)
+    kwargs.setdefault("ttl_s", 3600)
+    kwargs.setdefault("flush_s", 0)
+    return SemanticCache(get_fake_embeddings(), key, path=str(path), **kwargs)
+
+
+def _remember(cache, question, answer="cached answer"):
+    entry, vec = cache.lookup(question)
+    assert entry is None
+    cache.store(question, vec, answer, DOCS, latency_ms=1200.0)
+
+
+def test_hit_returns_answer_and_sources(tmp_path, clock):
+    cache = _cache(tmp_path)
+    _remember(cache, "health policy")
+    entry, _ = cache.lookup("health policy")
+    assert entry["answer"] == "cached answer"
+    assert entry["sources"] == [{"id": "chunk-1", "page_content": "Health insurance for all.", "metadata": {"page": 3}}]
+    assert entry["hits"] == 1
+    assert cache.lookup("something unrelated")[0] is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 2, "hit_rate": 0.333, "saved_ms": 1200.0}
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = _cache(tmp_path, ttl_s=60)
+    _remember(cache, "health policy")
+    clock[0] += 59
+    assert cache.lookup("health policy")[0] is not None
+    # TTL counts from creation, not last use
+    clock[0] += 2
+    assert cache.lookup("health policy")[0] is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_expired_entries_are_not_loaded(tmp_path, clock):
+    cache = _cache(tmp_path, ttl_s=60)
+    _remember(cache, "health policy")
+    cache.flush()
+    clock[0] += 120
+    assert _cache(tmp_path, ttl_s=60).stats()["entries"] == 0
+
+
+def test_persisted_cache_survives_a_restart(tmp_path, clock):
+    cache = _cache(tmp_path)
+    _remember(cache, "health policy")
+    _remember(cache, "road policy", answer="roads")
+    cache.flush()
+    reloaded = _cache(tmp_path)
+    assert reloaded.stats()["entries"] == 2
+    assert reloaded.lookup("road policy")[0]["answer"] == "roads"
+
+
+def test_changed_key_starts_empty(tmp_path, clock):
+    cache = _cache(tmp_path, key=cache_key("v1", "gpt-4o", ["system prompt"]))
+    _remember(cache, "health policy")
+    cache.flush()
+    for key in (
+        cache_key("v2", "gpt-4o", ["system prompt"]),      # re-ingested corpus
+        cache_key("v1", "gpt-4o-mini", ["system prompt"]),  # other chat model
+        cache_key("v1", "gpt-4o", ["new system prompt"]),   # edited prompt
+    ):
+        assert key != cache.key
+        assert _cache(tmp_path, key=key).lookup("health policy")[0] is None
+    assert _cache(tmp_path, key=cache.key).lookup("health policy")[0] is not None
+
+
+def test_cache_key_is_stable_and_readable():
+    key = cache_key("v1", "gpt-4o", ["a", "b"])
+    assert key == cache_key("v1", "gpt-4o", ["a", "b"])
+    assert key.startswith("v1-") and len(key) == len("v1-") + 12
+    # Parts are delimited, so moving text between them changes the key
+    assert cache_key("v1", "gpt-4o", ["ab", ""]) != cache_key("v1", "gpt-4o", ["a", "b"])
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, clock):
+    cache = _cache(tmp_path, max_entries=2)
+    _remember(cache, "first question")
+    clock[0] += 1
+    _remember(cache, "second question")
+    clock[0] += 1
+    assert cache.lookup("first question")[0] is not None  # now more recent than the second
+    clock[0] += 1
+    _remember(cache, "third question")
+    assert cache.lookup("second question")[0] is None
+    assert cache.lookup("first question")[0] is not None
+    assert cache.lookup("third question")[0] is not None
+
+
+def test_buffer_growth_keeps_every_row(tmp_path, clock):
+    cache = _cache(tmp_path)
+    questions = [f"question number {n}" for n in range(40)]
+    for q in questions:
+        _remember(cache, q, answer=q.upper())
+    assert all(cache.lookup(q)[0]["answer"] == q.upper() for q in questions)
+
+
+def test_close_writes_pending_stores_and_stops_the_writer(tmp_path, clock):
+    cache = _cache(tmp_path, flush_s=60)
+    _remember(cache, "health policy")
+    cache.close()
+    assert not cache._writer.is_alive()
+    assert _cache(tmp_path).stats()["entries"] == 1
+    # A retired cache still answers from memory but no longer stores or writes
+    _remember(cache, "road policy")
+    assert cache.stats()["entries"] == 1
+    cache.close()
+
+
+def test_compaction_keeps_spare_capacity(tmp_path, clock):
+    cache = _cache(tmp_path, max_entries=16)
+    for n in range(17):  # the 17th store grows the buffer to 32, then evicts one
+        clock[0] += 1
+        _remember(cache, f"question number {n}")
+    buffer = cache._buffer
+    assert len(buffer) == 32 and cache.stats()["entries"] == 16
+    clock[0] += 1
+    _remember(cache, "one more question")
+    assert len(cache._buffer) == 32  # compacted into a same-size array, not regrown
+
+
+def test_rebuild_closes_the_old_cache(text_store, tmp_path, monkeypatch):
+    from bot.registry import ResourceRegistry
+
+    monkeypatch.chdir(tmp_path)  # the registry's cache lives in cache/semantic/
+    monkeypatch.setenv("SEMANTIC_CACHE", "1")
+    registry = ResourceRegistry(text_store, check_interval_s=0)
+    old = registry.get().semantic_cache
+    registry.invalidate()
+    new = registry.get().semantic_cache
+    assert new is not old
+    assert not old._writer.is_alive()
+    assert new._writer.is_alive()
+    new.close()
@@ -0,0 +1,118 @@
+"""Session pool eviction (bot/sessions.py) on fake resources over a temp store."""
+import pytest
+
+import bot.sessions as sessions
+from bot.registry import ResourceRegistry
+from bot.sessions import SessionManager
+
+
+@pytest.fixture
+def registry(text_store, monkeypatch):
+    registry = ResourceRegistry(text_store, check_interval_s=0)
+    monkeypatch.setattr(sessions, "get_resources", registry.get)
+    return registry
+
+
+def test_least_recently_used_session_is_evicted(registry):
+    manager = SessionManager(max_sessions=2, idle_timeout_s=0, max_rss_mb=0)
+    a = manager.get("a")
+    manager.get("b")
+    assert manager.get("a") is a  # reused, and now most recent
+    manager.get("c")
+    assert list(manager._sessions) == ["a", "c"]
+    assert manager.stats()["evictions"] == {"lru": 1, "idle": 0, "memory": 0}
+    assert registry.stats()["builds"] == 1  # sessions share the resources
+
+
+def test_idle_sessions_are_evicted_on_next_get(registry, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sessions, "monotonic", lambda: now[0])
+    manager = SessionManager(max_sessions=10, idle_timeout_s=60, max_rss_mb=0)
+    manager.get("old")
+    now[0] += 30
+    manager.get("recent")
+    now[0] += 45  # "old" idle for 75 s, "recent" for 45 s
+    manager.get("new")
+    assert list(manager._sessions) == ["recent", "new"]
+    assert manager.evictions["idle"] == 1
+
+
+def test_evicted_session_starts_fresh(registry):
+    manager = SessionManager(max_sessions=1, idle_timeout_s=0, max_rss_mb=0)
+    first = manager.get("a")
+    first.memory.chat_memory.add_user_message("hello")
+    manager.get("b")
+    again = manager.get("a")
+    assert again is not first
+    assert [m.type for m in again.memory.chat_memory.messages] == ["system"]
+
+
+def _rss(manager, base_mb=100, per_session_mb=10):
+    """Fake RSS: a fixed base plus what every held session costs."""
+    return lambda: (base_mb + per_session_mb * len(manager._sessions)) * 1024 * 1024
+
+
+def test_memory_ceiling_evicts_until_sessions_fit(registry, monkeypatch):
+    manager = SessionManager(max_sessions=100, idle_timeout_s=0, max_rss_mb=135, rss_check_interval_s=0)
+    monkeypatch.setattr(sessions, "current_rss_bytes", _rss(manager))
+    for sid in "abc":
+        manager.get(sid)
+    assert manager.baseline_rss == 100 * 1024 * 1024  # sampled before any session existed
+    assert len(manager) == 3  # 130 MB
+    # A fourth session would be 140 MB: the oldest goes, the one being served stays
+    manager.get("d")
+    assert list(manager._sessions) == ["b", "c", "d"]
+    manager.get("a")
+    assert list(manager._sessions) == ["c", "d", "a"]
+    assert manager.evictions["memory"] == 2
+
+
+def test_eviction_stops_when_rss_does_not_fall(registry, monkeypatch):
+    manager = SessionManager(max_sessions=100, idle_timeout_s=0, max_rss_mb=150, rss_check_interval_s=0)
+    rss = [100 * 1024 * 1024]
+    monkeypatch.setattr(sessions, "current_rss_bytes", lambda: rss[0])
+    for n in range(20):
+        manager.get(f"s{n}")
+    rss[0] = 500 * 1024 * 1024  # grown outside the sessions: evicting does not help
+    manager.get("s0")
+    assert manager.evictions["memory"] == 2  # one batch of len // 10, then it gives up
+    assert len(manager) == 18
+
+
+def test_ceiling_is_checked_at_most_once_per_interval(registry, monkeypatch):
+    manager = SessionManager(max_sessions=100, idle_timeout_s=0, max_rss_mb=115, rss_check_interval_s=60)
+    monkeypatch.setattr(sessions, "current_rss_bytes", _rss(manager))
+    manager.get("a")  # the first check, with one session (110 MB)
+    for sid in "bcd":
+        manager.get(sid)
+    assert len(manager) == 4 and manager.evictions["memory"] == 0
+
+
+def test_ceiling_below_the_baseline_warns_and_keeps_sessions(registry, monkeypatch, capsys):
+    manager = SessionManager(max_sessions=100, idle_timeout_s=0, max_rss_mb=50, rss_check_interval_s=0)
+    monkeypatch.setattr(sessions, "current_rss_bytes", _rss(manager))
+    for sid in "abcd":
+        manager.get(sid)
+    assert "below the 100 MB" in capsys.readouterr().out
+    assert len(manager) == 4 and manager.evictions["memory"] == 0
+
+
+def test_rebuilt_resources_keep_the_history(registry):
+    manager = SessionManager(max_sessions=10, idle_timeout_s=0, max_rss_mb=0)
+    session = manager.get("a")
+    session.memory.chat_memory.add_user_message("hello")
+    old_chain, old_resources = session.chain, session.resources
+    registry.invalidate()
+    assert manager.get("a") is session
+    assert session.resources is not old_resources
+    assert session.chain is not old_chain
+    assert session.chain.memory is session.memory
+    assert [m.content for m in session.memory.chat_memory.messages][-1] == "hello"
+
+
+def test_drop_removes_a_session(registry):
+    manager = SessionManager(max_sessions=10, idle_timeout_s=0, max_rss_mb=0)
+    manager.get("a")
+    manager.drop("a")
+    manager.drop("missing")
+    assert len(manager) == 0
@@ -0,0 +1,256 @@
+"""Single-flight coalescing (bot/singleflight.py)."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from bot.deadline import DeadlineExceeded, check_deadline, deadline_scope, remaining_s
+from bot.singleflight import LeaderFailed, SingleFlight, normalize_question
+
+
+def _start_leader(flight, key, release, result="answer"):
+    started = threading.Event()
+    out = {}
+
+    def fn():
+        started.set()
+        release.wait(5)
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    def run():
+        try:
+            out["value"] = flight.do(key, fn)
+        except BaseException as e:
+            out["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    started.wait(5)
+    return thread, out
+
+
+def _followers(flight, key, n):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do(key, lambda: "not me"))) for _ in range(n)]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 2
+    while flight.followers < n and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return threads, results
+
+
+def test_normalize_question():
+    assert normalize_question("  What about   HEALTH?? ") == "what about health"
+    assert normalize_question(None) == ""
+
+
+def test_followers_share_the_leaders_result():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    leader, out = _start_leader(flight, "q", release)
+    threads, results = _followers(flight, "q", 3)
+    release.set()
+    for t in [leader, *threads]:
+        t.join(5)
+    assert out["value"] == "answer"
+    assert results == ["answer"] * 3
+    assert flight.stats() == {"leaders": 1, "followers": 3, "in_flight": 0}
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight("test")
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("a", lambda: 2) == 2  # the first call finished, so this one leads again
+    assert flight.do("b", lambda: 3) == 3
+    assert flight.stats()["leaders"] == 3
+
+
+def test_followers_get_a_fresh_error_chained_to_the_leaders():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    leader, out = _start_leader(flight, "q", release, result=ValueError("boom"))
+    errors = []
+
+    def follow():
+        try:
+            flight.do("q", lambda: "not me")
+        except LeaderFailed as e:
+            errors.append(e)
+
+    followers = [threading.Thread(target=follow) for _ in range(2)]
+    for t in followers:
+        t.start()
+    while flight.followers < 2:
+        time.sleep(0.005)
+    release.set()
+    for t in [leader, *followers]:
+        t.join(5)
+    assert isinstance(out["error"], ValueError)
+    assert len(errors) == 2 and errors[0] is not errors[1]
+    assert all(e.__cause__ is out["error"] for e in errors)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_follower_outlives_the_leaders_deadline():
+    flight = SingleFlight("test")
+    started = threading.Event()
+    out = {}
+
+    def leader_work():
+        started.set()
+        time.sleep(0.2)
+        check_deadline("generate")
+        return "leader answer"
+
+    def lead():
+        with deadline_scope(0.1):
+            try:
+                flight.do("q", leader_work)
+            except DeadlineExceeded as e:
+                out["leader"] = e
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    started.wait(5)
+    # No deadline of its own: once the leader times out, this call runs the work itself
+    assert flight.do("q", lambda: "follower answer") == "follower answer"
+    leader.join(5)
+    assert isinstance(out["leader"], DeadlineExceeded)
+    assert flight.stats() == {"leaders": 2, "followers": 1, "in_flight": 0}
+
+
+def test_follower_gives_up_at_its_own_deadline():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    leader, out = _start_leader(flight, "q", release)
+    start = time.monotonic()
+    with deadline_scope(0.2), pytest.raises(DeadlineExceeded) as raised:
+        flight.do("q", lambda: "not me")
+    assert time.monotonic() - start < 1.0
+    assert raised.value.stage == "singleflight:test"
+    release.set()
+    leader.join(5)
+    assert out["value"] == "answer"  # the leader is unaffected
+
+
+def test_async_followers_share_one_task():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        return await asyncio.gather(*(flight.ado("q", work) for _ in range(4)))
+
+    assert asyncio.run(run()) == ["answer"] * 4
+    assert len(calls) == 1
+    assert flight.stats() == {"leaders": 1, "followers": 3, "in_flight": 0}
+
+
+def test_cancelled_async_leader_does_not_cancel_followers():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    async def run():
+        leader = asyncio.ensure_future(flight.ado("q", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.ado("q", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == "answer"
+
+
+def test_async_shared_work_has_no_leaders_deadline():
+    flight = SingleFlight("test")
+    seen = []
+
+    async def work():
+        seen.append(remaining_s())
+        await asyncio.sleep(0.2)
+        check_deadline("generate")
+        return "answer"
+
+    async def lead():
+        with deadline_scope(0.05):
+            return await asyncio.wait_for(flight.ado("q", work), 0.05)
+
+    async def run():
+        leader = asyncio.ensure_future(lead())
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.ado("q", work))
+        with pytest.raises(asyncio.TimeoutError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == "answer"
+    assert seen == [None]
+
+
+def test_async_callers_retry_when_the_shared_work_is_cancelled():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        leader = asyncio.ensure_future(flight.ado("q", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.ado("q", work))
+        await asyncio.sleep(0.01)
+        flight._tasks["q"][0].cancel()  # neither caller was cancelled, so both retry
+        return await asyncio.gather(leader, follower)
+
+    assert asyncio.run(run()) == ["answer", "answer"]
+    assert len(calls) == 2
+
+
+def test_async_work_is_cancelled_when_nobody_waits():
+    flight = SingleFlight("test")
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def run():
+        caller = asyncio.ensure_future(flight.ado("q", work))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert cancelled == [1]
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_async_followers_get_a_chained_error():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        return await asyncio.gather(*(flight.ado("q", work) for _ in range(3)), return_exceptions=True)
+
+    leader, *followers = asyncio.run(run())
+    assert isinstance(leader, ValueError)
+    assert all(isinstance(e, LeaderFailed) and e.__cause__ is leader for e in followers)
@@ -0,0 +1,75 @@
+"""Speculative retrieval match (bot/speculative.py) with a slow or failing embeddings endpoint."""
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from bot.fakes import get_fake_embeddings
+from bot.speculative import questions_match, speculative_vector
+from retriever.retriever import record_retrieval
+
+
+class _Counting:
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = []
+
+    def with_request_timeout(self, timeout_s):
+        counting = _Counting(self.inner.with_request_timeout(timeout_s))
+        counting.calls = self.calls
+        return counting
+
+    def embed_query(self, text):
+        self.calls.append(text)
+        return self.inner.embed_query(text)
+
+
+@pytest.fixture(autouse=True)
+def embedding_match(monkeypatch):
+    monkeypatch.setenv("SPECULATIVE_MATCH", "embedding")
+    monkeypatch.setenv("EMBED_TIMEOUT_MS", "200")
+
+
+def test_same_question_matches():
+    used, score = questions_match("health policy", "health policy", get_fake_embeddings())
+    assert used and score == pytest.approx(1.0)
+
+
+def test_raw_vector_from_the_speculation_is_reused():
+    embeddings = _Counting(get_fake_embeddings())
+    raw_vector = get_fake_embeddings().embed_query("health policy")
+    used, _ = questions_match("health policy", "health policy", embeddings, raw_vector=raw_vector)
+    assert used
+    assert embeddings.calls == ["health policy"]  # only the rewritten question
+
+
+def test_slow_endpoint_counts_as_not_used():
+    embeddings = get_fake_embeddings()
+    embeddings.latency_s = 5.0
+    start = time.monotonic()
+    with record_retrieval() as info:
+        assert questions_match("health policy", "health policy", embeddings) == (False, 0.0)
+    assert time.monotonic() - start < 1.0
+    assert info["embed_failed"] == "timeout"  # the retriever goes straight to BM25
+
+
+def test_failing_endpoint_counts_as_not_used():
+    embeddings = get_fake_embeddings()
+    embeddings.failure_probability = 1.0
+    with record_retrieval() as info:
+        assert questions_match("health policy", "health policy", embeddings) == (False, 0.0)
+    assert info["embed_failed"] == "error"
+
+
+def test_speculative_vector_only_from_a_finished_retrieval():
+    pending = Future()
+    assert speculative_vector(pending) is None
+    failed = Future()
+    failed.set_exception(RuntimeError("boom"))
+    assert speculative_vector(failed) is None
+    done = Future()
+    done.set_result(([], 1.0, {"deferred": [], "vector": [0.1, 0.2]}))
+    assert speculative_vector(done) == [0.1, 0.2]
+    cancelled = Future()
+    cancelled.cancel()
+    assert speculative_vector(cancelled) is None
@@ -0,0 +1,23 @@
+"""Readiness (monitoring/startup.py) with and without a warm-up."""
+import pytest
+
+import monitoring.startup as startup
+from monitoring.startup import readiness, ready_without_warmup, set_ready
+
+
+@pytest.fixture(autouse=True)
+def fresh_readiness(monkeypatch):
+    monkeypatch.setattr(startup, "_READINESS", {"ready": False, "status": "starting"})
+
+
+def test_app_marks_ready_when_no_warmup_ran():
+    assert ready_without_warmup()
+    assert readiness() == {"ready": True, "status": "ready", "warmup": "none"}
+    assert not ready_without_warmup()  # only the first session does it
+
+
+@pytest.mark.parametrize("status", ["warming", "failed"])
+def test_app_leaves_a_warmup_to_report(status):
+    set_ready(False, status)
+    assert not ready_without_warmup()
+    assert readiness()["status"] == status